@@ -0,0 +1,292 @@
+# coding: utf-8
+
+# ******************************************************************************
+# Copyright © 2012 Asztalos Attila Oszkár
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the “Software”), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ******************************************************************************
+
+# ******************************************************************************
+# Line Bender benchmarks: times the main parts of linebend.py on synthetic g-code
+# of several sizes (see gcodegen.py) and appends the results to a file, so that
+# runs of different versions can be compared against each other.
+# ******************************************************************************
+
+import os;
+import sys;
+import json;
+import time;
+import shutil;
+import logging;
+import platform;
+import tempfile;
+import subprocess;
+
+from timeit import default_timer as Clock;
+
+import linebend;
+import gcodegen;
+
+# ******************************************************************************
+# Constants
+# ******************************************************************************
+
+FUNCTION_NAMES = ('ScanForParams', 'WordsToValues', 'BendThatArc', 'ParseLine');   # Timed one by one, per call
+
+BENCHMARK_OPTIONS = {                                                           # Option name: (key in the options dictionary, value conversion or 'None' for switches, default, help)
+    '--sizes': ('Sizes', lambda Text: [int(Size) for Size in Text.split(",")], [10000, 1000000, 10000000], "comma separated g-code sizes in lines"),
+    '--results': ('Results', str, "benchmark.jsonl", "file the results are appended to (one JSON record per line)"),
+    '--label': ('Label', str, None, "label stored with the results (defaults to the Line Bender version)"),
+    '--keep': ('Keep', str, None, "keep the generated g-code in this directory instead of a temporary one"),
+    '--seed': ('Seed', int, 1, "random seed for the generated g-code"),
+};
+
+# ******************************************************************************
+# ResetBender() - put linebend's state back to what a fresh run starts with
+# ******************************************************************************
+
+def ResetBender():
+
+    Options, Unused = linebend.ScanForOptions([]);
+
+    linebend.ApplySettings(Options);
+    linebend.SetCounters(dict.fromkeys(linebend.COUNTER_NAMES, 0));
+
+    linebend.CurrentPosition = {'X': None, 'Y': None, 'Z': None};
+    linebend.PendingArcs = None;
+
+# ******************************************************************************
+# TimeFunctions() - time each function in FUNCTION_NAMES over a whole file
+#
+# Note: every function gets its own pass over the file, so that the others are
+# out of the way, and only the calls themselves are timed. Returns a dict of
+# (number of calls, total seconds) by function name.
+# ******************************************************************************
+
+def TimeFunctions(FileName):
+
+    Timings = {};
+
+    ResetBender();                                                              # ScanForParams(): every line
+
+    Calls, Seconds = 0, 0.0;
+
+    with open(FileName, 'r') as InFile:
+        for Line in InFile:
+            Start = Clock();
+            linebend.ScanForParams(Line);
+            Seconds += Clock() - Start;
+            Calls += 1;
+
+    Timings['ScanForParams'] = (Calls, Seconds);
+
+    ResetBender();                                                              # WordsToValues(): every line's string params
+
+    Calls, Seconds = 0, 0.0;
+
+    with open(FileName, 'r') as InFile:
+        for Line in InFile:
+            Params, Values = linebend.ScanForParams(Line);
+            Start = Clock();
+            linebend.WordsToValues(Params);
+            Seconds += Clock() - Start;
+            Calls += 1;
+
+    Timings['WordsToValues'] = (Calls, Seconds);
+
+    ResetBender();                                                              # BendThatArc(): every arc that isn't a full circle
+
+    Calls, Seconds = 0, 0.0;
+    Position = {'X': None, 'Y': None, 'Z': None};
+
+    with open(FileName, 'r') as InFile:
+        for Line in InFile:
+            Params, Values = linebend.ScanForParams(Line);
+
+            if Values['G'] == 2 or Values['G'] == 3:
+                Points = linebend.ArcPoints(Position, Values);
+
+                if linebend.dist(*Points[:4]) > 0:
+                    Start = Clock();
+                    linebend.BendThatArc(*Points);
+                    Seconds += Clock() - Start;
+                    Calls += 1;
+
+            for Axis in "XYZ":
+                if Values[Axis] is not None:
+                    Position[Axis] = Values[Axis];
+
+    Timings['BendThatArc'] = (Calls, Seconds);
+
+    ResetBender();                                                              # ParseLine(): every line, arcs bent and all
+
+    Calls, Seconds = 0, 0.0;
+
+    with open(FileName, 'r') as InFile:
+        for Line in InFile:
+            Start = Clock();
+            linebend.ParseLine(Line);
+            Seconds += Clock() - Start;
+            Calls += 1;
+
+    Timings['ParseLine'] = (Calls, Seconds);
+
+    return(Timings);
+
+# ******************************************************************************
+# TimeMain() - time a complete run of linebend.py on a file, in its own process
+#
+# Note: any Options (a list of command line options) are passed on as they are,
+# to time --pipeline against the plain sequential run, for one.
+# ******************************************************************************
+
+def TimeMain(FileName, Options = ()):
+
+    OutFileName = linebend.BentFileName(FileName);
+
+    with open(os.devnull, 'w') as Null:
+        Start = Clock();
+        subprocess.check_call([sys.executable, linebend.__file__.replace(".pyc", ".py")] + list(Options) + [FileName, OutFileName], stdout = Null, stderr = Null);
+        Seconds = Clock() - Start;
+
+    os.remove(OutFileName);
+
+    return(Seconds);
+
+# ******************************************************************************
+# PreviousRecord() - the latest earlier record for the same size, or 'None'
+# ******************************************************************************
+
+def PreviousRecord(ResultsName, Lines):
+
+    Previous = None;
+
+    if not os.path.isfile(ResultsName):
+        return(None);
+
+    with open(ResultsName, 'r') as ResultsFile:
+        for Text in ResultsFile:
+            try:
+                Record = json.loads(Text);
+            except ValueError:                                                  # Skip anything damaged, it's only for comparison
+                continue;
+            if Record.get('Lines') == Lines:
+                Previous = Record;
+
+    return(Previous);
+
+# ******************************************************************************
+# PrintRecord() - show one size's results, next to the previous ones if any
+# ******************************************************************************
+
+def PrintRecord(Record, Previous):
+
+    print;
+    print u"{0} lines ({1}):".format(Record['Lines'], Record['Label']);
+
+    if Previous is not None:
+        print u"    {0:<16}{1:>14}{2:>14}{3:>10}".format("", "ns per call", "previous", "ratio");
+    else:
+        print u"    {0:<16}{1:>14}".format("", "ns per call");
+
+    for Name in FUNCTION_NAMES:
+        Now = Record['Functions'][Name]['NsPerCall'];
+
+        if Previous is not None and Name in Previous.get('Functions', {}):
+            Before = Previous['Functions'][Name]['NsPerCall'];
+            print u"    {0:<16}{1:>14.0f}{2:>14.0f}{3:>10.2f}".format(Name, Now, Before, Now / max(Before, 1e-9));
+        else:
+            print u"    {0:<16}{1:>14.0f}".format(Name, Now);
+
+    if Previous is not None and 'MainSeconds' in Previous:
+        print u"    {0:<16}{1:>13.2f}s{2:>13.2f}s{3:>10.2f}".format("main()", Record['MainSeconds'], Previous['MainSeconds'], Record['MainSeconds'] / max(Previous['MainSeconds'], 1e-9));
+    else:
+        print u"    {0:<16}{1:>13.2f}s".format("main()", Record['MainSeconds']);
+
+    if Previous is not None and 'PipelineSeconds' in Previous:
+        print u"    {0:<16}{1:>13.2f}s{2:>13.2f}s{3:>10.2f}".format("--pipeline", Record['PipelineSeconds'], Previous['PipelineSeconds'], Record['PipelineSeconds'] / max(Previous['PipelineSeconds'], 1e-9));
+    else:
+        print u"    {0:<16}{1:>13.2f}s".format("--pipeline", Record['PipelineSeconds']);
+
+    print u"    {0:<16}{1:>14.0f}".format("lines per second", Record['Lines'] / max(Record['MainSeconds'], 1e-9));
+    print u"    {0:<16}{1:>14.2f}".format("pipeline ratio", Record['PipelineSeconds'] / max(Record['MainSeconds'], 1e-9));
+
+# ******************************************************************************
+# Main() - generate, time, record and compare every requested size
+# ******************************************************************************
+
+def main():
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.WARNING)
+
+    Options, Arguments = linebend.ScanForOptions(sys.argv[1:], BENCHMARK_OPTIONS);
+
+    if len(Arguments) > 0:
+        print;
+        print u"Line Bender {0} benchmarks".format(linebend.VERSION);
+        print u"Usage: benchmark [<options>]";
+        linebend.PrintOptions(BENCHMARK_OPTIONS);
+        sys.exit(1);
+
+    if Options['Label'] is None:
+        Options['Label'] = "Line Bender {0}".format(linebend.VERSION);
+
+    if Options['Keep'] is None:
+        WorkDirectory = tempfile.mkdtemp(prefix = "linebend-bench-");
+    else:
+        WorkDirectory = Options['Keep'];
+        if not os.path.isdir(WorkDirectory):
+            os.makedirs(WorkDirectory);
+
+    GeneratorOptions, Unused = linebend.ScanForOptions([], gcodegen.GENERATOR_OPTIONS);
+    GeneratorOptions['Seed'] = Options['Seed'];
+
+    try:
+        for Size in Options['Sizes']:
+            FileName = os.path.join(WorkDirectory, "bench_{0}_{1}.ngc".format(Size, Options['Seed']));
+
+            if not os.path.isfile(FileName):                                    # Same size and seed, same g-code, so a kept file can be reused
+                gcodegen.WriteGCode(FileName, Size, GeneratorOptions);
+
+            Timings = TimeFunctions(FileName);
+
+            Record = {
+                'Label': Options['Label'],
+                'Version': linebend.VERSION,
+                'Python': platform.python_version(),
+                'Time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'Lines': Size,
+                'Seed': Options['Seed'],
+                'Functions': dict((Name, {'Calls': Calls, 'Seconds': Seconds, 'NsPerCall': 1e9 * Seconds / max(Calls, 1)}) for Name, (Calls, Seconds) in Timings.items()),
+                'MainSeconds': TimeMain(FileName),
+                'PipelineSeconds': TimeMain(FileName, ["--pipeline"]),
+            };
+
+            PrintRecord(Record, PreviousRecord(Options['Results'], Size));
+
+            with open(Options['Results'], 'a') as ResultsFile:
+                ResultsFile.write(json.dumps(Record, sort_keys = True) + "\n");
+    finally:
+        if Options['Keep'] is None:
+            shutil.rmtree(WorkDirectory, ignore_errors = True);
+
+    print;
+
+if __name__ == "__main__":
+    main();
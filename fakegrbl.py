@@ -0,0 +1,204 @@
+# coding: utf-8
+
+# ******************************************************************************
+# Copyright © 2012 Asztalos Attila Oszkár
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the “Software”), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ******************************************************************************
+
+# ******************************************************************************
+# A stand-in for a GRBL controller on a pty, for trying out "linebend --send"
+# without a machine. It has a receive buffer and a planner of the usual sizes,
+# answers "ok" once a line makes it from the one to the other, runs the planned
+# moves at a fixed rate and tells if the buffer ever overflowed. Only Unix-like
+# systems have ptys.
+# ******************************************************************************
+
+import os;
+import pty;
+import sys;
+import tty;
+import time;
+import errno;
+import select;
+import signal;
+import logging;
+
+import linebend;
+
+# ******************************************************************************
+# Constants
+# ******************************************************************************
+
+GREETING = "\r\nGrbl 1.1h ['$' for help]\r\n";                                  # What GRBL says after a reset
+
+STATUS_REPORT = "<Idle|MPos:0.000,0.000,0.000|FS:0,0>\r\n";                    # Answer to "?" (the position isn't tracked)
+
+TICK = 0.01;                                                                    # Longest wait for anything before running the planned moves (seconds)
+
+CONTROLLER_OPTIONS = {                                                          # Option name: (key in the options dictionary, value conversion or 'None' for switches, default, help)
+    '--rx-buffer': ('RxBuffer', int, 128, "size of the receive buffer in bytes"),
+    '--planner': ('Planner', int, 15, "number of moves the planner holds"),
+    '--rate': ('Rate', float, 500.0, "moves run per second"),
+    '--error-line': ('ErrorLine', int, None, "answer \"error:20\" to this line (counting from 1), to try out how senders take it"),
+    '--idle-exit': ('IdleExit', float, None, "exit once nothing has come in for this many seconds (after something did)"),
+    '--log': ('Log', str, None, "write every line received to this file"),
+};
+
+# ******************************************************************************
+# RunController() - be a controller on the master side of a pty until stopped
+#
+# Note: the lines received are counted in State, along with the peak number of
+# bytes waiting in the receive buffer (what a sender's flow control is all
+# about) and the number of times it overflowed, so they're there even if it's
+# interrupted.
+# ******************************************************************************
+
+def RunController(Master, Options, State, LogFile = None):
+
+    Buffer = "";                                                                # Received, not yet planned
+    Planned = 0;                                                                # Moves in the planner
+
+    Heard = None;                                                               # When anything last came in ('None' for never)
+    Ran = time.time();                                                          # When the planner last ran
+
+    os.write(Master, GREETING);
+
+    while True:
+        Now = time.time();
+
+        if Options['IdleExit'] is not None and Heard is not None and Now - Heard > Options['IdleExit'] and Buffer == "" and Planned == 0:
+            break;
+
+        Done = int((Now - Ran) * Options['Rate']);                              # Run the moves due by now
+
+        if Done > 0:
+            Planned = max(Planned - Done, 0);
+            Ran += Done / Options['Rate'];
+
+        if Planned == 0:
+            Ran = Now;
+
+        Answers = [];
+
+        while Planned < Options['Planner'] and "\n" in Buffer:                  # Plan what there's room for, answering each line
+            Line, Buffer = Buffer.split("\n", 1);
+            Line = Line.strip();
+            State['Lines'] += 1;
+
+            if LogFile is not None:
+                print >> LogFile, Line;
+
+            if Options['ErrorLine'] is not None and State['Lines'] == Options['ErrorLine']:
+                Answers.append("error:20\r\n");
+            else:
+                Answers.append("ok\r\n");
+                Planned += 1;
+
+        if len(Answers) > 0:
+            os.write(Master, "".join(Answers));
+
+        try:
+            Readable, Unused, Unused = select.select([Master], [], [], TICK);
+        except select.error as Error:
+            if Error.args[0] == errno.EINTR:
+                continue;
+            raise;
+
+        if len(Readable) == 0:
+            continue;
+
+        Data = os.read(Master, 4096);
+        Heard = time.time();
+
+        if "?" in Data:                                                         # Real time commands don't go through the buffer
+            os.write(Master, STATUS_REPORT);
+            Data = Data.replace("?", "");
+
+        if "\x18" in Data:                                                      # Soft reset: forget everything, greet again
+            Buffer, Planned = "", 0;
+            Data = Data[Data.rindex("\x18") + 1:];
+            os.write(Master, GREETING);
+
+        Buffer += Data.replace("\r", "");
+
+        if len(Buffer) > Options['RxBuffer']:                                   # A real one would have lost what didn't fit
+            State['Overflows'] += 1;
+            logging.warning("Receive buffer overflow ({0} bytes waiting).".format(len(Buffer)));
+
+        State['Peak'] = max(State['Peak'], len(Buffer));
+
+# ******************************************************************************
+# StopController() - turn a terminate signal into an interrupt, to stop cleanly
+# ******************************************************************************
+
+def StopController(Number, Frame):
+
+    raise KeyboardInterrupt;
+
+# ******************************************************************************
+# Main() - open a pty, tell its name and be a controller on it
+# ******************************************************************************
+
+def main():
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.WARNING)
+
+    Options, Arguments = linebend.ScanForOptions(sys.argv[1:], CONTROLLER_OPTIONS);
+
+    if len(Arguments) > 0:
+        print;
+        print u"GRBL controller stand-in for Line Bender {0}".format(linebend.VERSION);
+        print u"Usage: fakegrbl [<options>]";
+        print u"Prints the name of its pty (to use with \"linebend --send\") and runs until interrupted";
+        linebend.PrintOptions(CONTROLLER_OPTIONS);
+        sys.exit(1);
+
+    Master, Slave = pty.openpty();
+    tty.setraw(Slave);                                                          # No echo or newline translation for whoever opens it
+
+    print os.ttyname(Slave);
+    sys.stdout.flush();
+
+    if Options['Log'] is not None:
+        LogFile = open(Options['Log'], 'w');
+    else:
+        LogFile = None;
+
+    signal.signal(signal.SIGTERM, StopController);
+
+    State = {'Lines': 0, 'Peak': 0, 'Overflows': 0};
+
+    try:
+        RunController(Master, Options, State, LogFile);
+    except KeyboardInterrupt:
+        pass;
+
+    if LogFile is not None:
+        LogFile.close();
+
+    print >> sys.stderr, u"Lines received:     {0:>8}".format(State['Lines']);
+    print >> sys.stderr, u"Peak buffer use:    {0:>8}".format(State['Peak']);
+    print >> sys.stderr, u"Buffer overflows:   {0:>8}".format(State['Overflows']);
+
+    if State['Overflows'] > 0:                                                  # Let whoever runs it know the flow control failed
+        sys.exit(2);
+
+if __name__ == "__main__":
+    main();
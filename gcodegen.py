@@ -0,0 +1,264 @@
+# coding: utf-8
+
+# ******************************************************************************
+# Copyright © 2012 Asztalos Attila Oszkár
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the “Software”), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# ******************************************************************************
+
+# ******************************************************************************
+# A generator of synthetic Line Grinder style g-code, for testing and timing
+# Line Bender without having to mill a real PCB first. The same seed always
+# gives the very same g-code, down to the last digit.
+# ******************************************************************************
+
+import sys;
+import random;
+import logging;
+
+from math import pi, sin, cos;
+
+import linebend;
+
+# ******************************************************************************
+# Constants
+# ******************************************************************************
+
+BOARD_SIZE = (4.0, 3.0);                                                        # Size of the made-up board (inches)
+
+SAFE_Z = 0.1;                                                                   # Height for rapid moves between islands
+CUT_Z = -0.003;                                                                 # Isolation cutting depth
+
+PLUNGE_FEED = 5;                                                                # Feed rates (inches per minute)
+CUT_FEED = 10;
+
+ISLAND_MOVES = (5, 60);                                                         # Number of cutting moves per isolation island (smallest, largest)
+
+TRACE_STEP = 0.1;                                                               # Largest trace segment along either axis
+PAD_RADIUS = (0.02, 0.1);                                                       # Pad arc radii (smallest, largest)
+PAD_SWEEP = (0.3, 2.5);                                                         # Pad arc sweep in radians; kept well below half a turn, so arcs with errors can still be solved
+
+CURVE_RADIUS = (0.05, 0.3);                                                     # Curves drawn as runs of short G1 moves (radii, sweeps in radians, number of moves)
+CURVE_SWEEP = (0.5, 2.5);
+CURVE_MOVES = (8, 24);
+
+MICRO_STEP = 0.0002;                                                            # Largest step of the tiny (or zero length) moves Line Grinder leaves in
+
+GENERATOR_OPTIONS = {                                                           # Option name: (key in the options dictionary, value conversion or 'None' for switches, default, help)
+    '--seed': ('Seed', int, 1, "random seed; the same seed gives the same g-code"),
+    '--radius-error': ('RadiusError', float, 0.0004, "largest error added to arc end points (inches)"),
+    '--arcs': ('Arcs', float, 0.35, "share of cutting moves that are pad arcs"),
+    '--full-circles': ('FullCircles', float, 0.05, "share of cutting moves that are full circles"),
+    '--numbered': ('Numbered', float, 0.3, "share of lines that get an N-word"),
+    '--curves': ('Curves', float, 0.0, "share of cutting moves that are curves made of short G1 moves"),
+    '--micro': ('Micro', float, 0.0, "share of cutting moves that are tiny or zero length G1 moves"),
+    '--pad-shapes': ('PadShapes', int, 0, "draw every pad arc as one of this many shapes (like the same pads all over a board); 0 makes each one different"),
+};
+
+# ******************************************************************************
+# Coordinate() - round a coordinate the way it gets printed
+#
+# Note: the tool position has to be tracked as printed, otherwise the arcs we
+# generate would start somewhere slightly different from where the g-code is.
+# ******************************************************************************
+
+def Coordinate(Value):
+
+    return(float("{0:.4f}".format(Value)));
+
+# ******************************************************************************
+# GenerateLines() - yield lines of g-code until there are at least LineCount
+# ******************************************************************************
+
+def GenerateLines(LineCount, Options):
+
+    Random = random.Random(Options['Seed']);
+
+    State = {'Lines': 0, 'N': 0};
+
+    def Line(Text):                                                             # Number and count a line on its way out (comments aren't numbered)
+        State['Lines'] += 1;
+
+        if not Text.startswith("(") and Random.random() < Options['Numbered']:
+            State['N'] += 10;
+            return("N{0} {1}\n".format(State['N'], Text));
+
+        return(Text + "\n");
+
+    yield Line("(Generated by gcodegen.py for Line Bender {0}, seed {1})".format(linebend.VERSION, Options['Seed']));
+    yield Line("(Units: inches, absolute coordinates, XY plane)");
+    yield Line("G20");
+    yield Line("G90");
+    yield Line("G17");
+    yield Line("M3");
+    yield Line("G00 Z{0:.4f}".format(SAFE_Z));
+
+    Shapes = [];                                                                # The same few pad arcs, relative to where they start: (end X, end Y, I, J, G-word)
+
+    for Shape in range(Options['PadShapes']):
+        Radius = Random.uniform(*PAD_RADIUS);
+        Start = Random.uniform(0, 2 * pi);
+        Sweep = Random.uniform(*PAD_SWEEP);
+        Code = Random.choice((2, 3));
+
+        if Code == 2:
+            End = Start - Sweep;
+        else:
+            End = Start + Sweep;
+
+        Shapes.append((Coordinate(Radius * (cos(End) - cos(Start)) + Random.uniform(-Options['RadiusError'], Options['RadiusError'])),
+                       Coordinate(Radius * (sin(End) - sin(Start)) + Random.uniform(-Options['RadiusError'], Options['RadiusError'])),
+                       Coordinate(-Radius * cos(Start)), Coordinate(-Radius * sin(Start)), Code));
+
+    Island = 0;
+
+    while State['Lines'] < LineCount:
+        Island += 1;
+
+        X = Coordinate(Random.uniform(0, BOARD_SIZE[0]));                       # Rapid to the island's start point and plunge
+        Y = Coordinate(Random.uniform(0, BOARD_SIZE[1]));
+
+        yield Line("(Isolation island {0})".format(Island));
+        yield Line("G00 X{0:.4f} Y{1:.4f}".format(X, Y));
+        yield Line("G01 Z{0:.4f} F{1}".format(CUT_Z, PLUNGE_FEED));
+
+        for Move in range(Random.randint(*ISLAND_MOVES)):
+            Kind = Random.random();
+
+            if Kind < Options['FullCircles']:                                   # Full circle pad outline, ends where it starts
+                Radius = Coordinate(Random.uniform(*PAD_RADIUS));
+                yield Line("G02 X{0:.4f} Y{1:.4f} I{2:.4f} J{3:.4f}".format(X, Y, Radius, 0.0));
+
+            elif Kind < Options['FullCircles'] + Options['Arcs'] and len(Shapes) > 0:   # One of the usual pad arcs, only somewhere else
+                Xe, Ye, I, J, Code = Random.choice(Shapes);
+
+                yield Line("G0{0} X{1:.4f} Y{2:.4f} I{3:.4f} J{4:.4f}".format(Code, X + Xe, Y + Ye, I, J));
+
+                X, Y = Coordinate(X + Xe), Coordinate(Y + Ye);
+
+            elif Kind < Options['FullCircles'] + Options['Arcs']:               # Pad arc, with its end point a bit off (the thing Line Bender fixes)
+                Radius = Random.uniform(*PAD_RADIUS);
+                Start = Random.uniform(0, 2 * pi);
+                Sweep = Random.uniform(*PAD_SWEEP);
+                Code = Random.choice((2, 3));
+
+                Xc = X - Radius * cos(Start);
+                Yc = Y - Radius * sin(Start);
+
+                if Code == 2:                                                   # G2 goes clockwise
+                    End = Start - Sweep;
+                else:
+                    End = Start + Sweep;
+
+                Xe = Coordinate(Xc + Radius * cos(End) + Random.uniform(-Options['RadiusError'], Options['RadiusError']));
+                Ye = Coordinate(Yc + Radius * sin(End) + Random.uniform(-Options['RadiusError'], Options['RadiusError']));
+
+                yield Line("G0{0} X{1:.4f} Y{2:.4f} I{3:.4f} J{4:.4f}".format(Code, Xe, Ye, Xc - X, Yc - Y));
+
+                X, Y = Xe, Ye;
+
+            elif Kind < Options['FullCircles'] + Options['Arcs'] + Options['Curves']:   # A curve the way Line Grinder draws most of them, one short G1 after the other
+                Radius = Random.uniform(*CURVE_RADIUS);
+                Start = Random.uniform(0, 2 * pi);
+                Sweep = Random.choice((-1, 1)) * Random.uniform(*CURVE_SWEEP);
+                Moves = Random.randint(*CURVE_MOVES);
+
+                Xc = X - Radius * cos(Start);
+                Yc = Y - Radius * sin(Start);
+
+                for Step in range(1, Moves + 1):
+                    X = Coordinate(Xc + Radius * cos(Start + Sweep * Step / Moves));
+                    Y = Coordinate(Yc + Radius * sin(Start + Sweep * Step / Moves));
+                    yield Line("G01 X{0:.4f} Y{1:.4f}".format(X, Y));
+
+            elif Kind < Options['FullCircles'] + Options['Arcs'] + Options['Curves'] + Options['Micro']:   # A move that hardly goes anywhere, if at all
+                X = Coordinate(X + Random.choice((0, 1)) * Random.uniform(-MICRO_STEP, MICRO_STEP));
+                Y = Coordinate(Y + Random.choice((0, 1)) * Random.uniform(-MICRO_STEP, MICRO_STEP));
+                yield Line("G01 X{0:.4f} Y{1:.4f}".format(X, Y));
+
+            else:                                                               # Plain isolation trace segment
+                X = Coordinate(X + Random.uniform(-TRACE_STEP, TRACE_STEP));
+                Y = Coordinate(Y + Random.uniform(-TRACE_STEP, TRACE_STEP));
+
+                if Move == 0:
+                    yield Line("G01 X{0:.4f} Y{1:.4f} F{2}".format(X, Y, CUT_FEED));
+                else:
+                    yield Line("G01 X{0:.4f} Y{1:.4f}".format(X, Y));
+
+        yield Line("G00 Z{0:.4f}".format(SAFE_Z));
+
+    yield Line("M5");
+    yield Line("M30");
+
+# ******************************************************************************
+# WriteGCode() - write at least LineCount lines of g-code to a file (or stdout)
+# ******************************************************************************
+
+def WriteGCode(FileName, LineCount, Options = None):
+
+    if Options is None:
+        Options, Unused = linebend.ScanForOptions([], GENERATOR_OPTIONS);
+
+    if FileName == linebend.STREAM_NAME:
+        OutFile = sys.stdout;
+    else:
+        OutFile = open(FileName, 'w');
+
+    OutFile.writelines(GenerateLines(LineCount, Options));
+
+    if OutFile is not sys.stdout:
+        OutFile.close();
+
+# ******************************************************************************
+# Main() - generate the requested number of lines into the requested file
+# ******************************************************************************
+
+def main():
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.WARNING)
+
+    Options, Arguments = linebend.ScanForOptions(sys.argv[1:], GENERATOR_OPTIONS);
+
+    if len(Arguments) < 1:
+        print;
+        print u"Synthetic Line Grinder style g-code generator for Line Bender {0}".format(linebend.VERSION);
+        print u"Usage: gcodegen [<options>] <number of lines> [<output file>]";
+        print u"The output goes to stdout unless a file is given";
+        linebend.PrintOptions(GENERATOR_OPTIONS);
+        sys.exit(1);
+
+    try:
+        LineCount = int(Arguments[0]);
+    except ValueError:
+        logging.error("Invalid number of lines \"{0}\", exiting.".format(Arguments[0]));
+        sys.exit(1);
+
+    if len(Arguments) < 2:
+        FileName = linebend.STREAM_NAME;
+    else:
+        FileName = Arguments[1];
+
+    try:
+        WriteGCode(FileName, LineCount, Options);
+    except IOError:
+        logging.error("Cannot write output file \"{0}\", exiting.".format(FileName));
+        sys.exit(1);
+
+if __name__ == "__main__":
+    main();
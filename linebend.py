@@ -24,10 +24,61 @@
 
 import os;
 import re;
+import glob;
 import sys;
+import zlib;
+import bz2;
+import mmap;
+import array;
+import json;
+import time;
+import errno;
+import select;
+import signal;
+import socket;
+import Queue;
+import pstats;
+import cProfile;
+import hashlib;
 import logging;
+import logging.handlers;
+import threading;
+import contextlib;
+import multiprocessing;
 
-from math import sqrt, radians, sin, cos, atan;
+from math import sqrt, hypot, floor, radians, sin, cos, atan, atan2;
+from itertools import islice, izip;
+from collections import deque;
+from cStringIO import StringIO;
+from timeit import default_timer as Clock;                                      # The most precise wall clock on any platform
+
+try:                                                                            # The C pickler is a lot faster, where there is one
+    import cPickle as pickle;
+except ImportError:
+    import pickle;
+
+try:                                                                            # Serial ports are set up through termios, where there is one
+    import termios;
+except ImportError:
+    termios = None;
+
+try:                                                                            # xz files need lzma (the backports.lzma package, in Python 2)
+    from backports import lzma;
+except ImportError:
+    try:
+        import lzma;
+    except ImportError:
+        lzma = None;
+
+try:                                                                            # zstd files need the zstandard package
+    import zstandard;
+except ImportError:
+    zstandard = None;
+
+try:                                                                            # NumPy is optional, only the vectorized arc math needs it
+    import numpy;
+except ImportError:
+    numpy = None;
 
 # ******************************************************************************
 # Constants (fine - "variables not to be modified", happy now?)
@@ -38,6 +89,8 @@ VERSION = 0.1;
 ONE_MIL = 0.001;
 ONE_TENTH_MIL = 0.0001;
 
+NIST_TOLERANCE = 2 * ONE_TENTH_MIL;                                             # Largest start / end radius difference of an arc the NIST RS274NGC interpreter accepts (inches)
+
 UNITS_MODE_METRIC = 1;
 UNITS_MODE_IMPERIAL = 2;
 
@@ -48,6 +101,157 @@ WORK_PLANE_XY = 1;
 WORK_PLANE_ZX = 2;
 WORK_PLANE_YZ = 3;
 
+WORD_PATTERN = re.compile(";.*|\(.*?\)|([GMN])(\d+)|([FXYZIJKR])([+-]?[\d.]+)", re.IGNORECASE);  # Comments, integer words and real words, all in one go
+
+MAP_RUN_PATTERN = re.compile(                                                   # Runs of plain, well-formed G0/G1 lines (with a comment at the end at most), nothing more
+    r"^(?:[ \t]*(?:N\d+[ \t]*)?G0?[01][ \t]*"
+    r"(?:X(?P<X>[+-]?(?:\d+\.?\d*|\.\d+))[ \t]*)?"                              # The last X/Y/Z of the whole run end up in these groups
+    r"(?:Y(?P<Y>[+-]?(?:\d+\.?\d*|\.\d+))[ \t]*)?"
+    r"(?:Z(?P<Z>[+-]?(?:\d+\.?\d*|\.\d+))[ \t]*)?"
+    r"(?:F[+-]?[\d.]+[ \t]*)?(?:\([^)\n]*\)[ \t]*)?(?:;[^\n]*)?\r?\n){1,4096}", re.IGNORECASE | re.MULTILINE);
+
+INTEGER_WORDS = frozenset("GM");                                                # Words converted to int (the rest of the numeric ones become floats)
+
+ARC_MEMO_SCALE = 1e9;                                                           # Arc shapes are remembered in steps of one over this, way below what g-code is written with
+
+STREAM_NAME = "-";                                                              # File name standing for stdin (as input) or stdout (as output)
+PARTIAL_PREFIX = ".partial.";                                                   # Batch outputs are written under their name with this in front, until they're done
+
+BLOCK_LINES = 65536;                                                            # Lines read and bent at once in vectorized mode (keeps memory use bounded)
+
+MAP_WRITE_BYTES = 1 << 20;                                                      # Untouched bytes of a memory mapped input are written in spans of about this size...
+MAP_WRITE_LINES = 1024;                                                         # ...or whenever this many replaced lines are waiting to go out with them
+
+TABLE_COUNTER_NAMES = ('TextLinesHandled', 'TextLinesIgnored', 'PathLinesHandled', 'PathLinesDropped', 'PathArcsAdjusted', 'PathArcsUnedited');
+PATH_COUNTER_NAMES = TABLE_COUNTER_NAMES + ('PathArcsAccepted', 'PathArcsFlawed');
+COUNTER_NAMES = PATH_COUNTER_NAMES + ('CacheHits', 'CacheMisses', 'PathSecondsSaved', 'CompactBytesBefore', 'CompactBytesAfter',
+                                      'PathIslandsReordered', 'RapidDistanceBefore', 'RapidDistanceAfter', 'ArcMemoHits', 'ArcMemoMisses',
+                                      'StreamLinesSent', 'StreamFirstSeconds');
+
+STAGE_NAMES = ('Read', 'Scan', 'Bend', 'Format', 'Write');                      # Stages timed by the instrumentation (scanning includes converting numbers)
+
+PROFILE_FUNCTIONS = 25;                                                         # How many of the hottest functions --profile lists
+
+PROGRAM_WORDS = "NGMFXYZIJK";                                                   # Words whose presence the program model keeps a bit for, in this order (see LoadProgram())
+PROGRAM_NUMBERS = frozenset("GMXYZIJK");                                        # Words whose numbers it keeps too (N and F are only ever needed as text)
+PROGRAM_CODE_NONE = -1;                                                         # Motion code column value for lines without a G-word...
+PROGRAM_CODE_LARGE = 127;                                                       # ...and for G-words too large for it (their number is kept with the rest)
+PROGRAM_SPELLINGS = 255;                                                        # Most different spellings of G-words ("2", "02"...) a program model keeps track of
+
+SHRINK_BLOCK_SECONDS = 0.004;                                                   # Shortest time a controller spends on any move, however tiny (about 250 moves a second)
+SHRINK_MAX_MOVES = 64;                                                          # Most moves merged into one (keeps the fitting quick and the held back lines few)
+SHRINK_MAX_SWEEP = radians(270);                                                # Largest arc fitted, well away from full circles and their ambiguities
+SHRINK_LINE_START_PATTERN = re.compile(r"^[ \t]*(?:[Nn][ \t]*\d+[ \t]*)?");    # Where a G-word goes on a line: first thing, or right after the N-word
+
+COMPACT_LINE_PATTERN = re.compile(r"(?:\s+|\([^)]*\)|;.*|[A-Z]\s*[+-]?(?:\d+\.?\d*|\.\d+))*$", re.IGNORECASE);   # Lines made of nothing but words and comments, which the compact encoder can take apart
+COMPACT_WORD_PATTERN = re.compile(r"(\([^)]*\)|;.*)|([A-Z])\s*([+-]?(?:\d+\.?\d*|\.\d+))", re.IGNORECASE);       # ...and their pieces: (comment, letter, number)
+COMPACT_NOTE_PATTERN = re.compile(r"\s*\((Center (?:moved|preserved) by Line Bender[^)]*)\)");  # Line Bender's own comments on the arcs it writes
+COMPACT_SPELLINGS = 65536;                                                      # Most compact spellings of words the compact encoder remembers at once
+COMPACT_MOTION_CODES = frozenset((0.0, 1.0, 2.0, 3.0));                         # G-words the compact encoder knows the meaning of...
+COMPACT_MODAL_CODES = frozenset((17.0, 18.0, 19.0, 20.0, 21.0, 40.0, 49.0, 54.0, 55.0, 56.0, 57.0, 58.0, 59.0, 61.0, 64.0, 80.0, 90.0, 91.0, 94.0));   # ...and the ones that don't get in its way
+
+REORDER_COMMENT_PATTERN = re.compile(r"\(.*?\)|;.*");                          # Comments, which may say anything they like...
+REORDER_FOREIGN_PATTERN = re.compile(r"[^\sFGIJKMNXYZ\d.+-]", re.IGNORECASE);  # ...unlike the rest of a line, where anything unknown keeps an island where it is
+REORDER_LINE_PATTERN = re.compile(                                              # Plain moves, the way Line Grinder and Line Bender write them, for a quick look
+    r"[ \t]*(?:N\d+[ \t]*)?(?:G0?(?P<G>[0-3])(?![\d.])[ \t]*)?"
+    r"(?:X(?P<X>[+-]?(?:\d+\.?\d*|\.\d+))[ \t]*)?(?:Y(?P<Y>[+-]?(?:\d+\.?\d*|\.\d+))[ \t]*)?(?:Z(?P<Z>[+-]?(?:\d+\.?\d*|\.\d+))[ \t]*)?"
+    r"(?:I[+-]?(?:\d+\.?\d*|\.\d+)[ \t]*)?(?:J[+-]?(?:\d+\.?\d*|\.\d+)[ \t]*)?(?P<F>F[+-]?(?:\d+\.?\d*|\.\d+)[ \t]*)?"
+    r"(?:\([^)]*\)[ \t]*|;.*)?\r?\n?$", re.IGNORECASE);
+REORDER_CELL_ISLANDS = 2;                                                       # Islands per grid cell NearestOrder() aims at
+REORDER_WINDOW = 8;                                                             # Most islands a 2-opt move reverses at once
+REORDER_SWEEPS = 2;                                                             # Most 2-opt passes over the islands (it stops by itself once nothing improves)
+
+INDEX_FORMAT = 1;                                                               # Bump whenever the layout of index files changes
+INDEX_INTERVAL = 4096;                                                          # Lines between checkpoints in an index file
+INDEX_NUMBER_PATTERN = re.compile(r"^[ \t]*N[ \t]*(\d+)", re.IGNORECASE | re.MULTILINE);   # N-words, where they belong (first thing on a line)
+
+SERVE_TICK = 0.05;                                                              # Longest the server waits for anything before checking on its jobs (seconds)
+WATCH_INTERVAL = 0.25;                                                          # How often a watched directory is looked at; new files have to sit still for this long too
+TRIM_INTERVAL = 30.0;                                                           # How often the server trims the cache, if it has bent anything since (seconds)
+
+COMPRESSION_MAGIC = (("\x1f\x8b", 'gzip'), ("BZh", 'bz2'), ("\xfd7zXZ\x00", 'xz'), ("\x28\xb5\x2f\xfd", 'zstd'));   # Compressed inputs are known by their first bytes...
+COMPRESSION_MAGIC_BYTES = 6;
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'};   # ...and compressed outputs by their extension
+COMPRESSION_MODULES = {'gzip': "zlib", 'bz2': "bz2", 'xz': "lzma (backports.lzma)", 'zstd': "zstandard"};   # What each of them needs
+COMPRESSION_READ_BYTES = 1 << 20;                                               # Compressed bytes read at a time
+COMPRESSION_WRITE_BYTES = 1 << 20;                                              # Bytes gathered before compressing them
+
+VERIFY_ARC_PATTERN = re.compile(r"[Gg]0*[23](?![\d.])");                         # G2/G3 words, wherever they are (even in comments, they're only a hint)
+VERIFY_LINE_PATTERN = re.compile(                                               # Lines the way Line Grinder and Line Bender write them, taken apart (G, X, Y, I, J)
+    r"[ \t]*(?:[Nn]\d+[ \t]*)?(?:[Gg]0*(\d+)[ \t]*)?(?:[Xx]([+-]?[\d.]+)[ \t]*)?(?:[Yy]([+-]?[\d.]+)[ \t]*)?(?:[Zz][+-]?[\d.]+[ \t]*)?"
+    r"(?:[Ii]([+-]?[\d.]+)[ \t]*)?(?:[Jj]([+-]?[\d.]+)[ \t]*)?(?:[Ff][+-]?[\d.]+[ \t]*)?(?:\([^)]*\)[ \t]*|;.*)?\r?$");   # (no IGNORECASE, that's a lot slower)
+VERIFY_SLACK = ONE_TENTH_MIL;                                                   # Farthest an arc's end point may move (by being written with four decimals)
+VERIFY_WORST = 10;                                                              # How many of the worst arcs --verify lists
+
+PIPELINE_BATCH_LINES = 4096;                                                    # Lines read or written at a time by the pipeline's threads...
+PIPELINE_QUEUE_BATCHES = 8;                                                     # ...with this many batches waiting at most on either side of the bending
+
+SEND_QUEUE_LINES = 4096;                                                        # Most lines bent ahead of what's been sent to the controller...
+SEND_BATCH_LINES = 64;                                                          # ...handed to the sending thread this many at a time
+SEND_STRIP_PATTERN = re.compile(r"\([^)]*\)|;.*|\s+");                           # What the controller doesn't need to see (comments and spaces)
+SEND_WAKE_SECONDS = 2.0;                                                        # Longest the controller may go on talking after connecting (greetings after a reset)...
+SEND_SETTLE_SECONDS = 0.25;                                                     # ...before it's quiet for this long and the streaming starts
+
+SESSION_BLOCK_LINES = 1024;                                                     # Lines a BenderSession bends in one go before letting other sessions have a turn
+
+CACHE_FORMAT = 1;                                                               # Bump whenever the layout of cache entries changes
+CACHE_BLOCK_MASK = 0x3FF;                                                       # A cached block ends after a line whose CRC has these bits all zero (about every 1024 lines)...
+CACHE_BLOCK_LINES = (256, 16384);                                               # ...but never before the first, and always at the second number of lines
+
+COMMAND_OPTIONS = {                                                             # Option name: (key in the options dictionary, value conversion or 'None' for switches, default, help)
+    '--cache': ('CacheDirectory', str, None, "keep results in this directory and reuse them for unchanged files and blocks"),
+    '--cache-size': ('CacheSize', int, 512, "maximum size of the cache directory in megabytes (oldest entries go first)"),
+    '--batch': ('Batch', None, False, "bend every file named (directories and wildcards too) to <name>_BENT<ext>"),
+    '--jobs': ('Jobs', int, 1, "bend blocks of lines (or files, with --batch) in this many processes (0 for one per CPU)"),
+    '--tolerance': ('Tolerance', float, None, "only bend arcs whose end and start radius differ by more than this (others pass untouched)"),
+    '--check': ('Check', None, False, "write nothing, just report arcs out of tolerance (NIST's by default) and exit with 2 if any"),
+    '--timing': ('Timing', None, False, "time every stage and show throughput and center shifts with the stats"),
+    '--stats-json': ('StatsJson', str, None, "write all stats, timing included, to this file as JSON"),
+    '--profile': ('Profile', None, False, "run under the profiler and list the hottest functions (main process only)"),
+    '--vector': ('Vector', None, False, "bend arcs in NumPy batches (needs NumPy)"),
+    '--shrink': ('Shrink', float, None, "drop zero length moves and merge runs of G1 moves into single G1/G2/G3 ones within this tolerance (keeping the first N-word of each run)"),
+    '--mmap': ('Mapped', None, False, "read the input through a memory map, copying untouched lines straight from it"),
+    '--watch': ('Watch', str, None, "keep running, bending every new file showing up in this directory"),
+    '--socket': ('Socket', str, None, "keep running, bending the files named on this Unix socket (\"STATUS\" for the queue)"),
+    '--index': ('Index', None, False, "write (or refresh) a checkpoint index of the input to <input>.lbx, for --lines and --from-n"),
+    '--lines': ('Lines', lambda Text: tuple(int(Part) if Part != "" else None for Part in Text.split("-")), None, "bend only this range of lines (\"<first>-<last>\", either may be left out), starting from the index"),
+    '--from-n': ('FromN', int, None, "bend only from the line with this N-word on (to the end, or to the last of --lines), starting from the index"),
+    '--split': ('Split', int, None, "just list this many line ranges splitting the input at its checkpoints (for --lines in parallel runs)"),
+    '--reorder': ('Reorder', None, False, "cut the isolation islands in an order with less rapid travel between them (islands stay as they are, nothing comes out before the whole file is bent)"),
+    '--arc-memo': ('ArcMemo', int, 4096, "remember the new centers of this many arc shapes (relative to their start) for reuse; 0 turns it off"),
+    '--compact': ('Compact', None, False, "write compact g-code: no repeated modal words or unchanged coordinates, no spaces, no trailing zeros"),
+    '--annotate': ('Annotate', None, False, "with --compact, keep Line Bender's comments on the arcs in <output>.notes instead of dropping them"),
+    '--verify': ('Verify', None, False, "check a bent output (<name>_BENT<ext> by default) against its input instead of bending, and list the worst arcs"),
+    '--send': ('Send', str, None, "stream the output to a GRBL style controller on this serial port (or pty) while it's being bent (with --reorder, only once it's all bent)"),
+    '--baud': ('Baud', int, 115200, "baud rate of the serial port for --send"),
+    '--rx-buffer': ('RxBuffer', int, 128, "size of the controller's receive buffer in bytes, for --send's flow control"),
+    '--pipeline': ('Pipeline', None, False, "read and write in threads of their own, while the lines in between are bent"),
+    '--program': ('Program', None, False, "load the whole file into a compact in-memory program first, then bend that"),
+};
+
+SESSION_STATE_NAMES = COUNTER_NAMES + ('UnitsMode', 'CoordsMode', 'WorkPlane', 'CurrentPosition', 'ArcTolerance', 'CheckOnly', 'ShrinkTolerance', 'Compacting', 'Reordering', 'ArcMemoSize',
+                                       'Instrumented', 'Debugging', 'Statistics', 'PendingArcs', 'CacheDirectory', 'CacheSettings', 'CacheManifest', 'Raising', 'SessionTurn');
+
+# ******************************************************************************
+# Exceptions (only raised for a BenderSession, the script just logs and exits)
+# ******************************************************************************
+
+class BenderError(Exception):                                                   # Anything that stops Line Bender, with the line it happened on (if any)
+
+    def __init__(self, Message, LineNumber = None):
+
+        Exception.__init__(self, Message);
+        self.LineNumber = LineNumber;
+
+class GCodeError(BenderError):                                                  # The g-code is something Line Bender can't handle (repeated words, R-words, bad numbers)
+    pass;
+
+class ArcError(BenderError):                                                    # An arc can't be bent (its radius is shorter than half the distance between its ends)
+    pass;
+
+class FileError(BenderError):                                                   # A file (or cache entry) can't be read or written
+    pass;
+
 # ******************************************************************************
 # Global variables
 # ******************************************************************************
@@ -56,9 +260,29 @@ TextLinesHandled = 0;
 TextLinesIgnored = 0;                                                           # Number of lines of g-code ignored (because no G0/G1/G2/G3 or X/Y/Z was found on the line)
 
 PathLinesHandled = 0;                                                           # Number of path lines analyzed (number of lines found containing a G0/G1/G2/G3)
-PathLinesDropped = 0;                                                           # Number of path lines removed as too short (Line Grinder uses these). Not implemented in 0.1
-PathArcsAdjusted = 0;                                                           # Number of arc path lines recalculated (all arcs, currently, whether really needed or not)
+PathLinesDropped = 0;                                                           # Number of path lines removed as too short or merged into others (only with a shrink tolerance)
+PathArcsAdjusted = 0;                                                           # Number of arc path lines recalculated (all arcs, whether really needed or not, unless there's a tolerance)
 PathArcsUnedited = 0;                                                           # Number of arc path lines NOT recalculated: any full circles (sole exceptions, see above )
+PathArcsAccepted = 0;                                                           # Number of arc path lines left untouched for being within tolerance (only with a tolerance)
+PathArcsFlawed = 0;                                                             # Number of arc path lines found out of tolerance (only with a tolerance, or when checking)
+
+PathSecondsSaved = 0.0;                                                         # Estimated machine time saved by shrinking the toolpath (only with a shrink tolerance)
+
+CompactBytesBefore = 0;                                                         # Size of the output before and after compacting it (only when compacting)
+CompactBytesAfter = 0;
+
+PathIslandsReordered = 0;                                                       # Number of islands whose order was up to the rapid travel reordering (only when reordering)
+RapidDistanceBefore = 0.0;                                                      # Rapid travel between those islands before and after reordering them (in file units)
+RapidDistanceAfter = 0.0;
+
+ArcMemoHits = 0;                                                                # Number of arcs whose new center came from the arc memo (see RecallThatArc())
+ArcMemoMisses = 0;                                                              # Number of arcs looked up in the arc memo but bent anyway (and remembered)
+
+StreamLinesSent = 0;                                                            # Number of lines streamed to a controller (only with --send)
+StreamFirstSeconds = 0.0;                                                       # Seconds from opening the output to sending the first of them
+
+CacheHits = 0;                                                                  # Number of blocks of lines whose output came from the cache
+CacheMisses = 0;                                                                # Number of blocks of lines looked up in the cache but bent anyway (and stored)
 
 UnitsMode = None;                                                               # Tracks current units mode (metric/imperial). Not implemented in 0.1
 CoordsMode = None;                                                              # Tracks current coordinate mode (absolute/relative). Not implemented in 0.1
@@ -66,6 +290,52 @@ WorkPlane = None;
 
 CurrentPosition = {'X': None, 'Y': None, 'Z': None};                            # This tracks current X/Y/Z position at all times to be used as starting point for arcs
 
+ArcTolerance = None;                                                            # Arcs with a smaller radius difference than this are left alone ('None' means bend them all)
+CheckOnly = False;                                                              # Whether arcs out of tolerance are only reported instead of bent
+
+ShrinkTolerance = None;                                                         # How far merged moves may stray from the original ones ('None' means leave them all alone)
+Compacting = False;                                                             # Whether the output is written as compact g-code (see CompactEncoder)
+Reordering = False;                                                             # Whether islands are reordered to cut down on rapid travel (see IslandReorderer)
+
+ArcMemoSize = 0;                                                                # Most arc shapes remembered at once (0 means none, see RecallThatArc())
+ArcMemo = [{}, {}];                                                             # Remembered arc shapes and their new centers: the recently used ones and the ones before
+
+Instrumented = False;                                                           # Whether stages get timed and center shifts measured (see Statistics)
+Debugging = False;                                                              # Whether debug messages are logged at all, so they don't even get put together otherwise
+
+Statistics = None;                                                              # Stage times and center shift figures, when instrumented (see NewStatistics())
+
+PendingArcs = None;                                                             # Arcs collected for AdjustArcs() while in vectorized mode ('None' means adjust them right away)
+
+Raising = False;                                                                # Whether errors raise a BenderError instead of exiting (see Fail())
+
+SessionLock = threading.RLock();                                                # Held by whichever BenderSession has its state in the globals above
+SessionTurn = None;                                                             # That session's way of letting the others have a turn ('None' outside of sessions, see TakeTurns())
+
+WorkerRecords = None;                                                           # Log records held back by a worker process until its block is handed back in order
+
+ProgramLetters = {};                                                            # Letters of the numbers kept for each (word mask, large G-word or not), see ProgramValues()
+
+CacheDirectory = None;                                                          # Where cached results live ('None' means no caching)
+CacheSettings = None;                                                           # Everything besides the input that the output depends on, as a string for the cache keys
+CacheManifest = None;                                                           # Keys of the blocks making up the current file, in order, for its file level cache entry
+
+# ******************************************************************************
+# Fail() - give up on an error: log it and exit, or raise it for a BenderSession
+#
+# Note: Logged means the message has been logged (by a worker process) already.
+# ******************************************************************************
+
+def Fail(Message, Error = GCodeError, Logged = False):
+
+    if Raising:
+        raise Error(Message, TextLinesHandled if Error is GCodeError else None);
+
+    if not Logged:
+        logging.error(Message + ", exiting.");
+
+    sys.exit(1);
+
 # ******************************************************************************
 # sqr() - well what do you think it does?!? Since Python couldn't be bothered...
 # ******************************************************************************
@@ -136,14 +406,61 @@ def BendThatArc(X0, Y0, X1, Y1, X2, Y2):
         return(X4, Y4);                                                         # Instead, we simply choose the solution closer to the original center...
         
 # ******************************************************************************
-# AdjustArc() - recalculate origin (I,J) to match start and end points better
+# RecallThatArc() - BendThatArc(), remembering the results for arcs of the same shape
 #
-# Note: Arcs in non-XY planes...? K...? Heeey, where is everyone going...?!?
+# Note: the very same pads come up all over a board, only somewhere else each
+# time. So arcs are remembered by where their end and center are relative to
+# their start, along with where the new center is relative to the start. The
+# shape is counted in ARC_MEMO_SCALE steps, way finer than the g-code is
+# written with: the same pad is still the same shape wherever it is (the
+# rounding errors of moving it are smaller still), but two different shapes
+# never share a center, so the output is the same as without remembering.
+# The memo keeps up to ArcMemoSize shapes in two generations of half as many:
+# the recently used ones and the ones before those. Once the first is full, the
+# second is forgotten and the first takes its place, so the shapes forgotten
+# are always ones not used lately (it's a least recently used cache, only in
+# two big steps instead of one shape at a time, which is a lot cheaper).
 # ******************************************************************************
 
-def AdjustArc(Position, Values, Params):
+def RecallThatArc(X0, Y0, X1, Y1, X2, Y2):
 
-    global PathArcsUnedited;
+    global ArcMemoHits;
+    global ArcMemoMisses;
+
+    if ArcMemoSize == 0:
+        return(BendThatArc(X0, Y0, X1, Y1, X2, Y2));
+
+    Key = (int(floor((X1 - X0) * ARC_MEMO_SCALE + 0.5)), int(floor((Y1 - Y0) * ARC_MEMO_SCALE + 0.5)),   # Rounded down, not towards zero, so that every step is
+           int(floor((X2 - X0) * ARC_MEMO_SCALE + 0.5)), int(floor((Y2 - Y0) * ARC_MEMO_SCALE + 0.5)));  # just as wide on either side of zero
+
+    Recent = ArcMemo[0];
+    Center = Recent.get(Key);
+
+    if Center is not None:                                                      # Used lately, nothing else to do
+        ArcMemoHits += 1;
+        return(X0 + Center[0], Y0 + Center[1]);
+
+    Center = ArcMemo[1].get(Key);
+
+    if Center is not None:
+        ArcMemoHits += 1;
+    else:
+        ArcMemoMisses += 1;
+        Xc, Yc = BendThatArc(X0, Y0, X1, Y1, X2, Y2);
+        Center = (Xc - X0, Yc - Y0);
+
+    if len(Recent) * 2 >= ArcMemoSize:                                          # Time for a new generation
+        ArcMemo[:] = [{}, Recent];
+
+    ArcMemo[0][Key] = Center;
+
+    return(X0 + Center[0], Y0 + Center[1]);
+
+# ******************************************************************************
+# ArcPoints() - find the start, end and center points of an arc in absolute XY
+# ******************************************************************************
+
+def ArcPoints(Position, Values):
 
     Xs = Position['X'];                                                         # Coordinates of the starting point for the arc
     Ys = Position['Y'];
@@ -168,21 +485,47 @@ def AdjustArc(Position, Values, Params):
     else:
         Yc = Ys;                                                                # otherwise just use the current Y
 
-    if  dist(Xs, Ys, Xe, Ye) > 0:                                               # Cannot recalculate full circle arcs from endpoint(s) and radius; thankfully, there's no need either - they're always valid
-        NewXc, NewYc = BendThatArc(Xs, Ys, Xe, Ye, Xc, Yc);                     # Do the magic, get some new center coordinates
-        
+    return(Xs, Ys, Xe, Ye, Xc, Yc);
+
+# ******************************************************************************
+# RadiusDelta() - how much an arc's end radius differs from its start radius
+# ******************************************************************************
+
+def RadiusDelta(Xs, Ys, Xe, Ye, Xc, Yc):
+
+    return(abs(dist(Xs, Ys, Xc, Yc) - dist(Xe, Ye, Xc, Yc)));
+
+# ******************************************************************************
+# ArcLine() - form the replacement line of g-code for an arc with a new center
+#
+# Note: NewXc/NewYc being 'None' stands for a full circle, which is preserved.
+# ******************************************************************************
+
+def ArcLine(LineNumber, Params, Values, Xs, Ys, Xe, Ye, Xc, Yc, NewXc, NewYc):
+
+    global PathArcsUnedited;
+
+    if NewXc is not None:                                                       # If there is a new center,
         NewI = NewXc - Xs;                                                      # Calculate the relative I/J members from the absolute center X/Y
         NewJ = NewYc - Ys;
-            
-        if Params['N'] is None:                                                 # If there is no line number,
-            LineNumberString = "";                                              # set the line number string to empty
-        else:                                                                   # If there is one,
-            LineNumberString = " (aka \"N" + Params['N'] + "\")";               # form a string to be included in any messages referring to this line
 
         OldCoordString = "[{0:.4f}, {1:.4f}]".format(Xc, Yc);
         NewCoordString = "[{0:.4f}, {1:.4f}]".format(NewXc, NewYc);
             
-        logging.debug("Adjusting center of arc from line {0}".format(TextLinesHandled) + LineNumberString + " from " + OldCoordString + " to " + NewCoordString);
+        if Debugging:                                                           # Only bother with the message if it's going to be seen
+            if Params['N'] is None:                                             # If there is no line number,
+                LineNumberString = "";                                          # set the line number string to empty
+            else:                                                               # If there is one,
+                LineNumberString = " (aka \"N" + Params['N'] + "\")";           # form a string to be included in any messages referring to this line
+
+            logging.debug("Adjusting center of arc from line {0}".format(LineNumber) + LineNumberString + " from " + OldCoordString + " to " + NewCoordString);
+
+        if Instrumented:                                                        # Keep track of how far centers get moved
+            Shift = dist(Xc, Yc, NewXc, NewYc);
+            Statistics['ShiftSum'] += Shift;
+            Statistics['ShiftCount'] += 1;
+            if Shift > Statistics['ShiftMax']:
+                Statistics['ShiftMax'] = Shift;
             
         CommentString = " (Center moved by Line Bender from " + OldCoordString + " to " + NewCoordString + ")\n";
     else:                                                                       # If this arc is a full circle, we have to skip it
@@ -191,13 +534,14 @@ def AdjustArc(Position, Values, Params):
 
         PathArcsUnedited += 1;                                                  # Count this arc as skipped
 
-        if Params['N'] is None:                                                 # If there is no line number,
-            LineNumberString = "";                                              # set the line number string to empty
-        else:                                                                   # If there is one,
-            LineNumberString = " (aka \"N" + Params['N'] + "\")";               # form a string to be included in any messages referring to this line
+        if Debugging:                                                           # Only bother with the message if it's going to be seen
+            if Params['N'] is None:                                             # If there is no line number,
+                LineNumberString = "";                                          # set the line number string to empty
+            else:                                                               # If there is one,
+                LineNumberString = " (aka \"N" + Params['N'] + "\")";           # form a string to be included in any messages referring to this line
         
-        logging.debug("Preserving center of arc from line {0}".format(TextLinesHandled) + LineNumberString + " - center cannot be determined for full circles");
-            
+            logging.debug("Preserving center of arc from line {0}".format(LineNumber) + LineNumberString + " - center cannot be determined for full circles");
+
         CommentString = " (Center preserved by Line Bender - center cannot be determined for full circles)\n";
         
     # *** This is also fudged(more corner cutting). It could use a bit of customization depending on which params are present and/or unchanged, no?
@@ -207,157 +551,223 @@ def AdjustArc(Position, Values, Params):
     return(NewLine);                                                            # Return the newly recalculated arc as a text line to replace the old line of g-code
 
 # ******************************************************************************
-# ScanForParams() - split the line into code words, return a dictionary of them
+# AdjustArc() - recalculate origin (I,J) to match start and end points better
 #
-# Note: Only one instance of each word per line is handled right now even though
-# multiple ones are quite legal (but not common in machine-generated g-code);
-# The elements in the dictionary are either 'None' or the single string value.
-# Also, it's hardly optimal to look for everyting on every line. I know. Sorry.
+# Note: Arcs in non-XY planes...? K...? Heeey, where is everyone going...?!?
 # ******************************************************************************
 
-def ScanForParams(WorkLine):
+def AdjustArc(Position, Values, Params):
 
-    WorkLine = re.sub(";.*", "", WorkLine);                                     # Zap any semicolon-type comments (from semicolon to the end of the line)
+    if Instrumented:
+        Start = Clock();
 
-    WorkLine = re.sub("\(.*?\)", "", WorkLine);                                 # Yank any parentheses-based comments (only whatever is between any parenthesis sets)
-                                                                                # We don't do this because we're evil, but to avoid matching commands inside a comment
-    WorkLine = re.sub(" |\t", "", WorkLine);                                    # We also Kick all tabs and spaces (why? BECAUSE WE CAN...!)
-                                                                                # Seriously, spaces and tabs are valid anywhere, and might mess up our search logic
-    # *** N-words **********************
-    
-    NWords = re.search("N(\d+)", WorkLine, re.IGNORECASE);                      # Search for a "Nxx" style line number. Only the first occurence, sorry...
-    
-    if NWords is None:                                                          # If no N-word is found,
-        NParam = None;                                                          # set the return value to 'None',
-        LineNumberString = "";                                                  # and the line number string to empty
-    else:                                                                       # If one is found,
-        NParam = NWords.group(1);                                               # store its parameter to be returned,
-        LineNumberString = " (aka \"N" + NParam + "\")";                        # and form a string to be included in any messages referring to this line
-    
-    CommonErrorString = " on line {0}".format(TextLinesHandled) + LineNumberString + ", exiting.";
+    Xs, Ys, Xe, Ye, Xc, Yc = ArcPoints(Position, Values);                      # Get the arc's points straight first
 
-    # *** G-words **********************
-    
-    GWords = re.findall("G(\d+)", WorkLine, re.IGNORECASE);                     # Find all "Gxx" style codes (just the values)
-    
-    if len(GWords) > 1:                                                         # If there are multiple G-words on this line, we're busted, sorry...
-        logging.error("Multiple \"G\" words found" + CommonErrorString);
-        sys.exit(1);
-    elif len(GWords) > 0:                                                       # If there is one, store its parameter to be returned,
-        GParam = GWords[0];
-    else:                                                                       # If there are none, set the return value accordingly
-        GParam = None;
-        
-    # *** M-words **********************
+    if  dist(Xs, Ys, Xe, Ye) > 0:                                               # Cannot recalculate full circle arcs from endpoint(s) and radius; thankfully, there's no need either - they're always valid
+        NewXc, NewYc = RecallThatArc(Xs, Ys, Xe, Ye, Xc, Yc);                   # Do the magic (or remember doing it), get some new center coordinates
+    else:                                                                       # If this arc is a full circle, we have to skip it
+        NewXc, NewYc = None, None;
 
-    MWords = re.findall("M(\d+)", WorkLine, re.IGNORECASE);                     # Find all "Mxx" style codes (just the values)    
+    if Instrumented:
+        Now = Clock();
+        Statistics['Bend'] += Now - Start;
+        Start = Now;
 
-    if len(MWords) > 1:                                                         # If there are multiple M-words on this line, we're busted, sorry...
-        logging.error("Multiple \"M\" words found" + CommonErrorString);
-        sys.exit(1);
-    elif len(MWords) > 0:                                                       # If there is one, store its parameter to be returned,
-        MParam = MWords[0];
-    else:                                                                       # If there are none, set the return value accordingly
-        MParam = None;
+    NewLine = ArcLine(TextLinesHandled, Params, Values, Xs, Ys, Xe, Ye, Xc, Yc, NewXc, NewYc);
 
-    # *** F-words **********************
+    if Instrumented:
+        Statistics['Format'] += Clock() - Start;
 
-    FWords = re.findall("F([+-]{,1}[\d.]+)", WorkLine, re.IGNORECASE);          # Find all "Fxx" style codes possibly including sign and decimal point (only values)
-    
-    if len(FWords) > 1:                                                         # If there are multiple F-words on this line, we're busted, sorry...
-        logging.error("Multiple \"F\" words found" + CommonErrorString);
-        sys.exit(1);
-    elif len(FWords) > 0:                                                       # If there is one, store its parameter to be returned,
-        FParam = FWords[0];
-    else:                                                                       # If there are none, set the return value accordingly
-        FParam = None;
-    
-    # *** X-words **********************
-    
-    XWords = re.findall("X([+-]{,1}[\d.]+)", WorkLine, re.IGNORECASE);          # Find all "Xxxx" style codes possibly including sign and decimal point (only values)
+    return(NewLine);
 
-    if len(XWords) > 1:                                                         # If there are multiple X-words on this line, we're busted, sorry...
-        logging.error("Multiple \"X\" words found" + CommonErrorString);
-        sys.exit(1);
-    elif len(XWords) > 0:                                                       # If there is one, store its parameter to be returned,
-        XParam = XWords[0];
-    else:                                                                       # If there are none, set the return value accordingly
-        XParam = None;
+# ******************************************************************************
+# BendThoseArcs() - BendThatArc(), only for whole NumPy arrays of arcs at once
+#
+# Note: this has to follow BendThatArc() operation by operation, so that both
+# end up with the very same centers. Arcs that cannot be solved (radius shorter
+# than half the chord) come out as NaN, the caller sorts those out.
+# ******************************************************************************
 
-    # *** Y-words **********************
+def BendThoseArcs(X0, Y0, X1, Y1, X2, Y2):
 
-    YWords = re.findall("Y([+-]{,1}[\d.]+)", WorkLine, re.IGNORECASE);          # Find all "Yxxx" style codes possibly including sign and decimal point (only values)
+    with numpy.errstate(divide='ignore', invalid='ignore'):                     # Vertical chords and hopeless arcs are expected here, they are masked below
+        R = numpy.sqrt(numpy.square(X0 - X2) + numpy.square(Y0 - Y2));          # Radius we want to keep for each arc
 
-    if len(YWords) > 1:                                                         # If there are multiple Y-words on this line, we're busted, sorry...
-        logging.error("Multiple \"Y\" words found" + CommonErrorString);
-        sys.exit(1);
-    elif len(YWords) > 0:                                                       # If there is one, store its parameter to be returned,
-        YParam = YWords[0];
-    else:                                                                       # If there are none, set the return value accordingly
-        YParam = None;
+        T = numpy.sqrt(numpy.square(X0 - X1) + numpy.square(Y0 - Y1)) / 2;      # Half of the distance between each arc's endpoints
 
-    # *** Z-words **********************
+        S = numpy.sqrt(numpy.square(R) - numpy.square(T));                      # Centers' distance from the midpoints on the perpendiculars
 
-    ZWords = re.findall("Z([+-]{,1}[\d.]+)", WorkLine, re.IGNORECASE);          # Find all "Zxxx" style codes possibly including sign and decimal point (only values)
+        Xm = (X0 + X1) / 2;                                                     # Midpoints of the segments connecting the arc endpoints
+        Ym = (Y0 + Y1) / 2;
 
-    if len(ZWords) > 1:                                                         # If there are multiple Z-words on this line, we're busted, sorry...
-        logging.error("Multiple \"Z\" words found" + CommonErrorString);
-        sys.exit(1);
-    elif len(ZWords) > 0:                                                       # If there is one, store its parameter to be returned,
-        ZParam = ZWords[0];
-    else:                                                                       # If there are none, set the return value accordingly
-        ZParam = None;
-            
-    # *** I-words **********************
+        alfa = numpy.where(X0 == X1, radians(90), numpy.arctan((Y1 - Y0) / (X1 - X0)));   # Same angle as the scalar version, with the same special case
 
-    IWords = re.findall("I([+-]{,1}[\d.]+)", WorkLine, re.IGNORECASE);          # Find all "Ixxx" style codes possibly including sign and decimal point (only values)
-    
-    if len(IWords) > 1:                                                         # If there are multiple I-words on this line, we're busted, sorry...
-        logging.error("Multiple \"I\" words found" + CommonErrorString);
-        sys.exit(1);
-    elif len(IWords) > 0:                                                       # If there is one, store its parameter to be returned,
-        IParam = IWords[0];
-    else:                                                                       # If there are none, set the return value accordingly
-        IParam = None;
+        SinS = S * numpy.sin(alfa);
+        CosS = S * numpy.cos(alfa);
 
-    # *** J-words **********************
+    X3 = Xm + SinS;                                                             # Both possible solutions...
+    Y3 = Ym - CosS;
 
-    JWords = re.findall("J([+-]{,1}[\d.]+)", WorkLine, re.IGNORECASE);          # Find all "Jxxx" style codes possibly including sign and decimal point (only values)
-    
-    if len(JWords) > 1:                                                         # If there are multiple J-words on this line, we're busted, sorry...
-        logging.error("Multiple \"J\" words found" + CommonErrorString);
-        sys.exit(1);
-    elif len(JWords) > 0:                                                       # If there is one, store its parameter to be returned,
-        JParam = JWords[0];
-    else:                                                                       # If there are none, set the return value accordingly
-        JParam = None;
+    X4 = Xm - SinS;
+    Y4 = Ym + CosS;
 
-    # *** K-words **********************
-    
-    KWords = re.findall("K([+-]{,1}[\d.]+)", WorkLine, re.IGNORECASE);          # Find all "Kxxx" style codes possibly including sign and decimal point (only values)
-    
-    if len(KWords) > 1:                                                         # If there are multiple K-words on this line, we're busted, sorry...
-        logging.error("Multiple \"K\" words found" + CommonErrorString);
-        sys.exit(1);
-    elif len(KWords) > 0:                                                       # If there is one, store its parameter to be returned,
-        KParam = KWords[0];
-    else:                                                                       # If there are none, set the return value accordingly
-        KParam = None;
-    
-    # *** R-words **********************
+    Closer = numpy.sqrt(numpy.square(X2 - X3) + numpy.square(Y2 - Y3)) < numpy.sqrt(numpy.square(X2 - X4) + numpy.square(Y2 - Y4));
 
-    RWords = re.findall("R([+-]{,1}[\d.]+)", WorkLine, re.IGNORECASE);          # Find all "Rxxx" style codes possibly including sign and decimal point (only values)
+    return(numpy.where(Closer, X3, X4), numpy.where(Closer, Y3, Y4));         # ...and the one closer to the original center, for each arc
 
-    if len(RWords) > 0:                                                         # If there are any R-words on this line, it's the wrong arc format, sorry...
-        logging.error("Radius format arc found" + CommonErrorString);
-        sys.exit(1);
+# ******************************************************************************
+# ArcCenters() - the new centers of a list of arcs collected by ParseLine()
+#
+# Note: each arc is (line number, string params, values, arc points), and the
+# result is a list of (new X, new Y) centers in the same order, 'None's for the
+# full circles. Vector picks BendThoseArcs() over RecallThatArc(), just like it
+# picks AdjustArcs() over AdjustArc().
+# ******************************************************************************
 
-    Params = dict({'N': NParam, 'G': GParam, 'M': MParam, 'F': FParam, 'X': XParam, 'Y': YParam, 'Z': ZParam, 'I': IParam, 'J': JParam, 'K': KParam});
-    
-    return(Params);
+def ArcCenters(Arcs, Vector = True):
+
+    if Instrumented:
+        Start = Clock();
+
+    if not Vector:
+        Centers = [];
+
+        for LineNumber, Params, Values, (Xs, Ys, Xe, Ye, Xc, Yc) in Arcs:
+            if dist(Xs, Ys, Xe, Ye) > 0:
+                Centers.append(RecallThatArc(Xs, Ys, Xe, Ye, Xc, Yc));
+            else:
+                Centers.append((None, None));
+
+        if Instrumented:
+            Statistics['Bend'] += Clock() - Start;
+
+        return(Centers);
+
+    Points = numpy.array([Arc[3] for Arc in Arcs], dtype=float);               # One row per arc: Xs, Ys, Xe, Ye, Xc, Yc
+
+    Xs, Ys, Xe, Ye, Xc, Yc = Points.T;
+
+    Bendable = (numpy.sqrt(numpy.square(Xs - Xe) + numpy.square(Ys - Ye)) > 0).tolist();   # Full circles are left alone, exactly like AdjustArc() does
+
+    NewXcs, NewYcs = BendThoseArcs(Xs, Ys, Xe, Ye, Xc, Yc);
+
+    NewXcs = NewXcs.tolist();                                                   # Plain floats from here on, for speed and for formatting
+    NewYcs = NewYcs.tolist();
+
+    Centers = [];
+
+    for Index, Arc in enumerate(Arcs):
+        if not Bendable[Index]:
+            Centers.append((None, None));
+        elif NewXcs[Index] != NewXcs[Index]:                                    # NaN: leave it to the scalar version to complain exactly the way it always did
+            Centers.append(BendThatArc(*Arc[3]));
+        else:
+            Centers.append((NewXcs[Index], NewYcs[Index]));
+
+    if Instrumented:
+        Statistics['Bend'] += Clock() - Start;
+
+    return(Centers);
+
+# ******************************************************************************
+# AdjustArcs() - AdjustArc() for a list of arcs collected by ParseLine()
+#
+# Note: the result is a list of replacement lines, in the same order as the
+# arcs (see ArcCenters() for what those are).
+# ******************************************************************************
+
+def AdjustArcs(Arcs):
+
+    if len(Arcs) == 0:
+        return([]);
+
+    Centers = ArcCenters(Arcs);
+
+    if Instrumented:
+        Start = Clock();
+
+    NewLines = [ArcLine(LineNumber, Params, Values, *(ArcPoint + Center)) for (LineNumber, Params, Values, ArcPoint), Center in zip(Arcs, Centers)];
+
+    if Instrumented:
+        Statistics['Format'] += Clock() - Start;
+
+    return(NewLines);
+
+# ******************************************************************************
+# ScanForParams() - split the line into code words, return dictionaries of them
+#
+# Note: Only one instance of each word per line is handled right now even though
+# multiple ones are quite legal (but not common in machine-generated g-code);
+# The elements in the first dictionary are either 'None' or the single string
+# value, the ones in the second either 'None' or the number it stands for.
+# Everything is found in a single pass of the precompiled WORD_PATTERN over the
+# line, converting numbers as we go - WordsToValues() is not needed for these.
+# ******************************************************************************
+
+def ScanForParams(WorkLine):
+
+    WorkLine = WorkLine.replace(" ", "").replace("\t", "");                     # Kick all tabs and spaces first (they are valid anywhere, even inside numbers)
+
+    Params = {'N': None, 'G': None, 'M': None, 'F': None, 'X': None, 'Y': None, 'Z': None, 'I': None, 'J': None, 'K': None};
+    Values = {'G': None, 'M': None, 'X': None, 'Y': None, 'Z': None, 'I': None, 'J': None, 'K': None};
+
+    Repeated = None;                                                            # Any words found more than once (only looked at if something went wrong)
+    Failed = False;                                                             # Whether any numeric conversion failed (reported after the above, as before)
+
+    for Word in WORD_PATTERN.finditer(WorkLine):                                # Comments are matched (and skipped) too, so nothing inside them is taken for a word
+        Index = Word.lastindex;
+
+        if Index is None:                                                       # Nothing captured means this was a comment
+            continue;
+
+        Letter = Word.group(Index - 1).upper();
+        Param = Word.group(Index);
+
+        if Letter == 'N':                                                       # Only the first "Nxx" style line number counts, any others are ignored
+            if Params['N'] is None:
+                Params['N'] = Param;
+            continue;
+
+        if Params.get(Letter, 'R') is not None:                                 # A second instance of a word (or any R-word) - note it and sort it out below
+            if Repeated is None:
+                Repeated = set();
+            Repeated.add(Letter);
+            continue;
+
+        Params[Letter] = Param;
+
+        if Letter in INTEGER_WORDS:                                             # G and M are integers, F is only ever passed along, everything else is a float
+            Values[Letter] = int(Param);
+        elif Letter != 'F':
+            try:
+                Values[Letter] = float(Param);
+            except ValueError:
+                Failed = True;
+
+    if Repeated is not None or Failed:                                          # Only now build any error messages, keeping the checks in their original order
+        if Params['N'] is None:                                                 # If no N-word is found, set the line number string to empty
+            LineNumberString = "";
+        else:                                                                   # If one is found, form a string to be included in any messages referring to this line
+            LineNumberString = " (aka \"N" + Params['N'] + "\")";
+
+        CommonErrorString = " on line {0}".format(TextLinesHandled) + LineNumberString;
+
+        for Letter in "GMFXYZIJK":                                              # If there are multiple words of a kind on this line, we're busted, sorry...
+            if Repeated is not None and Letter in Repeated:
+                Fail("Multiple \"" + Letter + "\" words found" + CommonErrorString);
+
+        if Repeated is not None and 'R' in Repeated:                            # If there are any R-words on this line, it's the wrong arc format, sorry...
+            Fail("Radius format arc found" + CommonErrorString);
+
+        Fail("A numeric conversion failed" + CommonErrorString);                # Otherwise it must have been one of the numbers
+
+    return(Params, Values);
 
 # ******************************************************************************
 # WordsToValues() - convert relevant string G-word parameters to numeric ones
+#
+# Note: ScanForParams() already does this while scanning, so the parser itself
+# doesn't call this anymore; it's kept for anyone holding a string dictionary.
 # ******************************************************************************
 
 def WordsToValues(Params):
@@ -367,7 +777,7 @@ def WordsToValues(Params):
     else:                                                                       # If there is one,
         LineNumberString = " (aka \"N" + Params['N'] + "\")";                   # form a string to be included in any messages referring to this line
     
-    CommonErrorString = " on line {0}".format(TextLinesHandled) + LineNumberString + ", exiting.";
+    CommonErrorString = " on line {0}".format(TextLinesHandled) + LineNumberString;
 
     try:
         if Params['G'] is None:                                                 # If it exists, convert the parameter to a number
@@ -410,22 +820,38 @@ def WordsToValues(Params):
         else:
             KValue = float(Params['K']);
     except:
-        logging.error("A numeric conversion failed" + CommonErrorString);
-        sys.exit(1);        
+        Fail("A numeric conversion failed" + CommonErrorString);
 
     Values = dict({'G': GValue, 'M': MValue, 'X': XValue, 'Y': YValue, 'Z': ZValue, 'I': IValue, 'J': JValue, 'K': KValue});
 
     return(Values);
     
+# ******************************************************************************
+# ReportFlawedArc() - tell about an arc out of tolerance on the current line
+# ******************************************************************************
+
+def ReportFlawedArc(Params, Delta):
+
+    if Params['N'] is None:                                                     # If there is no line number,
+        LineNumberString = "";                                                  # set the line number string to empty
+    else:                                                                       # If there is one,
+        LineNumberString = " (aka \"N" + Params['N'] + "\")";                   # form a string to be included in any messages referring to this line
+
+    logging.warning("Arc on line {0}".format(TextLinesHandled) + LineNumberString + " is out of tolerance: end radius differs from start radius by {0:.5f}".format(Delta));
+
 # ******************************************************************************
 # ParseLine() - parse a single line, return an adjusted arc or the original line
 #
+# Note: the numbers on the line can be handed over already scanned (in GValues),
+# the way BendProgram() does, along with any string params it can provide; the
+# line is then only scanned again if it's an arc and those are missing.
+#
 # I'm well aware exiting like this on any error without closing stuff is not
 # exactly nice but I'm learning all of this right now, and I have a half-done
 # PCB I can't engrave waiting (hopefully still aligned) on the mill table, ok?
 # ******************************************************************************
 
-def ParseLine(CurrentLine):
+def ParseLine(CurrentLine, GValues = None, GParams = None):
     
     global TextLinesHandled;                                                    # Stuff to be updated from this function needs to be declared
     global TextLinesIgnored;
@@ -436,12 +862,21 @@ def ParseLine(CurrentLine):
     global CoordsMode;
     global WorkPlane;
     global CurrentPosition;
+    global PendingArcs;
+    global PathArcsAccepted;
+    global PathArcsFlawed;
 
     TextLinesHandled += 1;                                                      # Mark processing another line of text
     IgnoringThisLine = True;                                                    # Assume it will be ignored unless found otherwise
     
-    GParams = ScanForParams(CurrentLine);                                       # Retrieve any relevant G-words from the line (values only, as string)
-    GValues = WordsToValues(GParams);                                           # Some parameters are more useful as numbers, some as strings: converting
+    if GValues is None:
+        if Instrumented:
+            Start = Clock();
+
+        GParams, GValues = ScanForParams(CurrentLine);                          # Retrieve any relevant G-words from the line (both as strings and as numbers)
+
+        if Instrumented:
+            Statistics['Scan'] += Clock() - Start;
     
     # *** OK, really starting to cut corners here. This should be rather more generalized. Needs rewriting AFTER that PCB is done.
     # *** For now, I'm assuming arc start point is never "unset" / imperial, absolute mode in plane XY, full stop. Sorry.
@@ -451,8 +886,30 @@ def ParseLine(CurrentLine):
         IgnoringThisLine = False;
         
     if GValues['G'] == 2 or GValues['G'] == 3:                                  # Handle G2/G3 lines (the point of all this)
-        CurrentLine = AdjustArc(CurrentPosition, GValues, GParams);             # Get a new line instead of the old one with a recalculated center
-        PathArcsAdjusted += 1;
+        if GParams is None:                                                     # Arcs need the words as written, for the messages and the new line
+            GParams, Unused = ScanForParams(CurrentLine);
+
+        if ArcTolerance is None:                                                # Without a tolerance, every arc is bent
+            Delta = None;
+        else:
+            Delta = RadiusDelta(*ArcPoints(CurrentPosition, GValues));
+
+        if Delta is not None and Delta <= ArcTolerance:                         # Good enough as it is: the line goes out exactly as it came in
+            PathArcsAccepted += 1;
+        elif CheckOnly:                                                         # Checking only: tell about it, but don't touch it
+            PathArcsFlawed += 1;
+            ReportFlawedArc(GParams, Delta);
+        else:
+            if Delta is not None:
+                PathArcsFlawed += 1;
+
+            if PendingArcs is None:
+                CurrentLine = AdjustArc(CurrentPosition, GValues, GParams);     # Get a new line instead of the old one with a recalculated center
+            else:                                                               # In vectorized mode, just note the arc down - ParseBlock() replaces the line later
+                PendingArcs.append((TextLinesHandled, GParams, GValues, ArcPoints(CurrentPosition, GValues)));
+
+            PathArcsAdjusted += 1;
+
         IgnoringThisLine = False;
         
     if GValues['X'] is not None:                                                # Harvest any new X-coordinate to update the current position
@@ -475,82 +932,4316 @@ def ParseLine(CurrentLine):
     return(CurrentLine);                                                        # Return an output line for every input line of g-code
 
 # ******************************************************************************
-# Main() - fetch a file line by line and feed it to the parser / arc adjuster
-#
-# Note: modify the first line to change the amount of logged info if you wish.
-# Valid values are DEBUG, INFO, WARNING, ERROR, CRITICAL.
+# ParseBlock() - ParseLine() for a list of lines, with all arcs bent in a batch
 # ******************************************************************************
 
-def main():
+def ParseBlock(Lines):
 
-    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.WARNING)
+    global PendingArcs;
 
-    if len(sys.argv) < 2:                                                       # If there are no arguments, display version and usage info then exit
-        print;
-        print u"Line Bender {0} (C) 2012 Asztalos Attila Oszkár".format(VERSION);
-        print u"Adjusts imprecise arcs in Line Grinder generated g-code";
-        print u"Usage: linebend <input file> [<output file>]";
-        sys.exit(1);
-    else:                                                                       # Otherwise, fetch the input file name / path
-        InFileName = sys.argv[1];
-        
-        if not os.path.isfile(InFileName):
-            logging.error("File \"{0}\" does not seem to exist, exiting.".format(InFileName));
-            sys.exit(1);
-        
-        if len(sys.argv) < 3:                                                   # If there is no second argument, construct an output file name / path
-            (root, ext) = os.path.splitext(InFileName);                         # Split the input filename into path plus filename and extension
-            OutFileName = root + "_BENT" + ext;                                 # Recombine them into a longer output filename
-        else:
-            OutFileName = sys.argv[2];                                          # Otherwise, fetch the output file name / path
-    
-    try:                                                                        # Attempt to open input file for reading
-        InFile = open(InFileName, 'r');
-    except:                                                                     # Exit if failed
-        logging.error("Cannot open input file \"{0}\", exiting.".format(InFileName));
-        sys.exit(1);
+    PendingArcs = [];                                                           # Have ParseLine() collect the arcs instead of adjusting them one by one
 
-    logging.debug("Opened input file {0}.".format(InFileName));
-    
-    try:                                                                        # Attempt to open output file for writing
-        OutFile = open(OutFileName, 'w');
-    except:                                                                     # Exit if failed
-        logging.error("Cannot open output file \"{0}\", exiting.".format(OutFileName));
-        sys.exit(1);
+    FirstLineNumber = TextLinesHandled + 1;
 
-    logging.debug("Opened output file {0}.".format(OutFileName));
+    OutputLines = [ParseLine(Line) for Line in Lines];
 
-    for CurrentInputLine in InFile:                                             # Traverse the file line by line looking for arcs to recalculate
-        CurrentOutputLine = ParseLine(CurrentInputLine);        
-        OutFile.write(CurrentOutputLine);
-            
-    try:                                                                        # Attempt to close output file
-        OutFile.close();
-    except:                                                                     # Exit if failed
-        logging.error("Failed to close output file \"{0}\", exiting.".format(OutFileName));
-        sys.exit(1);
+    for Arc, NewLine in zip(PendingArcs, AdjustArcs(PendingArcs)):             # Then put the adjusted arcs in place of the original ones
+        OutputLines[Arc[0] - FirstLineNumber] = NewLine;
 
-    logging.debug("Closed output file {0}.".format(OutFileName));
+    PendingArcs = None;
 
-    try:                                                                        # Attempt to close input file
-        InFile.close();
-    except:                                                                     # Exit if failed
-        logging.error("Failed to close input file \"{0}\", exiting.".format(InFileName));
-        sys.exit(1);
+    return(OutputLines);
 
-    logging.debug("Closed input file {0}.".format(InFileName));
+# ******************************************************************************
+# ApplySettings() - set up the parser's settings from the options dictionary
+#
+# Note: anything in the options that changes the output has to end up here (so
+# it reaches worker processes too) and in MakeCacheSettings().
+# ******************************************************************************
 
-    print;
-    print u"Text lines handled: {0:>8}".format(TextLinesHandled);                # Display some processing stats
-    print u"Text lines ignored: {0:>8}".format(TextLinesIgnored);
-    
-    print u"Path lines handled: {0:>8}".format(PathLinesHandled);
-    print u"Path lines dropped: {0:>8}".format(PathLinesDropped);
-    print u"Path arcs adjusted: {0:>8}".format(PathArcsAdjusted);
-    print u"Path arcs unedited: {0:>8}".format(PathArcsUnedited);
-    print;
-    
-    if PathArcsUnedited > 0:
-        logging.warning("Full circle arcs were found and skipped ({0}).".format(PathArcsUnedited));
+def ApplySettings(Options):
+
+    global ArcTolerance;
+    global CheckOnly;
+    global Instrumented;
+    global Debugging;
+    global Statistics;
+    global ShrinkTolerance;
+    global Compacting;
+    global Reordering;
+    global ArcMemoSize;
+
+    Instrumented = Options['Timing'] or Options['StatsJson'] is not None;
+    Debugging = logging.getLogger().isEnabledFor(logging.DEBUG);
+
+    if Statistics is None:
+        Statistics = NewStatistics();
+
+    CheckOnly = Options['Check'];
+    ArcMemoSize = max(Options['ArcMemo'], 0);
+    ArcTolerance = Options['Tolerance'];
+
+    if CheckOnly and ArcTolerance is None:                                      # Checking needs some tolerance, the NIST one is as good as any
+        ArcTolerance = NIST_TOLERANCE;
+
+    if CheckOnly:                                                               # Nothing to shrink or compact when nothing is written
+        ShrinkTolerance = None;
+        Compacting = False;
+        Reordering = False;
+    else:
+        ShrinkTolerance = Options['Shrink'];
+        Compacting = Options['Compact'];
+        Reordering = Options['Reorder'];
+
+# ******************************************************************************
+# NewStatistics() / MergeStatistics() - instrumentation figures as a dictionary
+#
+# Note: stage times (in seconds), center shift sums and counts and the sizes of
+# program models add up, the largest center shift is the largest of any of them.
+# ******************************************************************************
+
+def NewStatistics():
+
+    Figures = dict.fromkeys(STAGE_NAMES, 0.0);
+    Figures.update({'ShiftSum': 0.0, 'ShiftCount': 0, 'ShiftMax': 0.0, 'ProgramBytes': 0});
+
+    return(Figures);
+
+def MergeStatistics(Figures):
+
+    for Name in Figures:
+        if Name == 'ShiftMax':
+            Statistics[Name] = max(Statistics[Name], Figures[Name]);
+        else:
+            Statistics[Name] += Figures[Name];
+
+# ******************************************************************************
+# TimedLines() / WriteTimed() - reading and writing, with the time it takes
+# ******************************************************************************
+
+def TimedLines(Lines):
+
+    Lines = iter(Lines);
+
+    while True:
+        Start = Clock();
+        Line = next(Lines, None);
+        Statistics['Read'] += Clock() - Start;
+
+        if Line is None:
+            break;
+
+        yield Line;
+
+def WriteTimed(OutFile, Lines):
+
+    if Instrumented:
+        Start = Clock();
+        OutFile.writelines(Lines);
+        Statistics['Write'] += Clock() - Start;
+    else:
+        OutFile.writelines(Lines);
+
+# ******************************************************************************
+# ReadAhead() - the lines of an iterable, read ahead in a thread of their own
+#
+# Note: the thread reads PIPELINE_BATCH_LINES lines at a time, up to
+# PIPELINE_QUEUE_BATCHES batches ahead of whoever takes them (then it waits),
+# so reading from a slow disk or network share goes on while the lines read
+# so far are bent. The lines come out just as they went in. Anything going
+# wrong in the thread is raised here instead, in due order.
+# ******************************************************************************
+
+def ReadAhead(Lines):
+
+    Batches = Queue.Queue(PIPELINE_QUEUE_BATCHES);
+
+    def Read():
+
+        try:
+            for Batch in iter(lambda: list(islice(Lines, PIPELINE_BATCH_LINES)), []):
+                Batches.put(Batch);
+        except BaseException as Error:                                          # Handed over like the lines, to be raised where they're used (even Fail()'s exit)
+            Batches.put(Error);
+        else:
+            Batches.put(None);
+
+    Reader = threading.Thread(target = Read, name = "ReadAhead");
+    Reader.daemon = True;
+    Reader.start();
+
+    while True:
+        Batch = Batches.get();
+
+        if Batch is None:
+            break;
+
+        if isinstance(Batch, BaseException):
+            raise Batch;
+
+        for Line in Batch:
+            yield Line;
+
+# ******************************************************************************
+# PipelineWriter - a file-like filter writing its target in a thread of its own
+#
+# Note: lines are gathered PIPELINE_BATCH_LINES at a time and handed to the
+# thread, with up to PIPELINE_QUEUE_BATCHES batches waiting (then bending waits
+# too), so writing to a slow disk or network share goes on while the next lines
+# are bent. Everything is written in the order it came, of course. If writing
+# fails, the thread keeps taking batches (without writing them) so nobody waits
+# on it forever, and the next batch handed over stops the bending.
+# ******************************************************************************
+
+class PipelineWriter(object):
+
+    def __init__(self, Target):
+
+        self.Target = Target;                                                   # Where the lines go in the end
+        self.Lines = [];                                                        # Lines waiting to be handed to the thread
+        self.Queue = Queue.Queue(PIPELINE_QUEUE_BATCHES);                       # Batches of lines between us and the thread ('None' ends it)
+        self.Failure = None;                                                    # What went wrong writing, if anything did
+
+        self.Thread = threading.Thread(target = self.Run, name = "PipelineWriter");
+        self.Thread.daemon = True;
+        self.Thread.start();
+
+    def Run(self):                                                              # The thread: write every batch handed over
+
+        while True:
+            Lines = self.Queue.get();
+
+            try:
+                if Lines is None:
+                    break;
+
+                if self.Failure is None:
+                    self.Target.writelines(Lines);
+            except (IOError, OSError) as Error:
+                self.Failure = Error.strerror or str(Error);
+            finally:
+                self.Queue.task_done();
+
+    def Hand(self):                                                             # Give the thread the lines gathered so far
+
+        if self.Failure is not None:
+            Fail("Failed to write output ({0})".format(self.Failure), FileError);
+
+        self.Queue.put(self.Lines);
+        self.Lines = [];
+
+    def write(self, Text):
+
+        self.Lines.append(Text);
+
+        if len(self.Lines) >= PIPELINE_BATCH_LINES:
+            self.Hand();
+
+    def writelines(self, Lines):
+
+        for Line in Lines:
+            self.Lines.append(Line);
+
+            if len(self.Lines) >= PIPELINE_BATCH_LINES:
+                self.Hand();
+
+    def flush(self):                                                            # Wait for everything so far to be written, then flush that
+
+        if len(self.Lines) > 0:
+            self.Hand();
+
+        self.Queue.join();
+        self.Target.flush();
+
+    def close(self):                                                            # Write the rest and wait for it; stdout is only flushed
+
+        if len(self.Lines) > 0 and self.Failure is None:
+            self.Hand();
+
+        self.Queue.put(None);
+        self.Thread.join();
+
+        if self.Target is sys.stdout:
+            self.Target.flush();
+        else:
+            self.Target.close();
+
+        if self.Failure is not None:
+            raise IOError(errno.EIO, self.Failure);
+
+# ******************************************************************************
+# TakeTurns() - let other sessions bend for a while, if this is a session
+#
+# Note: called between blocks by whatever bends a whole file, so that a session
+# bending one doesn't keep every other session waiting until it's done (see
+# BenderSession). Anything to wait for (a function) is waited for meanwhile,
+# so the others can go on for as long as that takes. Outside of sessions it
+# only waits.
+# ******************************************************************************
+
+def TakeTurns(Waiting = None):
+
+    if SessionTurn is not None:
+        SessionTurn(Waiting);
+    elif Waiting is not None:
+        Waiting();
+
+# ******************************************************************************
+# BendLines() - bend any iterable of lines of g-code, yielding the output lines
+#
+# Note: lines go out as soon as they are done (a block at a time in vectorized
+# mode or with a cache), so memory use doesn't depend on how many lines come in.
+# Handy for use from other Python code too: "OutFile.writelines(BendLines(f))".
+# ******************************************************************************
+
+def BendLines(Lines, Vector = False):
+
+    if CacheDirectory is not None:                                              # With a cache, go through it block by block
+        for Block in CacheBlocks(Lines):
+            for OutputLine in BendCachedBlock(Block, Vector):
+                yield OutputLine;
+            TakeTurns();
+    elif Vector:
+        Lines = iter(Lines);                                                    # islice() has to keep going where it left off
+
+        if SessionTurn is None:
+            Size = BLOCK_LINES;
+        else:                                                                   # Smaller blocks in a session, so the others don't have to wait as long for their turn
+            Size = SESSION_BLOCK_LINES;
+
+        while True:
+            Block = list(islice(Lines, Size));
+            if len(Block) == 0:
+                break;
+            for OutputLine in ParseBlock(Block):
+                yield OutputLine;
+            TakeTurns();
+    elif SessionTurn is not None:                                               # A session's, line by line but taking turns every SESSION_BLOCK_LINES
+        Lines = iter(Lines);
+
+        for Block in iter(lambda: list(islice(Lines, SESSION_BLOCK_LINES)), []):
+            for CurrentInputLine in Block:
+                yield ParseLine(CurrentInputLine);
+            TakeTurns();
+    else:
+        for CurrentInputLine in Lines:                                          # Traverse the lines one by one looking for arcs to recalculate
+            yield ParseLine(CurrentInputLine);
+
+# ******************************************************************************
+# MapFile() - a read only memory map of a whole open file, 'None' if it can't be
+#
+# Note: pipes can't be mapped, and empty files neither (nor do they need to be).
+# ******************************************************************************
+
+def MapFile(InFile):
+
+    try:
+        if os.fstat(InFile.fileno()).st_size == 0:
+            return(None);
+
+        return(mmap.mmap(InFile.fileno(), 0, access = mmap.ACCESS_READ));
+    except (EnvironmentError, ValueError):
+        return(None);
+
+# ******************************************************************************
+# SkipRun() - account for a run of plain G0/G1 lines without parsing them
+#
+# Note: MAP_RUN_PATTERN only matches lines that ParseLine() would pass through
+# untouched, counting each as a path line and taking nothing else from them but
+# the tool position. So that's all done here, for the whole run at once: only
+# the last X/Y/Z in it count, and the pattern has kept those for us.
+# ******************************************************************************
+
+def SkipRun(Map, Run):
+
+    global TextLinesHandled;
+    global PathLinesHandled;
+
+    Lines = Map[Run.start():Run.end()].count("\n");
+
+    TextLinesHandled += Lines;
+    PathLinesHandled += Lines;
+
+    for Axis in "XYZ":
+        if Run.group(Axis) is not None:
+            CurrentPosition[Axis] = float(Run.group(Axis));
+
+# ******************************************************************************
+# BendMapped() - bend a memory mapped file, copying untouched lines in bulk
+#
+# Note: only the replaced lines are ever put together for the output, all the
+# rest goes out straight from the map (without even copying it, for real files)
+# in spans between them. Runs of plain G0/G1 lines (most of any file) are only
+# matched by MAP_RUN_PATTERN, not parsed line by line - see SkipRun(). Lines
+# are split at newlines only, like reading them from the file does.
+# ******************************************************************************
+
+def BendMapped(Map, OutFile, Vector = False):
+
+    global PendingArcs;
+
+    if type(OutFile) is file:                                                   # Real files take the map's bytes as they are, anything else gets strings
+        Span = lambda Start, End: buffer(Map, Start, End - Start);
+    else:
+        Span = lambda Start, End: Map[Start:End];
+
+    Size = len(Map);
+    Start = 0;
+    Written = 0;                                                                # Everything before this offset is out already
+    Replaced = [];                                                              # Lines to replace that aren't out yet, in order: (start, end, new line)
+    Arcs = [];                                                                  # Where the lines of the arcs waiting in PendingArcs are: (start, end)
+
+    Runs = MAP_RUN_PATTERN.finditer(Map);
+    Run = next(Runs, None);
+
+    if Vector:
+        PendingArcs = [];
+
+    while Start < Size:
+        if Run is not None and Run.start() == Start:                            # A run of lines that can't change, just skip over it
+            SkipRun(Map, Run);
+            Start = Run.end();
+            Run = next(Runs, None);
+        else:                                                                   # Anything else goes through the parser, line by line
+            End = Map.find("\n", Start);
+            if End < 0:
+                End = Size;
+            else:
+                End += 1;
+
+            Line = Map[Start:End];
+            NewLine = ParseLine(Line);
+
+            if NewLine is not Line:
+                Replaced.append((Start, End, NewLine));
+            elif PendingArcs is not None and len(PendingArcs) > len(Arcs):      # Noted down for bending in a batch
+                Arcs.append((Start, End));
+
+            Start = End;
+
+        if PendingArcs is not None:                                             # Vectorized: only write out after a batch has been bent
+            if len(PendingArcs) < BLOCK_LINES and Start < Size:
+                continue;
+
+            Replaced.extend((ArcStart, ArcEnd, NewLine) for (ArcStart, ArcEnd), NewLine in zip(Arcs, AdjustArcs(PendingArcs)));
+            del PendingArcs[:];
+            del Arcs[:];
+        elif len(Replaced) < MAP_WRITE_LINES and Start - Written < MAP_WRITE_BYTES and Start < Size:
+            continue;
+
+        Pieces = [];
+
+        for ReplacedStart, ReplacedEnd, NewLine in Replaced:
+            Pieces.append(Span(Written, ReplacedStart));
+            Pieces.append(NewLine);
+            Written = ReplacedEnd;
+
+        Pieces.append(Span(Written, Start));
+        Written = Start;
+
+        WriteTimed(OutFile, Pieces);
+        del Replaced[:];
+
+        TakeTurns();
+
+    PendingArcs = None;
+
+# ******************************************************************************
+# LoadProgram() - scan a whole g-code text into a compact program model
+#
+# Note: instead of two dictionaries per line, the model is a handful of typed
+# arrays (a dict of them, like the stats): where each line starts in the source
+# text, its motion code (G-word) and the way that was spelled (as an index into
+# a short list of spellings, for the arcs written back), a bitmask of the words
+# in PROGRAM_WORDS present on it and, packed one after the other, just the
+# numbers actually there. The text itself is only kept once, as the source, and
+# lines are cut from it on demand. That's some 30 bytes per line for typical
+# Line Grinder code besides the text, and some 40 once the arcs are bent (see
+# BendProgram() for how those are kept).
+# Lines are split at newlines only, exactly like reading the file line by line.
+# ******************************************************************************
+
+def LoadProgram(Source):
+
+    global TextLinesHandled;
+
+    if Instrumented:
+        Begin = Clock();
+
+    if len(Source) < 1 << 32:                                                   # Four byte offsets will do for anything but the most enormous files
+        Starts = array.array('I');
+    else:
+        Starts = array.array('L');
+
+    Codes = array.array('b');
+    Spelled = array.array('B');
+    Masks = array.array('H');
+    Numbers = array.array('d');
+
+    Spellings = [None];                                                         # Index 0 is for lines without a G-word
+    SpellingIndex = {None: 0};
+
+    Bits = [(Letter, 1 << Bit, Letter in PROGRAM_NUMBERS) for Bit, Letter in enumerate(PROGRAM_WORDS)];
+
+    FirstLineNumber = TextLinesHandled;                                         # Scanning errors should name the right line, put the count back afterwards
+    Start = 0;
+
+    while Start < len(Source):
+        End = Source.find("\n", Start);
+        if End < 0:
+            End = len(Source);
+        else:
+            End += 1;
+
+        TextLinesHandled += 1;
+        Params, Values = ScanForParams(Source[Start:End]);
+
+        if SessionTurn is not None and TextLinesHandled % SESSION_BLOCK_LINES == 0:
+            TakeTurns();
+
+        Code = Values['G'];
+        if Code is None:
+            Code = PROGRAM_CODE_NONE;
+        elif Code >= PROGRAM_CODE_LARGE:
+            Code = PROGRAM_CODE_LARGE;
+
+        Mask = 0;
+
+        for Letter, Bit, Numeric in Bits:
+            if Params[Letter] is not None:
+                Mask |= Bit;
+                if Numeric and (Letter != 'G' or Code == PROGRAM_CODE_LARGE):   # Small G-words are already in the code column
+                    Numbers.append(Values[Letter]);
+
+        Spelling = SpellingIndex.get(Params['G']);
+
+        if Spelling is None:                                                    # A new way of writing a G-word, keep it (unless there are way too many)
+            if len(Spellings) < PROGRAM_SPELLINGS:
+                Spelling = len(Spellings);
+                Spellings.append(Params['G']);
+                SpellingIndex[Params['G']] = Spelling;
+            else:
+                Spelling = PROGRAM_SPELLINGS;
+
+        Starts.append(Start);
+        Codes.append(Code);
+        Spelled.append(Spelling);
+        Masks.append(Mask);
+
+        Start = End;
+
+    Starts.append(len(Source));                                                 # One past the last line, so every line has an end too
+
+    TextLinesHandled = FirstLineNumber;
+
+    Program = {'Source': Source, 'Starts': Starts, 'Codes': Codes, 'Spelled': Spelled, 'Spellings': Spellings, 'Masks': Masks, 'Numbers': Numbers,
+               'First': None, 'Edited': array.array('I'), 'Cursors': array.array(Starts.typecode), 'Centers': array.array('d')};
+
+    if Instrumented:
+        Statistics['Scan'] += Clock() - Begin;
+
+    if Debugging:
+        logging.debug("Loaded {0} lines into a program model of {1} bytes.".format(len(Codes), ProgramBytes(Program)));
+
+    return(Program);
+
+# ******************************************************************************
+# ProgramBytes() - the size of a program model, not counting the source text
+#
+# Note: that's the columns, the edits' too (so it's only complete once the
+# program has been bent), and the spellings, as Python objects and all.
+# ******************************************************************************
+
+def ProgramBytes(Program):
+
+    Bytes = sum(Program[Name].itemsize * len(Program[Name]) for Name in ('Starts', 'Codes', 'Spelled', 'Masks', 'Numbers', 'Edited', 'Cursors', 'Centers'));
+
+    Bytes += sys.getsizeof(Program['Spellings']) + sum(sys.getsizeof(Spelling) for Spelling in Program['Spellings'] if Spelling is not None);
+
+    return(Bytes);
+
+# ******************************************************************************
+# ProgramLine() - the original text of a line of a program model (by index)
+# ******************************************************************************
+
+def ProgramLine(Program, Index):
+
+    return(Program['Source'][Program['Starts'][Index]:Program['Starts'][Index + 1]]);
+
+# ******************************************************************************
+# ProgramValues() - a line's numbers, the way ScanForParams() returns them
+#
+# Note: the numbers are packed without gaps, so they can only be found going
+# through the lines in order: Cursor is where this line's numbers start, and
+# where the next line's start is returned along with them.
+# ******************************************************************************
+
+def ProgramValues(Program, Index, Cursor):
+
+    Values = {'G': None, 'M': None, 'X': None, 'Y': None, 'Z': None, 'I': None, 'J': None, 'K': None};
+
+    Code = Program['Codes'][Index];
+    Large = Code == PROGRAM_CODE_LARGE;
+
+    Letters = ProgramLetters.get((Program['Masks'][Index], Large));
+
+    if Letters is None:                                                         # Work out once which numbers each kind of line has, there are only a few kinds
+        Letters = tuple(Letter for Bit, Letter in enumerate(PROGRAM_WORDS) if Program['Masks'][Index] & (1 << Bit) and Letter in PROGRAM_NUMBERS and (Letter != 'G' or Large));
+        ProgramLetters[(Program['Masks'][Index], Large)] = Letters;
+
+    if Code != PROGRAM_CODE_NONE and not Large:
+        Values['G'] = Code;
+
+    for Letter in Letters:
+        Values[Letter] = Program['Numbers'][Cursor];
+        Cursor += 1;
+
+    if Large:                                                                   # G and M are integers, kept as floats in the meantime
+        Values['G'] = int(Values['G']);
+
+    if Values['M'] is not None:
+        Values['M'] = int(Values['M']);
+
+    return(Values, Cursor);
+
+# ******************************************************************************
+# ProgramParams() - the string params of an arc in a program model, if it can
+#
+# Note: only the G and N words are ever needed from those. The N-word is only
+# used in messages, so it's only missing (and the result 'None', meaning the
+# line has to be scanned again) if the line has one and it may be shown.
+# ******************************************************************************
+
+def ProgramParams(Program, Index):
+
+    Spelling = Program['Spelled'][Index];
+
+    if Spelling == PROGRAM_SPELLINGS:
+        return(None);
+
+    if Program['Masks'][Index] & 1 and (Debugging or ArcTolerance is not None):  # Bit 0 is the N-word's (see PROGRAM_WORDS)
+        return(None);
+
+    return({'N': None, 'G': Program['Spellings'][Spelling]});
+
+# ******************************************************************************
+# BendProgram() - run ParseLine() over every line of a program model
+#
+# Note: the arcs are collected (see ParseBlock()) and bent in batches of up to
+# BLOCK_LINES, vectorized or not, and only their new centers are kept, packed
+# into the model's edit columns: the index of each line edited ('Edited'),
+# where its numbers start ('Cursors') and its start point and new center, NaN
+# for full circles ('Centers', four numbers an arc). The lines themselves are
+# only formed on the way out, by ProgramArcLine(), which is some 40 bytes per
+# arc instead of a hundred or more for the text.
+# ******************************************************************************
+
+def BendProgram(Program, Vector = False):
+
+    global PendingArcs;
+
+    Codes = Program['Codes'];
+    Edited = Program['Edited'];
+    Cursors = Program['Cursors'];
+    Centers = Program['Centers'];
+
+    Program['First'] = FirstLineNumber = TextLinesHandled + 1;
+    Cursor = 0;
+    ArcCursors = [];                                                            # Where the numbers of the pending arcs start
+
+    PendingArcs = [];
+
+    for Index in xrange(len(Codes)):
+        Start = Cursor;
+        Values, Cursor = ProgramValues(Program, Index, Cursor);
+
+        if Codes[Index] == 2 or Codes[Index] == 3:                              # Only arcs need any string params
+            ParseLine(ProgramLine(Program, Index), Values, ProgramParams(Program, Index));
+
+            if len(PendingArcs) > len(ArcCursors):
+                ArcCursors.append(Start);
+        else:
+            ParseLine(ProgramLine(Program, Index), Values);
+
+        if len(PendingArcs) >= BLOCK_LINES or (Index == len(Codes) - 1 and len(PendingArcs) > 0):
+            for Arc, ArcCursor, (NewXc, NewYc) in zip(PendingArcs, ArcCursors, ArcCenters(PendingArcs, Vector)):
+                Edited.append(Arc[0] - FirstLineNumber);
+                Cursors.append(ArcCursor);
+
+                if NewXc is None:                                               # A full circle, left as it is
+                    NewXc, NewYc = float('nan'), float('nan');
+
+                Centers.extend((Arc[3][0], Arc[3][1], NewXc, NewYc));
+
+            del PendingArcs[:];
+            del ArcCursors[:];
+
+            TakeTurns();
+
+    PendingArcs = None;
+
+    if Instrumented:                                                            # Only now, with the edits in it
+        Statistics['ProgramBytes'] += ProgramBytes(Program);
+
+    if Debugging:
+        logging.debug("Bent a program model of {0} bytes (edits included).".format(ProgramBytes(Program)));
+
+# ******************************************************************************
+# ProgramArcLine() - the replacement line of a program model's edited arc
+#
+# Note: Edit is the arc's place among the edits; ArcLine() gets the very same
+# numbers it would have got bending the line right away.
+# ******************************************************************************
+
+def ProgramArcLine(Program, Edit):
+
+    Index = Program['Edited'][Edit];
+
+    Values, Unused = ProgramValues(Program, Index, Program['Cursors'][Edit]);
+    Params = ProgramParams(Program, Index);
+
+    if Params is None:                                                          # The N-word may be shown, or the G-word was spelled in some odd way
+        Params, Unused = ScanForParams(ProgramLine(Program, Index));
+
+    Xs, Ys, NewXc, NewYc = Program['Centers'][4 * Edit:4 * Edit + 4];
+
+    if NewXc != NewXc:                                                          # NaN: a full circle
+        NewXc, NewYc = None, None;
+
+    return(ArcLine(Program['First'] + Index, Params, Values, *(ArcPoints({'X': Xs, 'Y': Ys}, Values) + (NewXc, NewYc))));
+
+# ******************************************************************************
+# ProgramLines() - turn a program model back into g-code, yielding its lines
+# ******************************************************************************
+
+def ProgramLines(Program):
+
+    Edited = Program['Edited'];
+    Edit = 0;
+
+    for Index in xrange(len(Program['Codes'])):
+        if Edit < len(Edited) and Edited[Edit] == Index:                        # The edits are in line order
+            yield ProgramArcLine(Program, Edit);
+            Edit += 1;
+        else:
+            yield ProgramLine(Program, Index);
+
+        if SessionTurn is not None and Index % SESSION_BLOCK_LINES == 0:
+            TakeTurns();
+
+# ******************************************************************************
+# SegmentDistance() - distance of point P from the segment between A and B
+# ******************************************************************************
+
+def SegmentDistance(Xp, Yp, Xa, Ya, Xb, Yb):
+
+    Dx = Xb - Xa;
+    Dy = Yb - Ya;
+
+    Length = sqr(Dx) + sqr(Dy);                                                 # Squared, actually - only needed for the projection below
+
+    if Length == 0:                                                             # A and B are the same point
+        return(dist(Xp, Yp, Xa, Ya));
+
+    T = min(max(((Xp - Xa) * Dx + (Yp - Ya) * Dy) / Length, 0.0), 1.0);         # Where P's perpendicular foot falls, 0 at A and 1 at B (clamped to the segment)
+
+    return(dist(Xp, Yp, Xa + T * Dx, Ya + T * Dy));
+
+# ******************************************************************************
+# FitLine() - whether a run of points stays within Tolerance of a single move
+#
+# Note: Points are (X, Y) pairs, and the move goes from the first to the last.
+# ******************************************************************************
+
+def FitLine(Points, Tolerance):
+
+    Xa, Ya = Points[0];
+    Xb, Yb = Points[-1];
+
+    for Xp, Yp in Points[1:-1]:
+        if SegmentDistance(Xp, Yp, Xa, Ya, Xb, Yb) > Tolerance:
+            return(False);
+
+    return(True);
+
+# ******************************************************************************
+# FitArc() - the arc through a run of points within Tolerance, or 'None'
+#
+# Note: the circle is the one through the first, the middle and the last point.
+# Every point has to be within Tolerance of it, every move has to go around it
+# the same way and bulge no more than Tolerance from it (the sagitta of the arc
+# over the move), and all of them together less than SHRINK_MAX_SWEEP. Returns
+# (center X, center Y, 2 for clockwise or 3 for counterclockwise, arc length).
+# ******************************************************************************
+
+def FitArc(Points, Tolerance):
+
+    Xa, Ya = Points[0];
+    Xm, Ym = Points[len(Points) // 2];
+    Xb, Yb = Points[-1];
+
+    Bx, By = Xm - Xa, Ym - Ya;                                                  # Work relative to the first point, it keeps the numbers small
+    Cx, Cy = Xb - Xa, Yb - Ya;
+
+    D = 2 * (Bx * Cy - By * Cx);                                                # Positive if the run turns counterclockwise, zero if it doesn't turn at all
+
+    if D == 0:
+        return(None);
+
+    Xc = Xa + (Cy * (sqr(Bx) + sqr(By)) - By * (sqr(Cx) + sqr(Cy))) / D;        # The circle's center
+    Yc = Ya + (Bx * (sqr(Cx) + sqr(Cy)) - Cx * (sqr(Bx) + sqr(By))) / D;
+
+    R = dist(Xa, Ya, Xc, Yc);
+
+    if D > 0:
+        Direction = 1.0;
+    else:
+        Direction = -1.0;
+
+    Sweep = 0.0;
+
+    for Index in range(1, len(Points)):
+        Xs, Ys = Points[Index - 1];
+        Xe, Ye = Points[Index];
+
+        if abs(dist(Xe, Ye, Xc, Yc) - R) > Tolerance:                           # Too far off the circle
+            return(None);
+
+        Step = Direction * atan2((Xs - Xc) * (Ye - Yc) - (Ys - Yc) * (Xe - Xc), (Xs - Xc) * (Xe - Xc) + (Ys - Yc) * (Ye - Yc));
+
+        if Step < 0 or Step > radians(90):                                      # Going back, or too big a step for the sagitta to mean much
+            return(None);
+
+        if R - sqrt(max(sqr(R) - sqr(dist(Xs, Ys, Xe, Ye) / 2), 0.0)) > Tolerance:
+            return(None);
+
+        Sweep += Step;
+
+    if Sweep > SHRINK_MAX_SWEEP:
+        return(None);
+
+    if Direction > 0:
+        return(Xc, Yc, 3, R * Sweep);
+
+    return(Xc, Yc, 2, R * Sweep);
+
+# ******************************************************************************
+# FixedText() - a number with four decimals, never spelled "-0.0000"
+# ******************************************************************************
+
+def FixedText(Value):
+
+    Text = "{0:.4f}".format(Value);
+
+    if Text == "-0.0000":
+        return("0.0000");
+
+    return(Text);
+
+# ******************************************************************************
+# PathShrinker - a file-like filter shrinking the toolpath on its way out
+#
+# Note: moves are held back as long as they can be merged into a single G1 or
+# G2/G3 move (fitted by FitLine() / FitArc() above), and only written once the
+# next one can't. Zero length moves are dropped outright. Only plain G1 moves
+# in XY qualify: anything with a comment, another word (Z, I/J/K, M...) or a
+# new feed rate, and anything not a G1, leaves the run as it is. The last move
+# of a run always ends exactly where it used to, so whatever comes after it
+# (arcs relative to it in particular) is not affected.
+#
+# Dropping or merging moves may leave another motion mode in effect than the
+# input had at that point: a zero length G1 after a G0 goes, or a run of G1s
+# turns into a G2/G3. So the motion mode is followed both ways, as the input
+# has it and as it's written, and the next line moving the tool by the modal
+# one gets the input's G-word back (after its N-word, if any) when they differ.
+#
+# A merged move keeps the first N-word of its run (if any), so --lines, --from-n
+# and the controller's error reports can still find it by the number it started
+# with; the N-words of the other lines in the run are gone along with them.
+#
+# The time saved is estimated from the feed rate and SHRINK_BLOCK_SECONDS, the
+# least time a controller spends on any move, however short.
+# ******************************************************************************
+
+class PathShrinker(object):
+
+    def __init__(self, Target, Tolerance):
+
+        self.Target = Target;                                                   # Where the lines go in the end
+        self.Tolerance = Tolerance;
+
+        self.X, self.Y = None, None;                                            # Tool position after the last line seen, as numbers and as written
+        self.XText, self.YText = None, None;
+        self.FeedRate = None;
+
+        self.Motion, self.MotionText = None, None;                              # Motion mode in effect as the input has it (and as written there)...
+        self.Written = None;                                                    # ...and as it's been written out ('None' for unknown or none)
+
+        self.Anchor = None;                                                     # Where the held back run of moves starts,
+        self.Run = [];                                                          # the moves themselves: (X, Y, X text, Y text, G text, line, seconds, both X and Y written)
+        self.Fit = None;                                                        # and how they fit together ('None' for a line, FitArc()'s result for an arc)
+        self.PreviousFit = None;                                                # (and how they did before the latest one joined)
+
+        self.Partial = "";                                                      # Any incomplete line written so far
+        self.Lines = [];                                                        # Lines ready to be passed on
+
+        self.Dropped = 0;                                                       # Lines dropped or merged away
+        self.Saved = 0.0;                                                       # Estimated machine time saved, in seconds
+
+    def MoveSeconds(self, Length):
+
+        if self.FeedRate:                                                       # Feed rates are in units per minute
+            return(max(60.0 * Length / self.FeedRate, SHRINK_BLOCK_SECONDS));
+
+        return(SHRINK_BLOCK_SECONDS);
+
+    def Emit(self):                                                             # Write out the held back run as a single move
+
+        if len(self.Run) == 0:
+            return;
+
+        X, Y, XText, YText, GText, Line, Seconds, Complete = self.Run[-1];
+
+        Ending = Line[len(Line.rstrip("\r\n")):];
+
+        Numbered = "";                                                          # The first N-word of the run, to go on whatever it becomes
+
+        if len(self.Run) > 1:
+            for Move in self.Run:
+                Numbered = SHRINK_LINE_START_PATTERN.match(Move[5]).group().strip();
+                if Numbered != "":
+                    Numbered += " ";
+                    break;
+
+        if len(self.Run) == 1:                                                  # Nothing merged, the line goes out as it came in
+            self.Lines.append(Line);
+            NewSeconds = Seconds;
+            self.Written = 1;
+        elif self.Fit is None:                                                  # A single G1, the last line of the run does it if it has both X and Y (and the same N-word)
+            if Complete and SHRINK_LINE_START_PATTERN.match(Line).group().strip() == Numbered.strip():
+                self.Lines.append(Line);
+            else:
+                self.Lines.append(Numbered + "G" + GText + " X" + XText + " Y" + YText + Ending);
+            NewSeconds = self.MoveSeconds(dist(self.Anchor[0], self.Anchor[1], X, Y));
+            self.Written = 1;
+        else:                                                                   # An arc, with its G-word spelled like the G1 was (the next modal move gets its G1 back)
+            Xc, Yc, Code, Length = self.Fit;
+            self.Lines.append(Numbered + "G" + GText[:-1] + "{0} X".format(Code) + XText + " Y" + YText + " I" + FixedText(Xc - self.Anchor[0]) + " J" + FixedText(Yc - self.Anchor[1]) + Ending);
+            NewSeconds = self.MoveSeconds(Length);
+            self.Written = Code;
+
+        self.Dropped += len(self.Run) - 1;
+        self.Saved += sum(Move[6] for Move in self.Run) - NewSeconds;
+
+        self.Anchor = (X, Y);
+        self.Run = [];
+        self.Fit = None;
+
+    def Extend(self):                                                           # See if the latest move still fits with the rest of the run
+
+        if len(self.Run) > 1:
+            Points = [self.Anchor] + [(Move[0], Move[1]) for Move in self.Run];
+
+            if FitLine(Points, self.Tolerance):
+                self.Fit = None;
+            else:
+                self.Fit = FitArc(Points, self.Tolerance);
+
+                if self.Fit is None:                                            # It doesn't: write out the others (with their fit, found last time)
+                    Latest = self.Run.pop();
+                    self.Fit = self.PreviousFit;
+                    self.Emit();
+                    self.Run = [Latest];
+
+        self.PreviousFit = self.Fit;
+
+        if len(self.Run) >= SHRINK_MAX_MOVES:
+            self.Emit();
+
+    def Shrink(self, Line):                                                     # Take one line, hold it back or pass it on
+
+        Params, Values = ScanForParams(Line);
+
+        try:
+            if Params['F'] is None:
+                FeedRate = self.FeedRate;
+            else:
+                FeedRate = float(Params['F']);
+        except ValueError:                                                      # Not our business to complain about it
+            FeedRate = None;
+
+        if (Values['G'] == 1 and (Params['X'] is not None or Params['Y'] is not None) and self.X is not None and self.Y is not None and
+            Params['Z'] is None and Params['I'] is None and Params['J'] is None and Params['K'] is None and Params['M'] is None and
+            FeedRate == self.FeedRate and "(" not in Line and ";" not in Line):
+
+            self.Motion, self.MotionText = 1, Params['G'];                      # Whatever becomes of the line, it's a G1 from here on in the input
+
+            if Params['X'] is not None:
+                X, XText = Values['X'], Params['X'];
+            else:
+                X, XText = self.X, self.XText;
+
+            if Params['Y'] is not None:
+                Y, YText = Values['Y'], Params['Y'];
+            else:
+                Y, YText = self.Y, self.YText;
+
+            if X == self.X and Y == self.Y:                                     # Not going anywhere, just drop it
+                self.Dropped += 1;
+                self.Saved += self.MoveSeconds(0);
+                return;
+
+            if len(self.Run) == 0:
+                self.Anchor = (self.X, self.Y);
+
+            self.Run.append((X, Y, XText, YText, Params['G'], Line, self.MoveSeconds(dist(self.X, self.Y, X, Y)), Params['X'] is not None and Params['Y'] is not None));
+
+            self.X, self.Y, self.XText, self.YText = X, Y, XText, YText;
+
+            self.Extend();
+            return;
+
+        self.Emit();                                                            # Anything else ends the run
+
+        if Values['G'] in COMPACT_MOTION_CODES:                                 # A motion mode of its own, the same both ways
+            self.Motion, self.MotionText = Values['G'], Params['G'];
+            self.Written = Values['G'];
+        elif Values['G'] == 80:                                                 # No motion mode at all, both ways
+            self.Motion, self.MotionText = None, None;
+            self.Written = None;
+        elif (self.Motion is not None and self.Written != self.Motion and (Values['G'] is None or Values['G'] in COMPACT_MODAL_CODES) and
+              any(Params[Letter] is not None for Letter in "XYZIJK")):         # A move by the modal motion, which isn't what it used to be
+            Start = SHRINK_LINE_START_PATTERN.match(Line).end();
+            Line = Line[:Start] + "G" + self.MotionText + " " + Line[Start:];
+            self.Written = self.Motion;
+
+        self.Lines.append(Line);
+
+        if Params['X'] is not None:
+            self.X, self.XText = Values['X'], Params['X'];
+
+        if Params['Y'] is not None:
+            self.Y, self.YText = Values['Y'], Params['Y'];
+
+        self.FeedRate = FeedRate;
+
+    def write(self, Text):
+
+        Text = self.Partial + Text;
+        Start = 0;
+
+        while True:
+            End = Text.find("\n", Start);
+            if End < 0:
+                break;
+            self.Shrink(Text[Start:End + 1]);
+            Start = End + 1;
+
+        self.Partial = Text[Start:];
+
+        if len(self.Lines) > 0:
+            self.Target.writelines(self.Lines);
+            del self.Lines[:];
+
+    def writelines(self, Lines):
+
+        for Line in Lines:
+            self.write(Line);
+
+    def flush(self):
+
+        self.Target.flush();
+
+    def close(self):                                                            # Finish whatever is held back; stdout is only flushed
+
+        if len(self.Partial) > 0:
+            self.Shrink(self.Partial);
+            self.Partial = "";
+
+        self.Emit();
+
+        self.Target.writelines(self.Lines);
+        del self.Lines[:];
+
+        if self.Target is sys.stdout:
+            self.Target.flush();
+        else:
+            self.Target.close();
+
+# ******************************************************************************
+# CompactNumber() - the shortest spelling of a number, with the very same value
+# ******************************************************************************
+
+def CompactNumber(Text):
+
+    Sign = "";
+
+    if Text[0] == "-":
+        Sign = "-";
+
+    Text = Text.lstrip("+-");
+
+    if "." in Text:                                                             # Trailing zeros only mean something before a decimal point
+        Text = Text.rstrip("0").rstrip(".");
+
+    Text = Text.lstrip("0");
+
+    if Text == "":                                                              # Zero, with no sign to it
+        return("0");
+
+    if Text[0] == ".":
+        Text = "0" + Text;
+
+    return(Sign + Text);
+
+# ******************************************************************************
+# CompactEncoder - a file-like filter writing the output as compact g-code
+#
+# Note: modal words already in effect are dropped: a G0/G1/G2/G3 the same as
+# the one before, an X/Y/Z on a straight move the tool is already at and an F
+# the same as before. Numbers lose their trailing zeros (and signs and leading
+# zeros they don't need), words lose the spaces between them and lines with
+# nothing left to say (say a G1 to where the tool already is) are dropped
+# altogether. Units or coordinate system changes make it forget where the tool
+# is, so nothing is dropped by mistake afterwards. Arcs keep all of their words, an arc to where it starts being a
+# full circle. Line Bender's own comments go to the notes file (if any, along
+# with the number of the line they belong to), all other comments stay put.
+# Anything the encoder isn't sure about is left alone: lines it can't take
+# apart and lines with G-words other than the ones in COMPACT_MOTION_CODES and
+# COMPACT_MODAL_CODES go out as they came (save for the numbers), after which
+# nothing is taken for granted about where the tool is. Relative coordinates
+# (G91) turn dropping coordinates off until G90.
+# ******************************************************************************
+
+class CompactEncoder(object):
+
+    def __init__(self, Target, Notes = None):
+
+        self.Target = Target;                                                   # Where the lines go in the end
+        self.Notes = Notes;                                                     # Where Line Bender's comments go ('None' means nowhere)
+
+        self.Motion = None;                                                     # Motion mode, position and feed rate in effect ('None' for unknown)
+        self.Position = {'X': None, 'Y': None, 'Z': None};
+        self.FeedRate = None;
+        self.Relative = False;
+
+        self.Spelled = {};                                                      # Compact spellings of the words seen lately
+
+        self.Partial = "";                                                      # Any incomplete line written so far
+        self.Lines = [];                                                        # Lines ready to be passed on
+        self.LineCount = 0;                                                     # Lines passed on so far
+
+        self.Before = 0;                                                        # Bytes taken and passed on
+        self.After = 0;
+
+    def Forget(self):                                                           # Something happened we can't follow, start over
+
+        self.Motion = None;
+        self.Position = {'X': None, 'Y': None, 'Z': None};
+
+    def Encode(self, Line):                                                     # Take one line, pass on its compact version (if anything's left of it)
+
+        self.Before += len(Line);
+
+        Body = Line.rstrip("\r\n");
+        Ending = Line[len(Body):];
+
+        if "Line Bender" in Body:
+            Note = COMPACT_NOTE_PATTERN.search(Body);
+        else:
+            Note = None;
+
+        if Note is not None:
+            Body = Body[:Note.start()] + Body[Note.end():];
+
+        if COMPACT_LINE_PATTERN.match(Body) is None:                            # Not something we can take apart, so it goes as it is
+            self.Forget();
+            self.Pass(Body + Ending, Note);
+            return;
+
+        Words = COMPACT_WORD_PATTERN.findall(Body);
+
+        Codes = [float(Number) for Comment, Letter, Number in Words if Letter == "G" or Letter == "g"];
+        Motions = [Code for Code in Codes if Code in COMPACT_MOTION_CODES];
+
+        Careful = len(Motions) > 1 or (len(Codes) > len(Motions) and any(Code not in COMPACT_MOTION_CODES and Code not in COMPACT_MODAL_CODES for Code in Codes));
+
+        if 80.0 in Codes:
+            self.Motion = None;
+
+        if len(Codes) > len(Motions) and any(Code in (20.0, 21.0) or 54.0 <= Code <= 59.0 for Code in Codes):  # Other units or another coordinate system, the same numbers may be somewhere else
+            self.Position = {'X': None, 'Y': None, 'Z': None};
+
+        if 90.0 in Codes:
+            self.Relative = False;
+
+        if 91.0 in Codes:
+            self.Relative = True;
+
+        if len(Motions) == 1:
+            Motion = Motions[0];
+        else:
+            Motion = self.Motion;
+
+        if Careful:                                                             # G28, G30, G53, G92 and the like may take the tool anywhere, axes named or not
+            self.Forget();
+
+        Pieces = [];
+        Kept = False;                                                           # Whether any word besides an N-word is left
+        Guessing = self.Relative or Careful;                                    # Whether where the tool goes is anyone's guess
+        Straight = Motion == 0.0 or Motion == 1.0;
+        Spelled = self.Spelled;
+
+        for Comment, Letter, Number in Words:
+            if Comment != "":
+                Pieces.append(Comment);
+                Kept = True;
+                continue;
+
+            Letter = Letter.upper();
+
+            if Letter in "XYZ":
+                Value = float(Number);
+                Same = Value == self.Position[Letter];
+
+                if Guessing:
+                    self.Position[Letter] = None;
+                else:
+                    self.Position[Letter] = Value;
+
+                if Same and Straight and not Guessing:
+                    continue;
+            elif Letter == "G" and not Careful:
+                if float(Number) == self.Motion:
+                    continue;
+            elif Letter == "F" and not Careful:
+                Value = float(Number);
+                if Value == self.FeedRate:
+                    continue;
+                self.FeedRate = Value;
+
+            Word = Letter + Number;
+
+            if Word not in Spelled:                                             # The same words keep coming up, so they are only compacted once each
+                if len(Spelled) >= COMPACT_SPELLINGS:
+                    Spelled.clear();
+                Spelled[Word] = Letter + CompactNumber(Number);
+
+            Pieces.append(Spelled[Word]);
+
+            if Letter != "N":
+                Kept = True;
+
+        if Careful:                                                             # Whatever that was, it may have moved the tool or changed the mode
+            if len(Motions) == 1:
+                self.Motion = Motion;
+            else:
+                self.Motion = None;
+
+            for Comment, Letter, Number in Words:
+                if Letter.upper() == "F":
+                    self.FeedRate = None;
+        else:
+            self.Motion = Motion;
+
+        if not Kept and Body.strip() != "":                                     # Nothing left to say (a blank line stays a blank line)
+            self.Pass("", Note);
+            return;
+
+        self.Pass("".join(Pieces) + Ending, Note);
+
+    def Pass(self, Line, Note):                                                 # Pass a line on, its note (a match of COMPACT_NOTE_PATTERN) to the notes
+
+        if Line != "":
+            self.Lines.append(Line);
+            self.LineCount += 1;
+            self.After += len(Line);
+
+        if Note is not None and self.Notes is not None:
+            self.Notes.write("{0}: {1}\n".format(self.LineCount, Note.group(1)));
+
+    def write(self, Text):
+
+        Text = self.Partial + Text;
+        Start = 0;
+
+        while True:
+            End = Text.find("\n", Start);
+            if End < 0:
+                break;
+            self.Encode(Text[Start:End + 1]);
+            Start = End + 1;
+
+        self.Partial = Text[Start:];
+
+        if len(self.Lines) > 0:
+            self.Target.writelines(self.Lines);
+            del self.Lines[:];
+
+    def writelines(self, Lines):
+
+        for Line in Lines:
+            self.write(Line);
+
+    def flush(self):
+
+        self.Target.flush();
+
+    def close(self):                                                            # Finish the last line; stdout is only flushed
+
+        if len(self.Partial) > 0:
+            self.Encode(self.Partial);
+            self.Partial = "";
+
+        self.Target.writelines(self.Lines);
+        del self.Lines[:];
+
+        if self.Notes is not None:
+            self.Notes.close();
+
+        if self.Target is sys.stdout:
+            self.Target.flush();
+        else:
+            self.Target.close();
+
+# ******************************************************************************
+# RingCells() - the grid cells at a given distance (in cells) around a cell
+# ******************************************************************************
+
+def RingCells(Column, Row, Distance):
+
+    if Distance == 0:
+        return([(Column, Row)]);
+
+    Cells = [];
+
+    for Step in range(-Distance, Distance + 1):
+        Cells.append((Column + Step, Row - Distance));
+        Cells.append((Column + Step, Row + Distance));
+
+    for Step in range(-Distance + 1, Distance):
+        Cells.append((Column - Distance, Row + Step));
+        Cells.append((Column + Distance, Row + Step));
+
+    return(Cells);
+
+# ******************************************************************************
+# NearestOrder() - visit islands going to the nearest unvisited one every time
+#
+# Note: Entries and Exits are the points (X, Y) where each island starts and
+# ends, Islands the ones to visit and Start where the tool is at first. The
+# entry points go into a grid with about REORDER_CELL_ISLANDS of them per cell,
+# so finding the nearest one only means looking at the cells around the tool,
+# ring by ring, until the rings get farther away than the nearest point found
+# so far. When
+# the rings would take in more cells than there are islands left (at the end,
+# mostly, when the grid is all but empty) the ones left are simply all looked
+# at instead.
+# ******************************************************************************
+
+def NearestOrder(Entries, Exits, Islands, Start):
+
+    if len(Islands) == 0:
+        return([]);
+
+    Left = min(Entries[Island][0] for Island in Islands);
+    Bottom = min(Entries[Island][1] for Island in Islands);
+    Width = max(Entries[Island][0] for Island in Islands) - Left;
+    Height = max(Entries[Island][1] for Island in Islands) - Bottom;
+
+    Size = max(sqrt(REORDER_CELL_ISLANDS * Width * Height / len(Islands)), max(Width, Height) / len(Islands), 1e-9);
+
+    Grid = {};
+
+    for Island in Islands:
+        Grid.setdefault((int((Entries[Island][0] - Left) // Size), int((Entries[Island][1] - Bottom) // Size)), []).append(Island);
+
+    Remaining = set(Islands);
+    Order = [];
+    X, Y = Start;
+
+    while len(Remaining) > 0:
+        Column, Row = int((X - Left) // Size), int((Y - Bottom) // Size);
+        Best, BestDistance = None, None;
+        Distance = 0;
+
+        while True:
+            if (2 * Distance + 1) ** 2 > 4 * len(Remaining) + 16:              # Cheaper to look at them all by now
+                for Island in Remaining:
+                    Length = hypot(Entries[Island][0] - X, Entries[Island][1] - Y);
+                    if Best is None or Length < BestDistance:
+                        Best, BestDistance = Island, Length;
+                break;
+
+            for Cell in RingCells(Column, Row, Distance):
+                for Island in Grid.get(Cell, ()):
+                    Length = hypot(Entries[Island][0] - X, Entries[Island][1] - Y);
+                    if Best is None or Length < BestDistance:
+                        Best, BestDistance = Island, Length;
+
+            if Best is not None and BestDistance <= Distance * Size:            # Nothing beyond this ring can be any nearer
+                break;
+
+            Distance += 1;
+
+        Remaining.remove(Best);
+        Grid[(int((Entries[Best][0] - Left) // Size), int((Entries[Best][1] - Bottom) // Size))].remove(Best);
+        Order.append(Best);
+        X, Y = Exits[Best];
+
+    return(Order);
+
+# ******************************************************************************
+# TwoOptOrder() - improve an order of islands by reversing stretches of it
+#
+# Note: islands have a direction (they start and end in different places), so
+# reversing a stretch changes the rapids inside it too, not just the two at its
+# ends. These are added up as the stretch grows, which is why stretches are
+# kept to REORDER_WINDOW islands. Start is where the tool comes from and End
+# where it has to go afterwards ('None' for anywhere). Works in place.
+# ******************************************************************************
+
+def TwoOptOrder(Entries, Exits, Order, Start, End):
+
+    Count = len(Order);
+
+    for Sweep in range(REORDER_SWEEPS):
+        Improved = False;
+
+        for First in range(Count - 1):
+            if First == 0:
+                X, Y = Start;
+            else:
+                X, Y = Exits[Order[First - 1]];
+
+            Into = hypot(Entries[Order[First]][0] - X, Entries[Order[First]][1] - Y);
+            Forward = 0.0;                                                      # Rapids inside the stretch, as it is and reversed
+            Backward = 0.0;
+
+            for Last in range(First + 1, min(First + REORDER_WINDOW, Count)):
+                Forward += hypot(Entries[Order[Last]][0] - Exits[Order[Last - 1]][0], Entries[Order[Last]][1] - Exits[Order[Last - 1]][1]);
+                Backward += hypot(Entries[Order[Last - 1]][0] - Exits[Order[Last]][0], Entries[Order[Last - 1]][1] - Exits[Order[Last]][1]);
+
+                if Last + 1 < Count:
+                    Next = Entries[Order[Last + 1]];
+                else:
+                    Next = End;
+
+                if Next is None:
+                    Old = Into + Forward;
+                    New = hypot(Entries[Order[Last]][0] - X, Entries[Order[Last]][1] - Y) + Backward;
+                else:
+                    Old = Into + Forward + hypot(Next[0] - Exits[Order[Last]][0], Next[1] - Exits[Order[Last]][1]);
+                    New = hypot(Entries[Order[Last]][0] - X, Entries[Order[Last]][1] - Y) + Backward + hypot(Next[0] - Exits[Order[First]][0], Next[1] - Exits[Order[First]][1]);
+
+                if New < Old - 1e-12:
+                    Order[First:Last + 1] = Order[First:Last + 1][::-1];
+                    Improved = True;
+                    break;
+
+        if not Improved:
+            break;
+
+# ******************************************************************************
+# RapidDistance() - rapid travel along an order of islands (see TwoOptOrder())
+# ******************************************************************************
+
+def RapidDistance(Entries, Exits, Order, Start, End):
+
+    Total = 0.0;
+    X, Y = Start;
+
+    for Island in Order:
+        Total += hypot(Entries[Island][0] - X, Entries[Island][1] - Y);
+        X, Y = Exits[Island];
+
+    if End is not None:
+        Total += hypot(End[0] - X, End[1] - Y);
+
+    return(Total);
+
+# ******************************************************************************
+# IslandReorderer - a file-like filter cutting the islands in a better order
+#
+# Note: the whole program is held back and split into segments, each ending
+# with a retract: a rapid going up in Z, and nothing else. The segments that
+# are islands can be cut in any order, as long as they all retract to the same
+# height: islands start with a rapid to both X and Y (before any other move),
+# set their feed rate before cutting, and have nothing else on their lines but
+# G0-G3 moves and comments (no M-words, other G-words, tool changes and the
+# like). Each run of islands in a row is reordered by NearestOrder() and then
+# TwoOptOrder(). Whatever is not an island stays right where it is, and so does
+# the last island of a run if whatever comes after it depends on where it ends
+# (as does the first one, if nobody knows where the tool comes from).
+# ******************************************************************************
+
+class IslandReorderer(object):
+
+    def __init__(self, Target):
+
+        self.Target = Target;                                                   # Where the lines go in the end
+
+        self.Partial = "";                                                      # Any incomplete line written so far
+        self.Lines = [];                                                        # All lines written so far
+
+        self.Islands = 0;                                                       # Islands reordered, and the rapid travel between them before and after
+        self.Before = 0.0;
+        self.After = 0.0;
+
+    def Segments(self):                                                         # Split the lines into segments: (lines, island or not, independent or not, entry, exit (X/Y it moves to itself), retract height)
+
+        Segments = [];
+        Lines = [];
+        Motion = None;
+        Position = {'X': None, 'Y': None, 'Z': None};
+        Clean = True;                                                           # Nothing but moves and comments so far
+        Moved = False;                                                          # Any moves so far
+        Independent = True;                                                     # Doesn't care where the tool was before it
+        Fed = False;                                                            # Set its own feed rate
+        Entry = None;
+        Own = {'X': None, 'Y': None};                                           # Where it leaves the tool, for the axes it moves itself
+
+        for Line in self.Lines:
+            Lines.append(Line);
+
+            Plain = REORDER_LINE_PATTERN.match(Line);
+
+            if Plain is not None:                                               # Most lines are just moves, a quick look does for them
+                Params = Plain.groupdict();
+                Values = dict((Axis, float(Params[Axis])) for Axis in "XYZ" if Params[Axis] is not None);
+                Values['G'] = None if Params['G'] is None else int(Params['G']);
+            else:
+                Params, Values = ScanForParams(Line);
+
+                if Values['G'] is not None and Values['G'] > 3 or Values['M'] is not None or REORDER_FOREIGN_PATTERN.search(REORDER_COMMENT_PATTERN.sub("", Line)) is not None:
+                    Clean = False;
+
+            if Values['G'] is not None and Values['G'] <= 3:
+                Motion = Values['G'];
+
+            if Params['F'] is not None:
+                Fed = True;
+
+            if Params['X'] is None and Params['Y'] is None and Params['Z'] is None:
+                continue;
+
+            if not Moved:                                                       # The first move has to be a rapid to X and Y
+                if Motion == 0 and Params['X'] is not None and Params['Y'] is not None and Params['Z'] is None:
+                    Entry = (Values['X'], Values['Y']);
+                else:
+                    Independent = False;
+                Moved = True;
+
+            if Motion != 0 and not Fed:
+                Independent = False;
+
+            Retract = Motion == 0 and Params['X'] is None and Params['Y'] is None and (Position['Z'] is None or Values['Z'] > Position['Z']);
+
+            for Axis in "XYZ":
+                if Params[Axis] is not None:
+                    Position[Axis] = Values[Axis];
+
+            for Axis in "XY":
+                if Params[Axis] is not None:
+                    Own[Axis] = Values[Axis];
+
+            if Retract:
+                Island = Clean and Independent and Entry is not None;
+                Segments.append((Lines, Island, Independent, Entry, (Own['X'], Own['Y']), Position['Z']));
+                Lines = [];
+                Clean, Moved, Independent, Fed, Entry = True, False, True, False, None;
+                Own = {'X': None, 'Y': None};
+
+        if len(Lines) > 0:                                                      # Whatever's left after the last retract is never an island
+            Segments.append((Lines, False, Independent, None, (Own['X'], Own['Y']), None));
+
+        return(Segments);
+
+    def Reorder(self, Run, Start, PinLast):                                     # Find a better order for a run of islands (a list of segments)
+
+        Entries = [Segment[3] for Segment in Run];
+        Exits = [Segment[4] for Segment in Run];
+
+        Order = range(len(Run));
+        Pinned = [];
+        Last = None;
+        End = None;
+
+        if Start[0] is None or Start[1] is None:                                # Nobody knows where the tool comes from, the first island has to stay first
+            Pinned = [Order.pop(0)];
+            Start = Exits[Pinned[0]];
+
+        if PinLast and len(Order) > 0:                                          # Whatever comes next wants the last island to stay last
+            Last = Order.pop();
+            End = Entries[Last];
+
+        Before = RapidDistance(Entries, Exits, Order, Start, End);
+
+        NewOrder = NearestOrder(Entries, Exits, Order, Start);
+        TwoOptOrder(Entries, Exits, NewOrder, Start, End);
+
+        After = RapidDistance(Entries, Exits, NewOrder, Start, End);
+
+        if After > Before:                                                      # Worse than it was (it can happen), keep it as it was
+            NewOrder, After = Order, Before;
+
+        self.Islands += len(Run);
+        self.Before += Before;
+        self.After += After;
+
+        if Last is not None:
+            NewOrder.append(Last);
+
+        return([Run[Island] for Island in Pinned + NewOrder]);
+
+    def Flush(self):                                                            # Reorder the runs of islands and write it all out
+
+        Run = [];
+        X, Y = None, None;                                                      # Where the tool is, as it's written out
+        Height = None;                                                          # Height of the last retract written out
+
+        for Segment in self.Segments() + [None]:
+            if Segment is not None and Segment[1] and Segment[5] == Height:     # Islands retracting to the height they start at join the run
+                Run.append(Segment);
+                continue;
+
+            if len(Run) > 0:                                                    # The run is over, put it in a better order
+                Run = self.Reorder(Run, (X, Y), Segment is not None and not Segment[2]);
+
+                for Island in Run:
+                    self.Target.writelines(Island[0]);
+
+                X, Y = Run[-1][4];
+                Run = [];
+
+            if Segment is None:
+                break;
+
+            self.Target.writelines(Segment[0]);
+
+            if Segment[4][0] is not None:                                       # Only what it moves itself, the rest stays where it was
+                X = Segment[4][0];
+
+            if Segment[4][1] is not None:
+                Y = Segment[4][1];
+
+            Height = Segment[5];
+
+    def write(self, Text):
+
+        Text = self.Partial + Text;
+        Start = 0;
+
+        while True:
+            End = Text.find("\n", Start);
+            if End < 0:
+                break;
+            self.Lines.append(Text[Start:End + 1]);
+            Start = End + 1;
+
+        self.Partial = Text[Start:];
+
+    def writelines(self, Lines):
+
+        for Line in Lines:
+            if self.Partial == "" and Line.find("\n") == len(Line) - 1:       # A whole line, as they mostly come
+                self.Lines.append(Line);
+            else:
+                self.write(Line);
+
+    def flush(self):
+
+        pass;                                                                   # Nothing goes out before the end anyway
+
+    def close(self):                                                            # Reorder and write out everything; stdout is only flushed
+
+        if len(self.Partial) > 0:
+            self.Lines.append(self.Partial);
+            self.Partial = "";
+
+        self.Flush();
+        del self.Lines[:];
+
+        if self.Target is sys.stdout:
+            self.Target.flush();
+        else:
+            self.Target.close();
+
+# ******************************************************************************
+# GetCounters() / SetCounters() / AddCounters() - the processing stats as a dict
+# ******************************************************************************
+
+def GetCounters():
+
+    return(dict({'TextLinesHandled': TextLinesHandled, 'TextLinesIgnored': TextLinesIgnored, 'PathLinesHandled': PathLinesHandled,
+                 'PathLinesDropped': PathLinesDropped, 'PathArcsAdjusted': PathArcsAdjusted, 'PathArcsUnedited': PathArcsUnedited,
+                 'PathArcsAccepted': PathArcsAccepted, 'PathArcsFlawed': PathArcsFlawed,
+                 'CacheHits': CacheHits, 'CacheMisses': CacheMisses, 'PathSecondsSaved': PathSecondsSaved,
+                 'CompactBytesBefore': CompactBytesBefore, 'CompactBytesAfter': CompactBytesAfter,
+                 'PathIslandsReordered': PathIslandsReordered, 'RapidDistanceBefore': RapidDistanceBefore, 'RapidDistanceAfter': RapidDistanceAfter,
+                 'ArcMemoHits': ArcMemoHits, 'ArcMemoMisses': ArcMemoMisses,
+                 'StreamLinesSent': StreamLinesSent, 'StreamFirstSeconds': StreamFirstSeconds}));
+
+def SetCounters(Counters):
+
+    global TextLinesHandled;
+    global TextLinesIgnored;
+    global PathLinesHandled;
+    global PathLinesDropped;
+    global PathArcsAdjusted;
+    global PathArcsUnedited;
+    global PathArcsAccepted;
+    global PathArcsFlawed;
+    global CacheHits;
+    global CacheMisses;
+    global PathSecondsSaved;
+    global CompactBytesBefore;
+    global CompactBytesAfter;
+    global PathIslandsReordered;
+    global RapidDistanceBefore;
+    global RapidDistanceAfter;
+    global ArcMemoHits;
+    global ArcMemoMisses;
+    global StreamLinesSent;
+    global StreamFirstSeconds;
+
+    TextLinesHandled = Counters['TextLinesHandled'];
+    TextLinesIgnored = Counters['TextLinesIgnored'];
+    PathLinesHandled = Counters['PathLinesHandled'];
+    PathLinesDropped = Counters['PathLinesDropped'];
+    PathArcsAdjusted = Counters['PathArcsAdjusted'];
+    PathArcsUnedited = Counters['PathArcsUnedited'];
+    PathArcsAccepted = Counters['PathArcsAccepted'];
+    PathArcsFlawed = Counters['PathArcsFlawed'];
+    CacheHits = Counters.get('CacheHits', CacheHits);                           # Cached entries only hold the path counters
+    CacheMisses = Counters.get('CacheMisses', CacheMisses);
+    PathSecondsSaved = Counters.get('PathSecondsSaved', PathSecondsSaved);
+    CompactBytesBefore = Counters.get('CompactBytesBefore', CompactBytesBefore);
+    CompactBytesAfter = Counters.get('CompactBytesAfter', CompactBytesAfter);
+    PathIslandsReordered = Counters.get('PathIslandsReordered', PathIslandsReordered);
+    RapidDistanceBefore = Counters.get('RapidDistanceBefore', RapidDistanceBefore);
+    RapidDistanceAfter = Counters.get('RapidDistanceAfter', RapidDistanceAfter);
+    ArcMemoHits = Counters.get('ArcMemoHits', ArcMemoHits);
+    ArcMemoMisses = Counters.get('ArcMemoMisses', ArcMemoMisses);
+    StreamLinesSent = Counters.get('StreamLinesSent', StreamLinesSent);
+    StreamFirstSeconds = Counters.get('StreamFirstSeconds', StreamFirstSeconds);
+
+def AddCounters(Counters):
+
+    Totals = GetCounters();
+
+    for Name in COUNTER_NAMES:
+        Totals[Name] += Counters.get(Name, 0);
+
+    SetCounters(Totals);
+
+# ******************************************************************************
+# ExitPosition() - where a block of lines leaves the tool, given where it starts
+#
+# Note: this only looks for the last X/Y/Z words, going backwards from the end,
+# so it's cheap; it doesn't complain about anything either - the worker that
+# gets the block does that, in due order.
+# ******************************************************************************
+
+def ExitPosition(Lines, Position):
+
+    Position = dict(Position);
+    Missing = set("XYZ");
+
+    for Line in reversed(Lines):
+        Found = [];
+
+        for Word in WORD_PATTERN.finditer(Line.replace(" ", "").replace("\t", "")):
+            if Word.lastindex == 4 and Word.group(3).upper() in Missing:        # Only real-valued X/Y/Z words count
+                try:
+                    Position[Word.group(3).upper()] = float(Word.group(4));
+                    Found.append(Word.group(3).upper());
+                except ValueError:
+                    pass;
+
+        Missing.difference_update(Found);
+
+        if len(Missing) == 0:
+            break;
+
+    return(Position);
+
+# ******************************************************************************
+# ExitModes() - the motion mode (G0-G3) and feed rate a block of lines leaves
+#
+# Note: like ExitPosition(), going backwards until both are found, words and
+# all, so that the last G0-G3 or F on a line is the one that counts. The feed
+# rate is kept as text, the way it was written.
+# ******************************************************************************
+
+def ExitModes(Lines, Motion, FeedRate):
+
+    Found = {};
+
+    for Line in reversed(Lines):
+        for Word in reversed(list(WORD_PATTERN.finditer(Line.replace(" ", "").replace("\t", "")))):   # The last one on the line is the one in effect
+            if Word.lastindex == 2 and Word.group(1).upper() == "G" and int(Word.group(2)) <= 3:
+                Found.setdefault('G', int(Word.group(2)));
+            elif Word.lastindex == 4 and Word.group(3).upper() == "F":
+                Found.setdefault('F', Word.group(4));
+
+        if len(Found) == 2:
+            break;
+
+    return(Found.get('G', Motion), Found.get('F', FeedRate));
+
+# ******************************************************************************
+# StartWorker() - set up a freshly started worker process for BendChunk()
+# ******************************************************************************
+
+def StartWorker():
+
+    global WorkerRecords;
+
+    Keeper = logging.handlers.BufferingHandler(sys.maxsize);                   # Keep log records instead of printing them, so they come out in line order
+
+    RootLogger = logging.getLogger();
+
+    for Handler in list(RootLogger.handlers):
+        RootLogger.removeHandler(Handler);
+
+    RootLogger.addHandler(Keeper);
+
+    WorkerRecords = Keeper.buffer;
+
+# ******************************************************************************
+# BendChunk() - bend a block of lines in a worker process, starting at Position
+#
+# Note: the chunk is (first line number, position, lines, options), the result
+# is (output lines, counters, statistics, log records, failed or not).
+# ******************************************************************************
+
+def BendChunk(Chunk):
+
+    global CurrentPosition;
+    global PendingArcs;
+
+    FirstLineNumber, Position, Lines, Options = Chunk;
+
+    global Statistics;
+
+    ApplySettings(Options);
+
+    Statistics = NewStatistics();
+    Counters = dict.fromkeys(COUNTER_NAMES, 0);                                 # Start counting from scratch for this block,
+    Counters['TextLinesHandled'] = FirstLineNumber - 1;                         # except that line numbers in messages still refer to the whole file
+    SetCounters(Counters);
+
+    CurrentPosition = dict(Position);
+    PendingArcs = None;
+
+    del WorkerRecords[:];
+
+    try:
+        if Options['Vector']:
+            OutputLines = ParseBlock(Lines);
+        else:
+            OutputLines = [ParseLine(Line) for Line in Lines];
+        Failed = False;
+    except SystemExit:                                                          # The error is already among the log records, just let the parent know
+        OutputLines = [];
+        Failed = True;
+
+    Counters = GetCounters();
+    Counters['TextLinesHandled'] -= FirstLineNumber - 1;
+
+    return(OutputLines, Counters, Statistics, list(WorkerRecords), Failed);
+
+# ******************************************************************************
+# BendInParallel() - bend the input in blocks spread over a pool of processes
+#
+# Note: the only thing a block needs from the ones before it is the position it
+# starts from, which ExitPosition() finds cheaply while reading. The results are
+# written and the counters summed strictly in the original order.
+# ******************************************************************************
+
+def BendInParallel(InFile, OutFile, Options):
+
+    global CurrentPosition;
+    global CacheHits;
+    global CacheMisses;
+
+    Jobs = Options['Jobs'];
+
+    Pool = multiprocessing.Pool(Jobs, StartWorker);
+    Pending = deque();                                                          # Blocks handed out, oldest first; at most two per worker so memory stays bounded
+
+    if CacheDirectory is None:                                                  # Blocks have a fixed size, unless the cache needs them cut by their content
+        Blocks = iter(lambda: list(islice(InFile, BLOCK_LINES)), []);
+    else:
+        Blocks = CacheBlocks(InFile);
+
+    LineNumber = TextLinesHandled + 1;
+    Position = dict(CurrentPosition);
+    Reading = True;
+
+    while True:
+        while Reading and len(Pending) < 2 * Jobs:
+            Lines = next(Blocks, None);
+
+            if Lines is None:
+                Reading = False;
+                break;
+
+            Key = None;
+            Entry = None;
+
+            if CacheDirectory is not None:                                      # Blocks found in the cache don't even go to the workers
+                Key = CacheBlockKey(Lines, Position);
+                Entry = ReadCache(Key);
+
+            if Entry is None:
+                Result = Pool.apply_async(BendChunk, ((LineNumber, Position, Lines, Options),));
+            else:
+                Result = None;
+
+            LineNumber += len(Lines);
+            Position = ExitPosition(Lines, Position);
+
+            Pending.append((Key, Entry, Result, Position));
+
+            if Key is not None and CacheManifest is not None:
+                CacheManifest.append(Key);
+
+        if len(Pending) == 0:
+            break;
+
+        Key, Entry, Result, ExitPositionNow = Pending.popleft();
+
+        if Result is not None:                                                  # Let the other sessions have a turn while the workers are at it
+            TakeTurns(Result.wait);
+
+        if Entry is not None:
+            WriteTimed(OutFile, (Entry[0],));
+            AddCounters(Entry[1]);
+            CacheHits += 1;
+            continue;
+
+        OutputLines, Counters, Figures, Records, Failed = Result.get();
+
+        for Record in Records:                                                  # Pass on whatever the worker had to say about its block
+            logging.getLogger().handle(Record);
+
+        if Failed:
+            Pool.terminate();
+            Fail(Records[-1].getMessage() if len(Records) > 0 else "Bending failed in a worker process", Logged = True);
+
+        WriteTimed(OutFile, OutputLines);
+        AddCounters(Counters);
+        MergeStatistics(Figures);
+
+        if Key is not None:
+            WriteCache(Key, ("".join(OutputLines), dict((Name, Counters[Name]) for Name in PATH_COUNTER_NAMES), ExitPositionNow));
+            CacheMisses += 1;
+
+    Pool.close();
+    Pool.join();
+
+    CurrentPosition = Position;
+
+# ******************************************************************************
+# CacheKey() - a hex digest identifying anything made of the given parts
+# ******************************************************************************
+
+def CacheKey(*Parts):
+
+    Digest = hashlib.sha1(CacheSettings);
+
+    for Part in Parts:
+        Digest.update(repr(Part));
+        Digest.update("\0");
+
+    return(Digest.hexdigest());
+
+# ******************************************************************************
+# CachePath() - where the cache entry for a key lives (or would live)
+#
+# Note: entries are spread over subdirectories by the first two characters of
+# their key, so that no single directory ends up with millions of files.
+# ******************************************************************************
+
+def CachePath(Key):
+
+    return(os.path.join(CacheDirectory, Key[:2], Key));
+
+# ******************************************************************************
+# ReadCache() - fetch a cache entry, or 'None' if there's no (usable) entry
+# ******************************************************************************
+
+def ReadCache(Key):
+
+    Path = CachePath(Key);
+
+    try:
+        with open(Path, 'rb') as CacheFile:
+            Entry = pickle.loads(zlib.decompress(CacheFile.read()));
+        os.utime(Path, None);                                                   # Mark it as recently used, for TrimCache()
+    except Exception:                                                           # Missing, evicted under our feet or damaged - all the same to us
+        return(None);
+
+    return(Entry);
+
+# ******************************************************************************
+# WriteCache() - store a cache entry (quietly giving up if that doesn't work)
+#
+# Note: entries are written under a temporary name first and then renamed, so
+# other processes never see half of one.
+# ******************************************************************************
+
+def WriteCache(Key, Entry):
+
+    Path = CachePath(Key);
+    TempPath = Path + ".{0}.tmp".format(os.getpid());
+
+    try:
+        if not os.path.isdir(os.path.dirname(Path)):
+            os.makedirs(os.path.dirname(Path));
+
+        with open(TempPath, 'wb') as CacheFile:
+            CacheFile.write(zlib.compress(pickle.dumps(Entry, 2), 1));
+
+        os.rename(TempPath, Path);
+    except (IOError, OSError):
+        logging.debug("Could not store cache entry {0}.".format(Key));
+
+        try:
+            os.remove(TempPath);
+        except OSError:
+            pass;
+
+# ******************************************************************************
+# TrimCache() - evict the least recently used cache entries above a size limit
+# ******************************************************************************
+
+def TrimCache(Directory, MaxBytes):
+
+    Entries = [];
+    TotalBytes = 0;
+
+    for DirPath, DirNames, EntryNames in os.walk(Directory):
+        for EntryName in EntryNames:
+            Path = os.path.join(DirPath, EntryName);
+            try:
+                Status = os.stat(Path);
+            except OSError:
+                continue;
+            Entries.append((Status.st_mtime, Status.st_size, Path));
+            TotalBytes += Status.st_size;
+
+    Entries.sort();                                                             # Oldest first
+
+    for Time, Size, Path in Entries:
+        if TotalBytes <= MaxBytes:
+            break;
+        try:
+            os.remove(Path);
+            TotalBytes -= Size;
+        except OSError:
+            pass;
+
+# ******************************************************************************
+# CacheBlocks() - split lines into blocks at points chosen by their content
+#
+# Note: a block ends after a line whose CRC matches CACHE_BLOCK_MASK, so after
+# an edit the following blocks still start at the very same lines and can be
+# found in the cache, instead of all of them shifting along with the edit.
+# ******************************************************************************
+
+def CacheBlocks(Lines):
+
+    MinLines, MaxLines = CACHE_BLOCK_LINES;
+    Block = [];
+
+    for Line in Lines:
+        Block.append(Line);
+
+        if len(Block) >= MaxLines or (len(Block) >= MinLines and zlib.crc32(Line) & CACHE_BLOCK_MASK == 0):
+            yield Block;
+            Block = [];
+
+    if len(Block) > 0:
+        yield Block;
+
+# ******************************************************************************
+# CacheBlockKey() - the cache key of a block of lines starting at Position
+#
+# Note: the output of a block depends on nothing else than its lines and where
+# the tool is when it starts (plus the settings, which are in every key).
+# ******************************************************************************
+
+def CacheBlockKey(Lines, Position):
+
+    return(CacheKey("block", Position['X'], Position['Y'], Position['Z'], "".join(Lines)));
+
+# ******************************************************************************
+# BendCachedBlock() - bend a block of lines, or fetch it from the cache instead
+#
+# Note: cache entries are (output text, counters, position after the block).
+# ******************************************************************************
+
+def BendCachedBlock(Lines, Vector):
+
+    global CurrentPosition;
+    global CacheHits;
+    global CacheMisses;
+
+    Key = CacheBlockKey(Lines, CurrentPosition);
+
+    if CacheManifest is not None:
+        CacheManifest.append(Key);
+
+    Entry = ReadCache(Key);
+
+    if Entry is not None:                                                       # Been there, done that
+        OutputText, Counters, Position = Entry;
+
+        AddCounters(Counters);
+        CurrentPosition = dict(Position);
+        CacheHits += 1;
+
+        return(OutputText.splitlines(True));
+
+    Before = GetCounters();
+
+    if Vector:
+        OutputLines = ParseBlock(Lines);
+    else:
+        OutputLines = [ParseLine(Line) for Line in Lines];
+
+    After = GetCounters();
+
+    WriteCache(Key, ("".join(OutputLines), dict((Name, After[Name] - Before[Name]) for Name in PATH_COUNTER_NAMES), dict(CurrentPosition)));
+    CacheMisses += 1;
+
+    return(OutputLines);
+
+# ******************************************************************************
+# FileDigest() - a digest of a whole file's contents, read in large pieces
+# ******************************************************************************
+
+def FileDigest(FileName):
+
+    Digest = hashlib.sha1();
+
+    with open(FileName, 'rb') as InFile:
+        for Piece in iter(lambda: InFile.read(1 << 20), b""):
+            Digest.update(Piece);
+
+    return(Digest.hexdigest());
+
+# ******************************************************************************
+# ReplayCachedFile() - write out a whole file's blocks straight from the cache
+# ******************************************************************************
+
+def ReplayCachedFile(OutFile, Manifest):
+
+    global CurrentPosition;
+    global CacheHits;
+
+    BlockKeys, Counters, Position = Manifest;
+
+    for Key in BlockKeys:
+        Entry = ReadCache(Key);
+
+        if Entry is None:                                                       # Only if it got evicted since BendFile() checked, and half the output is out already
+            Fail("Cache entry {0} disappeared while in use".format(Key), FileError);
+
+        OutFile.write(Entry[0]);
+        TakeTurns();
+
+    AddCounters(Counters);
+    CurrentPosition = dict(Position);
+    CacheHits += len(BlockKeys);
+
+# ******************************************************************************
+# MakeCacheSettings() - everything the output depends on besides the input
+# ******************************************************************************
+
+def MakeCacheSettings(Options):
+
+    return("Line Bender {0}, cache format {1}, tolerance {2!r}".format(VERSION, CACHE_FORMAT, Options['Tolerance']));
+
+# ******************************************************************************
+# IndexFileName() - the index file name / path for an input file (see --index)
+# ******************************************************************************
+
+def IndexFileName(InFileName):
+
+    return(InFileName + ".lbx");
+
+# ******************************************************************************
+# BuildIndex() - go through a file once, noting down a checkpoint every so often
+#
+# Note: a checkpoint is taken every INDEX_INTERVAL lines, before the line, and
+# holds everything needed to start bending right there: the byte offset of the
+# line, the tool position and the modes in effect. Its line number is implied
+# (checkpoint i is at line i * INDEX_INTERVAL + 1). The lowest and highest N-word
+# of the lines up to the next one are noted down too, for finding N-words.
+# Like the cache entries, the index is a dict of typed arrays (positions are
+# kept as three numbers per checkpoint, with NaN standing for unknown), along
+# with the size and modification time of the file it belongs to, so that it can
+# tell when it's out of date.
+# ******************************************************************************
+
+def BuildIndex(InFileName):
+
+    Status = os.stat(InFileName);
+
+    Index = {
+        'Format': INDEX_FORMAT,
+        'Size': Status.st_size,
+        'Modified': Status.st_mtime,
+        'Interval': INDEX_INTERVAL,
+        'Lines': 0,
+        'Offsets': array.array('d'),                                            # Doubles hold any offset a file can have exactly
+        'Positions': array.array('d'),
+        'Motions': array.array('b'),
+        'FeedRates': [],
+        'NumbersLow': array.array('d'),
+        'NumbersHigh': array.array('d'),
+    };
+
+    Position = {'X': None, 'Y': None, 'Z': None};
+    Motion, FeedRate = None, None;
+    Offset = 0;
+
+    with open(InFileName, 'rb') as InFile:
+        while True:
+            Lines = list(islice(InFile, INDEX_INTERVAL));
+
+            if len(Lines) == 0:
+                break;
+
+            Text = "".join(Lines);
+            Numbers = [int(Number) for Number in INDEX_NUMBER_PATTERN.findall(Text)];
+
+            Index['Offsets'].append(Offset);
+            Index['Positions'].extend(float('nan') if Position[Axis] is None else Position[Axis] for Axis in "XYZ");
+            Index['Motions'].append(-1 if Motion is None else Motion);
+            Index['FeedRates'].append(FeedRate);
+            Index['NumbersLow'].append(min(Numbers) if len(Numbers) > 0 else float('nan'));
+            Index['NumbersHigh'].append(max(Numbers) if len(Numbers) > 0 else float('nan'));
+
+            Position = ExitPosition(Lines, Position);
+            Motion, FeedRate = ExitModes(Lines, Motion, FeedRate);
+            Offset += len(Text);
+            Index['Lines'] += len(Lines);
+
+    return(Index);
+
+# ******************************************************************************
+# ReadIndex() / WriteIndex() - load an up to date index of a file, or store one
+#
+# Note: ReadIndex() returns 'None' for missing, damaged and outdated indexes.
+# ******************************************************************************
+
+def ReadIndex(InFileName):
+
+    try:
+        with open(IndexFileName(InFileName), 'rb') as IndexFile:
+            Index = pickle.loads(zlib.decompress(IndexFile.read()));
+        Status = os.stat(InFileName);
+    except Exception:
+        return(None);
+
+    if Index.get('Format') != INDEX_FORMAT or Index['Size'] != Status.st_size or Index['Modified'] != Status.st_mtime:
+        return(None);
+
+    return(Index);
+
+def WriteIndex(InFileName, Index):
+
+    try:
+        with open(IndexFileName(InFileName), 'wb') as IndexFile:
+            IndexFile.write(zlib.compress(pickle.dumps(Index, 2), 1));
+    except IOError:
+        logging.warning("Cannot write index file \"{0}\".".format(IndexFileName(InFileName)));
+
+# ******************************************************************************
+# FetchIndex() - the index of a file, built (and stored) first if need be
+# ******************************************************************************
+
+def FetchIndex(InFileName):
+
+    Index = ReadIndex(InFileName);
+
+    if Index is None:
+        logging.info("Indexing {0}.".format(InFileName));
+        Index = BuildIndex(InFileName);
+        WriteIndex(InFileName, Index);
+
+    return(Index);
+
+# ******************************************************************************
+# CheckpointState() - the position and modes noted down at a checkpoint
+# ******************************************************************************
+
+def CheckpointState(Index, Checkpoint):
+
+    Position = {};
+
+    for Number, Axis in enumerate("XYZ"):
+        Value = Index['Positions'][3 * Checkpoint + Number];
+        Position[Axis] = None if Value != Value else Value;                     # NaN is the only thing that isn't equal to itself
+
+    Motion = Index['Motions'][Checkpoint];
+
+    return(Position, None if Motion < 0 else Motion, Index['FeedRates'][Checkpoint]);
+
+# ******************************************************************************
+# FindNumber() - the line number of the first line with a given N-word, or 'None'
+#
+# Note: only the stretches between checkpoints that may have it are read.
+# ******************************************************************************
+
+def FindNumber(InFile, Index, Number):
+
+    for Checkpoint in range(len(Index['Offsets'])):
+        if not Index['NumbersLow'][Checkpoint] <= Number <= Index['NumbersHigh'][Checkpoint]:   # (NaN fails every comparison)
+            continue;
+
+        InFile.seek(int(Index['Offsets'][Checkpoint]));
+
+        for Count, Line in enumerate(islice(InFile, Index['Interval'])):
+            Word = INDEX_NUMBER_PATTERN.match(Line);
+            if Word is not None and int(Word.group(1)) == Number:
+                return(Checkpoint * Index['Interval'] + Count + 1);
+
+    return(None);
+
+# ******************************************************************************
+# SeekLines() - the lines of a range of a file, read from the nearest checkpoint
+#
+# Note: the file is positioned at the checkpoint before the first line, the
+# lines up to that one are skipped (only to see where they take the tool) and
+# the tool position is set to where it is just before the first line. Last is
+# 'None' for the end of the file.
+# ******************************************************************************
+
+def SeekLines(InFile, Index, First, Last):
+
+    global CurrentPosition;
+
+    Checkpoint = min((First - 1) // Index['Interval'], len(Index['Offsets']) - 1);
+
+    InFile.seek(int(Index['Offsets'][Checkpoint]));
+
+    Position, Motion, FeedRate = CheckpointState(Index, Checkpoint);
+
+    Skipped = list(islice(InFile, First - 1 - Checkpoint * Index['Interval']));
+
+    CurrentPosition = ExitPosition(Skipped, Position);
+
+    if Last is None:
+        return(InFile);
+
+    return(islice(InFile, max(Last - First + 1, 0)));
+
+# ******************************************************************************
+# SplitRanges() - line ranges splitting a file into Parts at its checkpoints
+# ******************************************************************************
+
+def SplitRanges(Index, Parts):
+
+    Checkpoints = len(Index['Offsets']);
+    Ranges = [];
+
+    for Part in range(min(max(Parts, 1), max(Checkpoints, 1))):
+        First = Part * Checkpoints // Parts * Index['Interval'] + 1;
+        Last = min((Part + 1) * Checkpoints // Parts * Index['Interval'], Index['Lines']);
+        Ranges.append((First, Last));
+
+    return(Ranges);
+
+# ******************************************************************************
+# ReadWhole() - the whole text of a file, decompressed if need be
+# ******************************************************************************
+
+def ReadWhole(FileName):
+
+    if CompressionOf(FileName) is not None:
+        InFile = DecompressingFile(FileName, CompressionOf(FileName));
+    else:
+        InFile = open(FileName, 'r');
+
+    try:
+        return(InFile.read());
+    finally:
+        InFile.close();
+
+# ******************************************************************************
+# VerifyValues() - the G, X, Y, I and J numbers of a line ('None' if missing)
+#
+# Note: lines the way Line Grinder and Line Bender write them are taken apart
+# by a single regex match, anything else is scanned the usual way.
+# ******************************************************************************
+
+def VerifyValues(Line):
+
+    Match = VERIFY_LINE_PATTERN.match(Line);
+
+    if Match is None:
+        Params, Values = ScanForParams(Line);
+        return((Values['G'], Values['X'], Values['Y'], Values['I'], Values['J']));
+
+    G, X, Y, I, J = Match.groups();
+
+    try:
+        return((None if G is None else int(G), None if X is None else float(X), None if Y is None else float(Y),
+                None if I is None else float(I), None if J is None else float(J)));
+    except ValueError:                                                          # Something like "X1.2.3", let the scanner complain about it properly
+        Params, Values = ScanForParams(Line);
+        return((Values['G'], Values['X'], Values['Y'], Values['I'], Values['J']));
+
+# ******************************************************************************
+# VerifyArcs() - compare the arcs of an input and its output, all at once
+#
+# Note: the lines have to be the same lines of both (see VerifyFiles()). The
+# arcs are found by a regex search over the whole output text for G2/G3 words
+# (only the lines it finds are looked at any closer, so a G2 in a comment
+# doesn't fool anyone), each starting where the last X/Y before it left the tool: the
+# lines before it are looked at, going backwards, until there's both (mostly
+# that's just the one line before it). The positions are the same in the input
+# anyway if all is well. This works out for each arc (as a dict of arrays or
+# lists, one item per arc):
+# - Lines: its line number
+# - Delta: how much its end radius differs from its start radius in the output
+# - Shift: how far its center moved from the input to the output
+# - Moved: whether its end point moved more than VERIFY_SLACK (Line Bender only
+#   rounds it to the four decimals it writes)
+# - Flipped: whether the center went to the other side of the chord, making the
+#   arc go the other way around (the short way instead of the long one or the
+#   other way around); BendThatArc() picks the solution closer to the original
+#   center, which is on the wrong side if the error was large enough
+# - Skipped: full circles (nothing to check) and arcs starting before the tool
+#   has been anywhere
+# Arcs that aren't arcs of the same kind in the input are only listed (in
+# Different, by line number) to be reported. With NumPy, the math is done in a
+# few passes over arrays of all the arcs, with the same results as the plain
+# math one arc after the other, only a lot quicker.
+# ******************************************************************************
+
+def VerifyArcs(InLines, OutLines, OutText):
+
+    Known = {};                                                                 # Values of the lines looked at so far, by index
+    Points = [];                                                                # (Xs, Ys, Xe, Ye, Xc, Yc and the input's Xe, Ye, Xc, Yc) of every arc
+    Lines = [];
+    Different = [];
+
+    Index = 0;
+    Last = 0;
+
+    for Match in VERIFY_ARC_PATTERN.finditer(OutText):
+        Index += OutText.count("\n", Last, Match.start());                      # Which line it's on
+        Last = Match.start();
+
+        if Index in Known:                                                      # Another G2/G3 on a line already looked at
+            continue;
+
+        G, X, Y, I, J = Known[Index] = VerifyValues(OutLines[Index]);
+
+        if G != 2 and G != 3:                                                   # Not really an arc after all
+            continue;
+
+        InG, InX, InY, InI, InJ = VerifyValues(InLines[Index]);
+
+        if InG != G:
+            Different.append(Index + 1);
+            continue;
+
+        Xs, Ys = None, None;
+        Before = Index - 1;
+
+        while (Xs is None or Ys is None) and Before >= 0:                       # Where the tool was, on the lines before it
+            if Before not in Known:
+                Known[Before] = VerifyValues(OutLines[Before]);
+
+            if Xs is None:
+                Xs = Known[Before][1];
+
+            if Ys is None:
+                Ys = Known[Before][2];
+
+            Before -= 1;
+
+        if Xs is None or Ys is None:                                            # Nowhere yet, there's no telling where it starts
+            Xs, Ys = float("nan"), float("nan");
+
+        Lines.append(Index + 1);
+
+        Points.append((Xs, Ys, Xs if X is None else X, Ys if Y is None else Y, Xs + (I or 0.0), Ys + (J or 0.0),
+                       Xs if InX is None else InX, Ys if InY is None else InY, Xs + (InI or 0.0), Ys + (InJ or 0.0)));
+
+    if numpy is None:                                                           # One arc after the other, then
+        Result = {'Lines': Lines, 'Delta': [], 'Shift': [], 'Moved': [], 'Flipped': [], 'Skipped': [], 'Different': Different};
+
+        for Xs, Ys, Xe, Ye, Xc, Yc, InXe, InYe, InXc, InYc in Points:
+            Skipped = Xs != Xs or (Xs == Xe and Ys == Ye);                      # NaN is the only number that isn't equal to itself
+            Turn = (Xe - Xs) * (Yc - Ys) - (Ye - Ys) * (Xc - Xs);               # Which side of the chord the centers are on
+            InTurn = (Xe - Xs) * (InYc - Ys) - (Ye - Ys) * (InXc - Xs);
+
+            Result['Delta'].append(0.0 if Skipped else RadiusDelta(Xs, Ys, Xe, Ye, Xc, Yc));
+            Result['Shift'].append(0.0 if Skipped else dist(Xc, Yc, InXc, InYc));
+            Result['Moved'].append(dist(Xe, Ye, InXe, InYe) > VERIFY_SLACK);
+            Result['Flipped'].append(not Skipped and Turn * InTurn < 0);
+            Result['Skipped'].append(Skipped);
+
+        return(Result);
+
+    Xs, Ys, Xe, Ye, Xc, Yc, InXe, InYe, InXc, InYc = numpy.array(Points, dtype = float).reshape(-1, 10).T;
+
+    Skipped = numpy.isnan(Xs) | ((Xs == Xe) & (Ys == Ye));
+    Turn = (Xe - Xs) * (Yc - Ys) - (Ye - Ys) * (Xc - Xs);
+    InTurn = (Xe - Xs) * (InYc - Ys) - (Ye - Ys) * (InXc - Xs);
+
+    return({'Lines': Lines,
+            'Delta': numpy.where(Skipped, 0.0, numpy.abs(numpy.hypot(Xe - Xc, Ye - Yc) - numpy.hypot(Xs - Xc, Ys - Yc))),
+            'Shift': numpy.where(Skipped, 0.0, numpy.hypot(Xc - InXc, Yc - InYc)),
+            'Moved': numpy.hypot(Xe - InXe, Ye - InYe) > VERIFY_SLACK,
+            'Flipped': ~Skipped & (Turn * InTurn < 0),
+            'Skipped': Skipped,
+            'Different': Different});
+
+# ******************************************************************************
+# VerifyFiles() - check an output against its input, return a report (a dict)
+#
+# Note: the output has to be line for line what the input was (not shrunk,
+# compacted or reordered), with nothing but arcs changed: the same G2/G3 going
+# to the same end point, with a new center (and a comment, see ArcLine()). The
+# lines that are the same are found by comparing both lists of lines in one
+# go; all the arcs of the output are then checked against the tolerance (NIST's
+# by default) and compared with the originals by VerifyArcs().
+# ******************************************************************************
+
+def VerifyFiles(InFileName, OutFileName, Tolerance):
+
+    Start = Clock();
+
+    InText = ReadWhole(InFileName);
+    OutText = ReadWhole(OutFileName);
+
+    InLines = InText.split("\n");
+    OutLines = OutText.split("\n");
+
+    Report = {'Lines': len(OutLines) - (OutText.endswith("\n") or len(OutText) == 0), 'LineCountsDiffer': len(InLines) != len(OutLines),
+              'Changed': 0, 'Unexpected': [], 'Arcs': 0, 'Skipped': 0, 'Flawed': [], 'Flipped': [], 'Worst': [], 'Shifted': [],
+              'LargestDelta': 0.0, 'LargestShift': 0.0, 'Tolerance': Tolerance, 'Seconds': 0.0};
+
+    if Report['LineCountsDiffer']:                                              # Nothing to compare line by line
+        return(Report);
+
+    Changed = [Index + 1 for Index, (InLine, OutLine) in enumerate(izip(InLines, OutLines)) if InLine != OutLine];
+
+    Arcs = VerifyArcs(InLines, OutLines, OutText);
+
+    Delta, Shift, Lines = Arcs['Delta'], Arcs['Shift'], Arcs['Lines'];
+
+    Unexpected = set(Changed).difference(Lines);                                # Lines other than arcs changed, arcs turned into something else and arcs going elsewhere
+    Unexpected.update(Arcs['Different']);
+    Unexpected.update(Lines[Index] for Index in xrange(len(Lines)) if Arcs['Moved'][Index]);
+
+    Report['Changed'] = len(Changed) - len(Unexpected);
+    Report['Unexpected'] = sorted(Unexpected);
+    Report['Arcs'] = len(Lines);
+    Report['Skipped'] = sum(1 for Skipped in Arcs['Skipped'] if Skipped);
+
+    if len(Lines) > 0:
+        Report['LargestDelta'] = max(Delta);
+        Report['LargestShift'] = max(Shift);
+
+    Report['Flawed'] = [Lines[Index] for Index in xrange(len(Lines)) if Delta[Index] > Tolerance];
+    Report['Flipped'] = [Lines[Index] for Index in xrange(len(Lines)) if Arcs['Flipped'][Index]];
+    Report['Worst'] = [(Lines[Index], Delta[Index]) for Index in sorted(xrange(len(Lines)), key = lambda Index: -Delta[Index])[:VERIFY_WORST] if Delta[Index] > 0];
+    Report['Shifted'] = [(Lines[Index], Shift[Index], bool(Arcs['Flipped'][Index])) for Index in sorted(xrange(len(Lines)), key = lambda Index: -Shift[Index])[:VERIFY_WORST] if Shift[Index] > 0];
+
+    Report['Seconds'] = Clock() - Start;
+
+    return(Report);
+
+# ******************************************************************************
+# PrintVerifyReport() - display what VerifyFiles() found, return whether it's ok
+# ******************************************************************************
+
+def PrintVerifyReport(Report, StatsFile = None):
+
+    if StatsFile is None:
+        StatsFile = sys.stdout;
+
+    print >> StatsFile;
+
+    if Report['LineCountsDiffer']:
+        print >> StatsFile, u"The output doesn't have the same lines as the input, it can't be verified";
+        print >> StatsFile, u"(only outputs that weren't shrunk, compacted, reordered or cut to a range can)";
+        print >> StatsFile;
+        return(False);
+
+    print >> StatsFile, u"Text lines compared:{0:>8}".format(Report['Lines']);
+    print >> StatsFile, u"Arc lines changed:  {0:>8}".format(Report['Changed']);
+    print >> StatsFile, u"Other lines changed:{0:>8}".format(len(Report['Unexpected']));
+    print >> StatsFile, u"Arcs checked:       {0:>8}".format(Report['Arcs'] - Report['Skipped']);
+    print >> StatsFile, u"Arcs not checked:   {0:>8}".format(Report['Skipped']);
+    print >> StatsFile, u"Arcs out of tol.:   {0:>8}".format(len(Report['Flawed']));
+    print >> StatsFile, u"Centers flipped:    {0:>8}".format(len(Report['Flipped']));
+    print >> StatsFile, u"Largest radius diff:{0:>8.5f}".format(Report['LargestDelta']);
+    print >> StatsFile, u"Largest center move:{0:>8.5f}".format(Report['LargestShift']);
+    print >> StatsFile, u"Verify time (s):    {0:>8.3f}".format(Report['Seconds']);
+    print >> StatsFile, u"Lines per second:   {0:>8.0f}".format(Report['Lines'] / max(Report['Seconds'], 1e-9));
+
+    if len(Report['Unexpected']) > 0:
+        print >> StatsFile;
+        print >> StatsFile, u"Lines changed that shouldn't have been: {0}".format(", ".join(str(Line) for Line in Report['Unexpected'][:VERIFY_WORST]) + (" ..." if len(Report['Unexpected']) > VERIFY_WORST else ""));
+
+    if len(Report['Worst']) > 0:
+        print >> StatsFile;
+        print >> StatsFile, u"Largest radius differences (tolerance {0:.5f}):".format(Report['Tolerance']);
+        for Line, Delta in Report['Worst']:
+            print >> StatsFile, u"    line {0:>10}: {1:.5f}{2}".format(Line, Delta, " (out of tolerance)" if Delta > Report['Tolerance'] else "");
+
+    if len(Report['Shifted']) > 0:
+        print >> StatsFile;
+        print >> StatsFile, u"Largest center moves:";
+        for Line, Shift, Flipped in Report['Shifted']:
+            print >> StatsFile, u"    line {0:>10}: {1:.5f}{2}".format(Line, Shift, " (flipped to the other side)" if Flipped else "");
+
+    if len(Report['Flipped']) > 0:
+        print >> StatsFile;
+        print >> StatsFile, u"Centers flipped on lines: {0}".format(", ".join(str(Line) for Line in Report['Flipped'][:VERIFY_WORST]) + (" ..." if len(Report['Flipped']) > VERIFY_WORST else ""));
+
+    print >> StatsFile;
+
+    return(len(Report['Unexpected']) == 0 and len(Report['Flawed']) == 0 and len(Report['Flipped']) == 0);
+
+# ******************************************************************************
+# BenderSession - Line Bender as a library, each session with a state of its own
+#
+# Note: the parser works on the module's globals, so a session keeps its own
+# copy of them (position, modes, settings and counters: the ones in
+# SESSION_STATE_NAMES) and swaps it in for every piece of work, holding
+# SessionLock - much like every block handed to a worker process gets set up
+# (see BendChunk()). Sessions can be used from any number of threads (one
+# session per thread), but they take turns at the parser rather than bend side
+# by side (the GIL wouldn't let them anyway; --jobs is the way to use more
+# processors): SESSION_BLOCK_LINES lines at a time, with TakeTurns() having
+# Pause() swap the state out and let go of the lock between the blocks of a
+# whole file, cached ones included, and while waiting on worker processes.
+#
+# The module's own functions (BendFile(), BendLines(), ParseLine() and the
+# like) work on the globals as they are: fine in a program of one thread, but
+# next to sessions in other threads they are only safe while holding
+# SessionLock, or through a session of their own.
+#
+# Errors raise a BenderError (see above) instead of exiting. The settings are
+# the keys of the options dictionary: BenderSession(Tolerance = 0.0002) etc.
+# ******************************************************************************
+
+class BenderSession(object):
+
+    def __init__(self, **Settings):
+
+        self.Options, Unused = ScanForOptions([]);
+
+        for Key in Settings:
+            if Key not in self.Options:
+                raise TypeError("Unknown setting \"{0}\"".format(Key));
+
+        self.Options.update(Settings);
+
+        if self.Options['Vector'] and numpy is None:                            # The scalar math gives the same results, only slower
+            self.Options['Vector'] = False;
+
+        self.State = dict.fromkeys(SESSION_STATE_NAMES, None);
+        self.State['SessionTurn'] = self.Pause;
+        self.Saved = None;                                                      # Whatever was in the globals before this session's state went in
+        self.reset();
+
+        with self.Active():
+            ApplySettings(self.Options);
+
+    @contextlib.contextmanager
+    def Active(self):                                                           # Swap this session's state into the globals for the duration
+
+        with SessionLock:
+            Module = globals();
+            self.Saved = dict((Name, Module[Name]) for Name in SESSION_STATE_NAMES);
+
+            Module.update(self.State);
+
+            try:
+                yield;
+            finally:
+                for Name in SESSION_STATE_NAMES:
+                    self.State[Name] = Module[Name];
+
+                Module.update(self.Saved);
+
+    def Pause(self, Waiting = None):                                            # Swap this session's state out and let the others have a turn (waiting for something meanwhile)
+
+        Module = globals();
+
+        for Name in SESSION_STATE_NAMES:
+            self.State[Name] = Module[Name];
+
+        Module.update(self.Saved);
+
+        SessionLock.release();
+
+        try:
+            if Waiting is None:
+                time.sleep(0);                                                  # Give any thread waiting for the lock a chance to get it
+            else:
+                Waiting();
+        finally:
+            SessionLock.acquire();
+
+        self.Saved = dict((Name, Module[Name]) for Name in SESSION_STATE_NAMES);
+
+        Module.update(self.State);
+
+    def Run(self, Function, *Arguments):                                        # Call a function with this session's state, arcs that can't be bent included
+
+        with self.Active():
+            try:
+                return(Function(*Arguments));
+            except ValueError as Error:                                         # Only the math can fail like this, everything else is checked
+                raise ArcError("Arc on line {0} cannot be bent ({1})".format(TextLinesHandled, Error), TextLinesHandled);
+
+    def reset(self):                                                            # Start counting from zero, with the tool nowhere in particular
+
+        self.State.update(dict.fromkeys(COUNTER_NAMES, 0));
+        self.State.update({'PathSecondsSaved': 0.0, 'CurrentPosition': {'X': None, 'Y': None, 'Z': None}, 'PendingArcs': None, 'Raising': True});
+
+    def counters(self):                                                         # The processing stats so far, as a dictionary
+
+        return(dict((Name, self.State[Name]) for Name in COUNTER_NAMES));
+
+    def position(self):                                                         # Where the tool is after the lines so far
+
+        return(dict(self.State['CurrentPosition']));
+
+    def process_line(self, Line):                                               # Bend one line, return the output line
+
+        return(self.Run(ParseLine, Line));
+
+    def process_iter(self, Lines):                                              # Bend any iterable of lines, yielding the output lines (no shrinking)
+
+        Lines = iter(Lines);
+
+        while True:
+            Block = list(islice(Lines, SESSION_BLOCK_LINES));
+
+            if len(Block) == 0:
+                break;
+
+            if self.Options['Vector']:
+                OutputLines = self.Run(ParseBlock, Block);
+            else:
+                OutputLines = self.Run(lambda: [ParseLine(Line) for Line in Block]);
+
+            for OutputLine in OutputLines:
+                yield OutputLine;
+
+    def process_file(self, InFileName, OutFileName = None):                    # Bend a whole file with every option there is, return its counters
+
+        if OutFileName is None:
+            if self.Options['Check']:
+                OutFileName = os.devnull;
+            else:
+                OutFileName = BentFileName(InFileName);
+
+        Before = self.counters();
+
+        Counters = self.Run(BendFile, InFileName, OutFileName, self.Options);  # Taking turns with the other sessions (see TakeTurns())
+
+        if self.Options['CacheDirectory'] is not None:
+            TrimCache(self.Options['CacheDirectory'], self.Options['CacheSize'] << 20);
+
+        for Name in COUNTER_NAMES:                                              # BendFile() counts from zero, the session goes on counting
+            self.State[Name] = Before[Name] + Counters[Name];
+
+        return(Counters);
+
+# ******************************************************************************
+# ScanForOptions() - split the command line into options and file names
+#
+# Note: options with a value conversion in the table (COMMAND_OPTIONS unless
+# given another one) take the following argument as their value, the rest are
+# simple on/off switches.
+# ******************************************************************************
+
+def ScanForOptions(Arguments, Known = None):
+
+    if Known is None:
+        Known = COMMAND_OPTIONS;
+
+    Options = {};
+    FileNames = [];
+
+    for Key, Convert, Default, Help in Known.values():                          # Start out with all defaults
+        Options[Key] = Default;
+
+    Index = 0;
+
+    while Index < len(Arguments):
+        Argument = Arguments[Index];
+        Index += 1;
+
+        if not Argument.startswith("--"):                                       # Anything not looking like an option is a file name
+            FileNames.append(Argument);
+            continue;
+
+        if Argument not in Known:
+            logging.error("Unknown option \"{0}\", exiting.".format(Argument));
+            sys.exit(1);
+
+        Key, Convert, Default, Help = Known[Argument];
+
+        if Convert is None:                                                     # Switches just get turned on
+            Options[Key] = True;
+            continue;
+
+        if Index >= len(Arguments):
+            logging.error("Option \"{0}\" needs a value, exiting.".format(Argument));
+            sys.exit(1);
+
+        try:
+            Options[Key] = Convert(Arguments[Index]);
+        except ValueError:
+            logging.error("Invalid value \"{0}\" for option \"{1}\", exiting.".format(Arguments[Index], Argument));
+            sys.exit(1);
+
+        Index += 1;
+
+    return(Options, FileNames);
+
+# ******************************************************************************
+# PrintOptions() - list the options in a table (COMMAND_OPTIONS unless given)
+# ******************************************************************************
+
+def PrintOptions(Known = None):
+
+    if Known is None:
+        Known = COMMAND_OPTIONS;
+
+    print u"Options:";
+
+    for Name in sorted(Known):
+        Key, Convert, Default, Help = Known[Name];
+        print u"    {0:<20} {1}".format(Name + ("" if Convert is None else " <value>"), Help);
+
+# ******************************************************************************
+# PrintStats() - display the processing stats on the given output (or stdout)
+# ******************************************************************************
+
+def PrintStats(StatsFile = None):
+
+    if StatsFile is None:
+        StatsFile = sys.stdout;
+
+    print >> StatsFile;
+    print >> StatsFile, u"Text lines handled: {0:>8}".format(TextLinesHandled);
+    print >> StatsFile, u"Text lines ignored: {0:>8}".format(TextLinesIgnored);
+    
+    print >> StatsFile, u"Path lines handled: {0:>8}".format(PathLinesHandled);
+    print >> StatsFile, u"Path lines dropped: {0:>8}".format(PathLinesDropped);
+    print >> StatsFile, u"Path arcs adjusted: {0:>8}".format(PathArcsAdjusted);
+    print >> StatsFile, u"Path arcs unedited: {0:>8}".format(PathArcsUnedited);
+
+    if ArcTolerance is not None:                                                # Only when there was a tolerance to compare to
+        print >> StatsFile, u"Path arcs accepted: {0:>8}".format(PathArcsAccepted);
+        print >> StatsFile, u"Path arcs flawed:   {0:>8}".format(PathArcsFlawed);
+
+    if ShrinkTolerance is not None:                                             # Only when the toolpath was shrunk
+        print >> StatsFile, u"Path time saved (s):{0:>8.2f}".format(PathSecondsSaved);
+
+    if Reordering:                                                              # Only when the islands were reordered
+        print >> StatsFile, u"Islands reordered:  {0:>8}".format(PathIslandsReordered);
+        print >> StatsFile, u"Rapid travel before:{0:>8.2f}".format(RapidDistanceBefore);
+        print >> StatsFile, u"Rapid travel after: {0:>8.2f}".format(RapidDistanceAfter);
+
+    if Compacting:                                                              # Only when the output was compacted
+        print >> StatsFile, u"Bytes uncompacted:  {0:>8}".format(CompactBytesBefore);
+        print >> StatsFile, u"Bytes compacted:    {0:>8}".format(CompactBytesAfter);
+        print >> StatsFile, u"Bytes saved (%):    {0:>8.1f}".format(100.0 * (CompactBytesBefore - CompactBytesAfter) / max(CompactBytesBefore, 1));
+
+    if ArcMemoHits + ArcMemoMisses > 0:                                         # Only when arcs were looked up in the arc memo
+        print >> StatsFile, u"Arc memo hits:      {0:>8}".format(ArcMemoHits);
+        print >> StatsFile, u"Arc memo hit rate:  {0:>7.1f}%".format(100.0 * ArcMemoHits / (ArcMemoHits + ArcMemoMisses));
+
+    if StreamLinesSent > 0:                                                     # Only when the output was streamed to a controller
+        print >> StatsFile, u"Lines streamed:     {0:>8}".format(StreamLinesSent);
+        print >> StatsFile, u"First line sent (s):{0:>8.2f}".format(StreamFirstSeconds);
+
+    if CacheHits + CacheMisses > 0:                                             # Only when there was a cache to look at
+        print >> StatsFile, u"Cache blocks hit:   {0:>8}".format(CacheHits);
+        print >> StatsFile, u"Cache blocks missed:{0:>8}".format(CacheMisses);
+
+    print >> StatsFile;
+
+# ******************************************************************************
+# ArcsSeen() - the number of arcs dealt with one way or another
+# ******************************************************************************
+
+def ArcsSeen():
+
+    if CheckOnly:                                                               # Checking doesn't adjust anything, the flawed arcs are counted separately
+        return(PathArcsAccepted + PathArcsFlawed);
+
+    return(PathArcsAdjusted + PathArcsAccepted);
+
+# ******************************************************************************
+# PrintTiming() - display the instrumentation figures after the stats
+#
+# Note: with several processes the stage times add up over all of them, so
+# they can well exceed the total time the run took.
+# ******************************************************************************
+
+def PrintTiming(WallTime, StatsFile = None):
+
+    if StatsFile is None:
+        StatsFile = sys.stdout;
+
+    for Name in STAGE_NAMES:
+        print >> StatsFile, u"{0:<20}{1:>8.3f}".format(Name + " time (s):", Statistics[Name]);
+
+    print >> StatsFile, u"Total time (s):     {0:>8.3f}".format(WallTime);
+    print >> StatsFile, u"Lines per second:   {0:>8.0f}".format(TextLinesHandled / max(WallTime, 1e-9));
+    print >> StatsFile, u"Arcs per second:    {0:>8.0f}".format(ArcsSeen() / max(WallTime, 1e-9));
+
+    if Statistics['ShiftCount'] > 0:
+        print >> StatsFile, u"Center shift mean:  {0:>8.5f}".format(Statistics['ShiftSum'] / Statistics['ShiftCount']);
+        print >> StatsFile, u"Center shift max:   {0:>8.5f}".format(Statistics['ShiftMax']);
+
+    if Statistics['ProgramBytes'] > 0:
+        print >> StatsFile, u"Program bytes/line: {0:>8.1f}".format(Statistics['ProgramBytes'] / float(max(TextLinesHandled, 1)));
+
+    print >> StatsFile;
+
+# ******************************************************************************
+# WriteStatsJson() - write all the stats to a file for other programs to read
+#
+# Note: Results is a list of (input name, counters or 'None' if it failed).
+# ******************************************************************************
+
+def WriteStatsJson(FileName, WallTime, Results):
+
+    Counters = GetCounters();
+
+    if Statistics['ShiftCount'] > 0:
+        ShiftMean = Statistics['ShiftSum'] / Statistics['ShiftCount'];
+    else:
+        ShiftMean = None;
+
+    Report = {
+        'Version': VERSION,
+        'Counters': Counters,
+        'StageSeconds': dict((Name, Statistics[Name]) for Name in STAGE_NAMES),
+        'WallSeconds': WallTime,
+        'LinesPerSecond': TextLinesHandled / max(WallTime, 1e-9),
+        'ArcsPerSecond': ArcsSeen() / max(WallTime, 1e-9),
+        'CenterShift': {'Count': Statistics['ShiftCount'], 'Mean': ShiftMean, 'Max': Statistics['ShiftMax']},
+        'ProgramBytes': Statistics['ProgramBytes'],
+        'Files': [{'Name': Name, 'Failed': FileCounters is None, 'Counters': FileCounters} for Name, FileCounters in Results],
+    };
+
+    try:
+        with open(FileName, 'w') as JsonFile:
+            json.dump(Report, JsonFile, indent = 2, sort_keys = True);
+    except IOError:
+        logging.error("Cannot write stats file \"{0}\".".format(FileName));
+
+# ******************************************************************************
+# PrintFileStats() - display one line of stats per file in batch mode
+# ******************************************************************************
+
+def PrintFileStats(FileName, Counters, StatsFile = None):
+
+    if StatsFile is None:
+        StatsFile = sys.stdout;
+
+    if FileName is None:                                                        # No file name means print the header instead
+        print >> StatsFile, u"   Lines  Ignored    Paths  Dropped Adjusted Unedited  File";
+    elif Counters is None:                                                      # No counters means the file failed
+        print >> StatsFile, u"{0:>53}  {1}".format("FAILED", FileName);
+    else:
+        print >> StatsFile, u" ".join(u"{0:>8}".format(Counters[Name]) for Name in TABLE_COUNTER_NAMES) + u"  " + FileName;
+
+# ******************************************************************************
+# CompressionOf() - the compression format of an input (by its first bytes) or
+# of an output (by its extension), 'None' for plain g-code
+# ******************************************************************************
+
+def CompressionOf(FileName, Output = False):
+
+    if FileName == STREAM_NAME:                                                 # Stdout is written as it is, stdin can only be read once (see OpenStdin())
+        return(None);
+
+    if Output:
+        return(COMPRESSION_EXTENSIONS.get(os.path.splitext(FileName)[1].lower()));
+
+    with open(FileName, 'rb') as InFile:
+        Head = InFile.read(COMPRESSION_MAGIC_BYTES);
+
+    return(MagicCompression(Head));
+
+def MagicCompression(Head):                                                     # The format the first bytes of something say, if any
+
+    for Magic, Format in COMPRESSION_MAGIC:
+        if Head.startswith(Magic):
+            return(Format);
+
+    return(None);
+
+# ******************************************************************************
+# OpenStdin() - stdin as an input file, decompressing it if it's compressed
+#
+# Note: its first bytes are peeked at just like a file's. Stdin redirected from
+# a file is simply put back where it was, and stays a plain file if it isn't
+# compressed (so it can still be mapped). A pipe can't be put back, so the
+# bytes peeked at are handed to a DecompressingFile instead, which then reads
+# the rest of a plain pipe as it is, without decompressing anything.
+# ******************************************************************************
+
+def OpenStdin():
+
+    try:
+        Start = sys.stdin.tell();
+    except IOError:                                                             # A pipe (or a terminal), no going back on that
+        Start = None;
+
+    Head = sys.stdin.read(COMPRESSION_MAGIC_BYTES);
+    Format = MagicCompression(Head);
+
+    if Start is not None:
+        sys.stdin.seek(Start);
+        Head = "";
+
+        if Format is None:
+            return(sys.stdin);
+
+    return(DecompressingFile(STREAM_NAME, Format, Head));
+
+# ******************************************************************************
+# NewDecompressor() / NewCompressor() - a streaming (de)compressor of a format
+#
+# Note: these are raised as IOError if the module a format needs is missing.
+# ******************************************************************************
+
+def NewDecompressor(Format):
+
+    if Format == 'gzip':
+        return(zlib.decompressobj(16 + zlib.MAX_WBITS));                        # Gzip headers and trailers, not bare zlib streams
+    elif Format == 'bz2':
+        return(bz2.BZ2Decompressor());
+    elif Format == 'xz' and lzma is not None:
+        return(lzma.LZMADecompressor());
+    elif Format == 'zstd' and zstandard is not None:
+        return(zstandard.ZstdDecompressor().decompressobj());
+
+    raise IOError(errno.ENOSYS, "Reading {0} compressed files needs the {1} module".format(Format, COMPRESSION_MODULES[Format]));
+
+def NewCompressor(Format):
+
+    if Format == 'gzip':
+        return(zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, 16 + zlib.MAX_WBITS));
+    elif Format == 'bz2':
+        return(bz2.BZ2Compressor());
+    elif Format == 'xz' and lzma is not None:
+        return(lzma.LZMACompressor());
+    elif Format == 'zstd' and zstandard is not None:
+        return(zstandard.ZstdCompressor().compressobj());
+
+    raise IOError(errno.ENOSYS, "Writing {0} compressed files needs the {1} module".format(Format, COMPRESSION_MODULES[Format]));
+
+# ******************************************************************************
+# DecompressingFile - a file-like reader of compressed g-code, as plain text
+#
+# Note: the file is read and decompressed COMPRESSION_READ_BYTES at a time,
+# nothing goes to disk and it's never read more than once, so this works the
+# same for any size. Files made of several compressed streams one after the
+# other (as "cat a.gz b.gz" makes them) are read as a whole. A file that ends
+# before its (last) stream does is truncated, and that's an error: its last
+# line may well end in the middle of a number. There's no seeking (or memory
+# mapping) a compressed file though. Stdin is read too (STREAM_NAME, along
+# with the Head already read from it), and with no Format it's only read, not
+# decompressed (see OpenStdin()).
+# ******************************************************************************
+
+class DecompressingFile(object):
+
+    def __init__(self, FileName, Format, Head = ""):
+
+        self.Name = FileName;
+        self.Format = Format;
+
+        if Format is None:                                                      # Plain text, only read the same way
+            self.Decompressor = None;
+        else:
+            self.Decompressor = NewDecompressor(Format);                        # Before opening anything, it may not be there
+
+        if FileName == STREAM_NAME:
+            self.Raw = sys.stdin;
+        else:
+            self.Raw = open(FileName, 'rb');                                    # The compressed file
+
+        self.Head = Head;                                                       # Anything read from it already
+
+        self.Lines = StringIO("");                                              # Whole lines decompressed, not read yet...
+        self.Text = "";                                                         # ...and whatever came after them
+
+    def Ended(self):                                                            # Whether the last stream read so far is complete
+
+        if self.Decompressor is None:
+            return(True);
+
+        if self.Format == 'gzip':                                               # Zlib has no 'eof' in Python 2, but a byte past the end of a stream is left unused
+            Probe = self.Decompressor.copy();
+
+            try:
+                Probe.decompress("\x00");
+            except zlib.error:
+                return(False);
+
+            return(len(Probe.unused_data) > 0);
+
+        if self.Format == 'bz2':                                                # Same for bz2, which won't take anything past the end
+            try:
+                self.Decompressor.decompress("");
+            except EOFError:
+                return(True);
+
+            return(False);
+
+        return(getattr(self.Decompressor, 'eof', True));                        # Lzma's tells, and so do newer zstandard versions' (older ones can't be checked)
+
+    def Fill(self):                                                             # Decompress some more, 'False' once there's nothing left
+
+        while True:
+            Data = self.Head + self.Raw.read(COMPRESSION_READ_BYTES);
+            self.Head = "";
+
+            if len(Data) == 0:
+                if not self.Ended():
+                    Fail("Input file \"{0}\" ends in the middle of its {1} compressed data, it's truncated".format(self.Name, self.Format), FileError);
+
+                return(False);
+
+            if self.Decompressor is None:
+                self.Text += Data;
+                return(True);
+
+            Text = self.Decompressor.decompress(Data);
+
+            while len(getattr(self.Decompressor, 'unused_data', "")) > 0:      # Another stream right after the last one
+                Data = self.Decompressor.unused_data;
+                self.Decompressor = NewDecompressor(self.Format);
+                Text += self.Decompressor.decompress(Data);
+
+            if len(Text) > 0:
+                self.Text += Text;
+                return(True);
+
+    def Unread(self):                                                           # Put the lines not read yet back in front of the text
+
+        self.Text = self.Lines.read() + self.Text;
+        self.Lines = StringIO("");
+
+    def read(self, Size = -1):
+
+        self.Unread();
+
+        while (Size < 0 or len(self.Text) < Size) and self.Fill():
+            pass;
+
+        if Size < 0:
+            Size = len(self.Text);
+
+        Text = self.Text[:Size];
+        self.Text = self.Text[Size:];
+
+        return(Text);
+
+    def readline(self):
+
+        self.Unread();
+
+        while self.Text.find("\n") < 0 and self.Fill():
+            pass;
+
+        End = self.Text.find("\n") + 1 or len(self.Text);
+
+        Line = self.Text[:End];
+        self.Text = self.Text[End:];
+
+        return(Line);
+
+    def __iter__(self):
+
+        return(self);
+
+    def next(self):                                                             # Lines come from a whole decompressed piece at a time
+
+        Line = self.Lines.readline();
+
+        if len(Line) > 0:
+            return(Line);
+
+        while self.Text.find("\n") < 0 and self.Fill():                       # Not even a single line yet (or the last one, without a newline)
+            pass;
+
+        End = self.Text.rfind("\n") + 1 or len(self.Text);
+
+        if End == 0:
+            raise StopIteration;
+
+        self.Lines = StringIO(self.Text[:End]);
+        self.Text = self.Text[End:];
+
+        return(self.Lines.readline());
+
+    def close(self):                                                            # Stdin is left alone
+
+        if self.Raw is not sys.stdin:
+            self.Raw.close();
+
+# ******************************************************************************
+# CompressingFile - a file-like writer of compressed g-code
+#
+# Note: writes are gathered up to COMPRESSION_WRITE_BYTES before going through
+# the compressor, which is a lot quicker than compressing every line on its
+# own. Flushing only flushes what's compressed so far: flushing the compressor
+# itself would end the stream for some formats, so that waits for closing.
+# ******************************************************************************
+
+class CompressingFile(object):
+
+    def __init__(self, FileName, Format):
+
+        self.Compressor = NewCompressor(Format);                                # Before creating anything, it may not be there
+        self.Raw = open(FileName, 'wb');                                        # The compressed file
+
+        self.Pieces = [];                                                       # Written, but not compressed yet
+        self.Size = 0;                                                          # Bytes of those
+
+    def Compress(self):
+
+        if self.Size > 0:
+            self.Raw.write(self.Compressor.compress("".join(self.Pieces)));
+            del self.Pieces[:];
+            self.Size = 0;
+
+    def write(self, Text):
+
+        self.Pieces.append(Text);
+        self.Size += len(Text);
+
+        if self.Size >= COMPRESSION_WRITE_BYTES:
+            self.Compress();
+
+    def writelines(self, Lines):
+
+        for Line in Lines:
+            self.Pieces.append(Line);
+            self.Size += len(Line);
+
+            if self.Size >= COMPRESSION_WRITE_BYTES:
+                self.Compress();
+
+    def flush(self):
+
+        self.Compress();
+        self.Raw.flush();
+
+    def close(self):                                                            # End the stream, then the file
+
+        self.Compress();
+        self.Raw.write(self.Compressor.flush());
+        self.Raw.close();
+
+# ******************************************************************************
+# BentFileName() - the default output file name / path for an input file
+# ******************************************************************************
+
+def BentFileName(InFileName):
+
+    (root, ext) = os.path.splitext(InFileName);                                 # Split the input filename into path plus filename and extension
+
+    return(root + "_BENT" + ext);                                               # Recombine them into a longer output filename
+
+# ******************************************************************************
+# PartialFileName() - the name an output is written under until it's complete
+#
+# Note: it's hidden and in the same directory (so renaming it is atomic), and
+# it ends just like the output does (so it's compressed just the same).
+# ******************************************************************************
+
+def PartialFileName(OutFileName):
+
+    Directory, Name = os.path.split(OutFileName);
+
+    return(os.path.join(Directory, PARTIAL_PREFIX + Name));
+
+# ******************************************************************************
+# NotesFileName() - the notes file name / path for an output file (see --annotate)
+# ******************************************************************************
+
+def NotesFileName(OutFileName):
+
+    return(os.path.splitext(OutFileName)[0] + ".notes");
+
+# ******************************************************************************
+# BendFile() - bend one input file into one output file, return the counters
+#
+# Note: everything is reset first, so this can be called for one file after the
+# other. Errors still exit (the batch mode catches that, see BatchWorker()).
+# ******************************************************************************
+
+def BendFile(InFileName, OutFileName, Options):
+
+    global CurrentPosition;
+    global PendingArcs;
+    global CacheDirectory;
+    global CacheSettings;
+    global CacheManifest;
+    global Statistics;
+
+    SetCounters(dict.fromkeys(COUNTER_NAMES, 0));                               # Start from scratch for every file
+    Statistics = NewStatistics();
+
+    CurrentPosition = {'X': None, 'Y': None, 'Z': None};
+    PendingArcs = None;
+
+    ApplySettings(Options);
+
+    Ranged = Options['Lines'] is not None or Options['FromN'] is not None;
+
+    if CheckOnly or Options['Program'] or Ranged:                               # There is no output to keep when checking, a program model is bent all at once and a range is only part of the file
+        CacheDirectory = None;
+    else:
+        CacheDirectory = Options['CacheDirectory'];
+
+    CacheSettings = MakeCacheSettings(Options);
+    CacheManifest = None;
+
+    FileKey = None;
+    Manifest = None;
+
+    if CacheDirectory is not None and InFileName != STREAM_NAME:               # A named file can be looked up as a whole first (stdin can't be read twice)
+        try:
+            FileKey = CacheKey("file", FileDigest(InFileName));
+        except IOError:                                                         # Opening it below will complain about this properly
+            pass;
+
+    if FileKey is not None:
+        Manifest = ReadCache(FileKey);                                          # File level entries are (block keys, counters, final position)
+        CacheManifest = [];
+
+        if Manifest is not None and not all(os.path.isfile(CachePath(Key)) for Key in Manifest[0]):
+            Manifest = None;                                                    # Some of its blocks have been evicted since, so it's no use
+
+    try:                                                                        # Attempt to open input file for reading (decompressing it on the fly if need be)
+        if InFileName == STREAM_NAME:
+            InFile = OpenStdin();
+        elif CompressionOf(InFileName) is not None:
+            InFile = DecompressingFile(InFileName, CompressionOf(InFileName));
+        else:
+            InFile = open(InFileName, 'r');
+    except IOError as Error:                                                    # Exit if failed
+        Fail("Cannot open input file \"{0}\" ({1})".format(InFileName, Error.strerror or Error), FileError);
+    except:
+        Fail("Cannot open input file \"{0}\"".format(InFileName), FileError);
+
+    logging.debug("Opened input file {0}.".format(InFileName));
+
+    if (Options['Index'] or Ranged) and InFileName == STREAM_NAME:
+        Fail("Cannot index stdin, it has to be a file", FileError);
+
+    if (Options['Index'] or Ranged) and isinstance(InFile, DecompressingFile):
+        Fail("Cannot index a compressed file, it has to be plain g-code", FileError);
+
+    if Options['Index'] or Ranged:                                              # Bring the index up to date (only reading it if it's just needed for the range)
+        Index = FetchIndex(InFileName);
+
+    if Ranged:                                                                  # Find the range of lines to bend
+        First, Last = Options['Lines'] or (None, None);
+
+        if Options['FromN'] is not None:
+            First = FindNumber(InFile, Index, Options['FromN']);
+
+            if First is None:
+                Fail("N-word \"N{0}\" not found in \"{1}\"".format(Options['FromN'], InFileName));
+
+        First = max(First or 1, 1);
+    
+    try:                                                                        # Attempt to open output file for writing (compressing it on the fly if its extension says so)
+        if OutFileName == STREAM_NAME:
+            OutFile = sys.stdout;
+        elif CompressionOf(OutFileName, True) is not None:
+            OutFile = CompressingFile(OutFileName, CompressionOf(OutFileName, True));
+        else:
+            OutFile = open(OutFileName, 'w');
+    except IOError as Error:                                                    # Exit if failed
+        Fail("Cannot open output file \"{0}\" ({1})".format(OutFileName, Error.strerror or Error), FileError);
+    except:
+        Fail("Cannot open output file \"{0}\"".format(OutFileName), FileError);
+
+    logging.debug("Opened output file {0}.".format(OutFileName));
+
+    if Options['Pipeline']:                                                     # Write in a thread, whatever comes out in the end
+        OutFile = PipelineWriter(OutFile);
+
+    if Options['Send'] is not None and not CheckOnly:                           # Stream whatever goes into the file to the controller too, as it goes
+        try:
+            Port = OpenController(Options['Send'], Options['Baud']);
+        except (IOError, OSError):
+            Fail("Cannot open controller \"{0}\"".format(Options['Send']), FileError);
+
+        logging.debug("Opened controller {0}.".format(Options['Send']));
+
+        OutFile = Sender = ControllerSender(OutFile, Port, Options['RxBuffer']);
+    else:
+        Sender = None;
+
+    if Compacting:                                                              # Compact whatever comes out in the end (shrunk or not)
+        Notes = None;
+
+        if Options['Annotate'] and OutFileName == STREAM_NAME:
+            logging.warning("Notes can't go next to stdout, leaving them out.");
+        elif Options['Annotate']:
+            try:
+                Notes = open(NotesFileName(OutFileName), 'w');
+            except IOError:
+                Fail("Cannot open notes file \"{0}\"".format(NotesFileName(OutFileName)), FileError);
+
+        OutFile = Encoder = CompactEncoder(OutFile, Notes);
+    else:
+        Encoder = None;
+
+    if ShrinkTolerance is not None:                                             # Shrink the toolpath on its way out, whichever way it's bent
+        OutFile = Shrinker = PathShrinker(OutFile, ShrinkTolerance);
+    else:
+        Shrinker = None;
+
+    if Reordering:                                                              # Reorder the islands before anything else, it needs to see them as they are
+        OutFile = Reorderer = IslandReorderer(OutFile);
+    else:
+        Reorderer = None;
+
+    if Options['Mapped'] and not Ranged and type(InFile) is file:               # Map the input if asked to and if it can be (stdin too, if it's a file, but nothing compressed)
+        Map = MapFile(InFile);
+    else:
+        Map = None;
+
+    if Instrumented:                                                            # Time the reading too, whichever way the lines are read below
+        InLines = TimedLines(InFile);
+    else:
+        InLines = InFile;
+
+    if Options['Pipeline']:                                                     # Read ahead in a thread, for whichever way the lines are bent line by line below
+        InLines = ReadAhead(InLines);
+
+    if Ranged:                                                                  # Start right at the range from the index, line numbers and all
+        SetCounters(dict(GetCounters(), TextLinesHandled = First - 1));
+
+        InLines = SeekLines(InFile, Index, First, Last);
+
+        if Instrumented:
+            for OutputLine in BendLines(TimedLines(InLines), Options['Vector']):
+                WriteTimed(OutFile, (OutputLine,));
+        else:
+            OutFile.writelines(BendLines(InLines, Options['Vector']));
+
+        AddCounters({'TextLinesHandled': 1 - First});                           # Only the lines of the range count
+    elif Manifest is not None:                                                  # The very same file has been bent before, so just replay the output
+        logging.debug("Found {0} in the cache.".format(InFileName));
+        ReplayCachedFile(OutFile, Manifest);
+    elif Options['Program']:                                                    # Read it all into a program model, bend that and write it back out
+        if Instrumented:
+            Start = Clock();
+
+        if Map is not None:                                                     # The map does for a source just as well, without reading anything yet
+            Source = Map;
+        else:
+            Source = InFile.read();
+
+        if Instrumented:
+            Statistics['Read'] += Clock() - Start;
+
+        Program = LoadProgram(Source);
+        BendProgram(Program, Options['Vector']);
+        WriteTimed(OutFile, ProgramLines(Program));
+    elif Options['Jobs'] > 1:                                                   # Hand out blocks of the file to a pool of processes
+        BendInParallel(InLines, OutFile, Options);
+    elif Map is not None and CacheDirectory is None:                            # Go through the memory map, writing untouched lines straight from it
+        BendMapped(Map, OutFile, Options['Vector']);
+    elif Instrumented:                                                          # Otherwise just stream the file through the parser, line by line or block by block
+        for OutputLine in BendLines(InLines, Options['Vector']):
+            WriteTimed(OutFile, (OutputLine,));
+    else:
+        OutFile.writelines(BendLines(InLines, Options['Vector']));
+
+    if Map is not None:
+        Map.close();
+
+    if FileKey is not None and Manifest is None:                                # Remember which blocks the file was made of
+        Counters = GetCounters();
+        WriteCache(FileKey, (CacheManifest, dict((Name, Counters[Name]) for Name in PATH_COUNTER_NAMES), dict(CurrentPosition)));
+            
+    try:                                                                        # Attempt to close output file (stdout only gets flushed)
+        if OutFile is sys.stdout:
+            OutFile.flush();
+        else:
+            OutFile.close();
+    except:                                                                     # Exit if failed
+        Fail("Failed to close output file \"{0}\"".format(OutFileName), FileError);
+
+    logging.debug("Closed output file {0}.".format(OutFileName));
+
+    if Sender is not None:                                                      # Closing it waited for the controller to take every line (or to fail)
+        if Sender.Failure is not None:
+            Fail("Streaming to the controller failed: {0}".format(Sender.Failure), FileError);
+
+        AddCounters({'StreamLinesSent': Sender.Sent, 'StreamFirstSeconds': Sender.FirstSeconds});
+
+    if Shrinker is not None:                                                    # Only counted now, so that the cache (which has the unshrunk output) never sees these
+        AddCounters({'PathLinesDropped': Shrinker.Dropped, 'PathSecondsSaved': Shrinker.Saved});
+
+    if Reorderer is not None:
+        AddCounters({'PathIslandsReordered': Reorderer.Islands, 'RapidDistanceBefore': Reorderer.Before, 'RapidDistanceAfter': Reorderer.After});
+
+    if Encoder is not None:
+        AddCounters({'CompactBytesBefore': Encoder.Before, 'CompactBytesAfter': Encoder.After});
+
+    try:                                                                        # Attempt to close input file (stdin is left alone)
+        if InFile is not sys.stdin:
+            InFile.close();
+    except:                                                                     # Exit if failed
+        Fail("Failed to close input file \"{0}\"".format(InFileName), FileError);
+
+    logging.debug("Closed input file {0}.".format(InFileName));
+
+    return(GetCounters());
+
+# ******************************************************************************
+# BatchWorker() - bend one file of a batch in a worker process
+#
+# Note: the job is (input name, output name, options), the result is (input
+# name, counters or 'None' if it failed, statistics, log records). Nothing that
+# goes wrong with one file is allowed to take the rest of the batch down too.
+# The output (and its notes) is written under its PartialFileName() and only
+# renamed once it's complete, so a file that fails leaves nothing that looks
+# like a result behind (and an earlier result, if any, is kept).
+# ******************************************************************************
+
+def BatchWorker(Job):
+
+    InFileName, OutFileName, Options = Job;
+
+    del WorkerRecords[:];
+
+    if OutFileName == os.devnull:                                               # Nothing to keep when only checking
+        PartialName = OutFileName;
+    else:
+        PartialName = PartialFileName(OutFileName);
+
+    try:
+        Counters = BendFile(InFileName, PartialName, Options);
+    except SystemExit:                                                          # The reason is already among the log records
+        Counters = None;
+    except Exception as Error:                                                  # Anything else (math domain errors and the like) gets logged here
+        logging.error("Unexpected error ({0}) on line {1}, skipping file.".format(Error, TextLinesHandled));
+        Counters = None;
+
+    if PartialName != OutFileName:
+        for Partial, Final in ((PartialName, OutFileName), (NotesFileName(PartialName), NotesFileName(OutFileName))):
+            try:
+                if Counters is None:
+                    os.remove(Partial);
+                elif os.path.isfile(Partial):                                   # There are only notes with --annotate
+                    os.rename(Partial, Final);
+            except OSError as Error:
+                if Error.errno != errno.ENOENT and Counters is not None:
+                    logging.error("Cannot rename output file \"{0}\" to \"{1}\" ({2}), skipping file.".format(Partial, Final, Error.strerror));
+                    Counters = None;
+
+    return(InFileName, Counters, Statistics, list(WorkerRecords));
+
+# ******************************************************************************
+# FindBatchFiles() - expand the batch mode file names, directories and globs
+#
+# Note: directories and wildcards give all the files they cover, except outputs
+# of earlier runs ("_BENT" ones, and any partial ones left by an interrupted
+# run). Returns the input names and unusable names.
+# ******************************************************************************
+
+def FindBatchFiles(Names):
+
+    InFileNames = [];
+    BadNames = [];
+
+    for Name in Names:
+        if os.path.isdir(Name):
+            for Entry in sorted(os.listdir(Name)):
+                Path = os.path.join(Name, Entry);
+                if os.path.isfile(Path) and not os.path.splitext(Path)[0].endswith("_BENT") and not Entry.startswith(PARTIAL_PREFIX):
+                    InFileNames.append(Path);
+        elif os.path.isfile(Name):
+            InFileNames.append(Name);
+        elif len(glob.glob(Name)) > 0:                                          # Not every shell expands wildcards, so we do
+            InFileNames.extend(Path for Path in sorted(glob.glob(Name)) if os.path.isfile(Path) and not os.path.splitext(Path)[0].endswith("_BENT") and not os.path.basename(Path).startswith(PARTIAL_PREFIX));
+        else:
+            BadNames.append(Name);
+
+    return(InFileNames, BadNames);
+
+# ******************************************************************************
+# BendBatch() - bend a whole list of files in a pool of processes, one per file
+#
+# Note: all outputs are named by BentFileName(). Returns the number of failures
+# and a list of (input name, counters or 'None' if it failed) for every file.
+# ******************************************************************************
+
+def BendBatch(Names, Options):
+
+    InFileNames, BadNames = FindBatchFiles(Names);
+
+    for Name in BadNames:
+        logging.error("File \"{0}\" does not seem to exist, skipping it.".format(Name));
+
+    FileOptions = dict(Options, Jobs = 1);                                      # The files are spread over the processes, each file is bent in one
+    if Options['Check']:                                                        # Checking writes nothing at all
+        Jobs = [(InFileName, os.devnull, FileOptions) for InFileName in InFileNames];
+    else:
+        Jobs = [(InFileName, BentFileName(InFileName), FileOptions) for InFileName in InFileNames];
+
+    Pool = multiprocessing.Pool(max(Options['Jobs'], 1), StartWorker);
+
+    Totals = dict.fromkeys(COUNTER_NAMES, 0);
+    Failures = len(BadNames);
+
+    PrintFileStats(None, None);
+
+    Results = [(Name, None) for Name in BadNames];
+
+    for InFileName, Counters, Figures, Records in Pool.imap(BatchWorker, Jobs): # Results come back in the original order
+        for Record in Records:                                                  # Pass on whatever the worker had to say, naming the file
+            Record.msg = "\"{0}\": ".format(InFileName) + Record.getMessage();
+            Record.args = ();
+            logging.getLogger().handle(Record);
+
+        PrintFileStats(InFileName, Counters);
+        Results.append((InFileName, Counters));
+
+        if Counters is None:
+            Failures += 1;
+        else:
+            for Name in COUNTER_NAMES:
+                Totals[Name] += Counters[Name];
+            MergeStatistics(Figures);
+
+    Pool.close();
+    Pool.join();
+
+    SetCounters(Totals);
+
+    return(Failures, Results);
+
+# ******************************************************************************
+# OpenController() - open a controller's serial port (or pty) for streaming
+#
+# Note: real serial ports get the baud rate and raw mode (no echo, no line
+# editing, no newline translation) through termios; a pty from a stand-in
+# like fakegrbl.py doesn't mind either. Returns the file descriptor.
+# ******************************************************************************
+
+def OpenController(Device, Baud):
+
+    Port = os.open(Device, os.O_RDWR | os.O_NOCTTY);
+
+    if termios is not None and os.isatty(Port):
+        Speed = getattr(termios, "B{0}".format(Baud), None);
+
+        try:
+            if Speed is None:
+                raise termios.error(errno.EINVAL, "Unsupported baud rate {0}".format(Baud));
+
+            Settings = termios.tcgetattr(Port);
+
+            Settings[0] = 0;                                                    # Input, output, control and local flags: raw, 8N1, no flow control
+            Settings[1] = 0;
+            Settings[2] = termios.CS8 | termios.CREAD | termios.CLOCAL;
+            Settings[3] = 0;
+            Settings[4] = Speed;                                                # Input and output speed
+            Settings[5] = Speed;
+            Settings[6][termios.VMIN] = 0;
+            Settings[6][termios.VTIME] = 0;
+
+            termios.tcsetattr(Port, termios.TCSANOW, Settings);
+        except termios.error as Error:                                          # Not an IOError in Python 2, make it one
+            os.close(Port);
+            raise IOError(*Error.args);
+
+    return(Port);
+
+# ******************************************************************************
+# ControllerSender - a file-like filter streaming the output to a controller
+#
+# Note: lines still go on to the target (the output file) as they are, and
+# they go to the controller as soon as they're written too, without comments
+# and spaces, so the machine can start while the rest of the file is still
+# being bent. A thread does the sending, with GRBL's character counting flow
+# control: the lengths of the lines sent but not yet answered with an "ok" are
+# kept, and a line only goes once it fits in the controller's receive buffer
+# along with them, so the buffer is kept full but never overflows. Bending runs
+# ahead of the sending by SEND_QUEUE_LINES at most, then waits for it. An
+# "error" or "ALARM" from the controller (or losing it) stops the sending, and
+# bending stops with it; Failure tells what happened.
+# ******************************************************************************
+
+class ControllerSender(object):
+
+    def __init__(self, Target, Port, BufferBytes):
+
+        self.Target = Target;                                                   # Where the lines go besides the controller
+        self.Port = Port;                                                       # The controller's file descriptor (see OpenController())
+        self.BufferBytes = BufferBytes;                                         # Size of the controller's receive buffer
+
+        self.Partial = "";                                                      # Any incomplete line written so far
+        self.Lines = [];                                                        # Lines waiting to be handed to the thread
+        self.Queue = Queue.Queue(max(SEND_QUEUE_LINES // SEND_BATCH_LINES, 1));   # Batches of lines between us and the thread ('None' ends it)
+
+        self.Received = "";                                                     # Any incomplete answer from the controller
+        self.Unanswered = deque();                                              # Lines sent but not answered yet
+        self.Buffered = 0;                                                      # Bytes of those lines (newlines included)
+
+        self.Sent = 0;                                                          # Lines sent so far
+        self.FirstSeconds = 0.0;                                                # How long the first one took to go, from the start
+        self.Failure = None;                                                    # What stopped the sending, if anything did
+
+        self.Started = Clock();
+
+        self.Thread = threading.Thread(target = self.Run, name = "ControllerSender");
+        self.Thread.daemon = True;
+        self.Thread.start();
+
+    def Listen(self, Timeout):                                                  # Take the controller's answers, waiting this long for them at most
+
+        Readable, Unused, Unused = select.select([self.Port], [], [], Timeout);
+
+        if len(Readable) == 0:
+            return;
+
+        try:
+            Data = os.read(self.Port, 4096);
+        except OSError as Error:
+            if Error.errno == errno.EIO:                                        # That's how a pty says the other end is gone
+                Data = "";
+            else:
+                raise;
+
+        if len(Data) == 0:
+            raise IOError(errno.EPIPE, "The controller went away");
+
+        Answers = (self.Received + Data).split("\n");
+        self.Received = Answers.pop();
+
+        for Answer in Answers:
+            Answer = Answer.strip();
+
+            if Answer == "ok" and len(self.Unanswered) > 0:
+                self.Buffered -= len(self.Unanswered.popleft()) + 1;
+            elif Answer == "ok":                                                # Nothing sent it could answer (left over from before we came along)
+                logging.debug("Controller: an \"ok\" to no line, ignored.");
+            elif Answer.startswith("error"):
+                raise IOError(errno.EIO, "The controller answered \"{0}\" to line \"{1}\"".format(Answer, self.Unanswered[0] if self.Unanswered else ""));
+            elif Answer.startswith("ALARM"):
+                raise IOError(errno.EIO, "The controller raised \"{0}\"".format(Answer));
+            elif len(Answer) > 0 and Debugging:                                 # Greetings, messages and the like
+                logging.debug("Controller: {0}".format(Answer));
+
+    def Settle(self):                                                           # Let whatever the controller says on connecting (a greeting after a reset) pass
+
+        Deadline = Clock() + SEND_WAKE_SECONDS;
+
+        while Clock() < Deadline:
+            Readable, Unused, Unused = select.select([self.Port], [], [], SEND_SETTLE_SECONDS);
+
+            if len(Readable) == 0:
+                break;
+
+            self.Listen(0);
+
+        self.Received = "";
+
+    def Send(self, Line):                                                       # Send one line once there's room for it in the controller's buffer
+
+        Block = SEND_STRIP_PATTERN.sub("", Line);
+
+        if Block == "" or Block == "%":
+            return;
+
+        if len(Block) + 1 > self.BufferBytes:
+            raise IOError(errno.EMSGSIZE, "Line \"{0}\" doesn't fit in the controller's buffer".format(Block));
+
+        while self.Buffered + len(Block) + 1 > self.BufferBytes:
+            self.Listen(SERVE_TICK);
+
+        Data = Block + "\n";
+
+        while len(Data) > 0:
+            Data = Data[os.write(self.Port, Data):];
+
+        self.Unanswered.append(Block);
+        self.Buffered += len(Block) + 1;
+
+        if self.Sent == 0:
+            self.FirstSeconds = Clock() - self.Started;
+
+        self.Sent += 1;
+
+    def Run(self):                                                              # The thread: send everything handed over, then wait for the last answers
+
+        try:
+            self.Settle();
+
+            while True:
+                Lines = self.Queue.get();
+
+                if Lines is None:
+                    break;
+
+                for Line in Lines:
+                    self.Send(Line);
+
+            while len(self.Unanswered) > 0:
+                self.Listen(SERVE_TICK);
+        except (IOError, OSError) as Error:
+            self.Failure = Error.strerror or str(Error);
+        except select.error as Error:
+            self.Failure = Error.args[-1];
+        except Exception as Error:                                              # Anything else stops it just the same, nobody may wait on it forever
+            self.Failure = "{0}: {1}".format(type(Error).__name__, Error);
+
+    def Hand(self, Lines):                                                      # Give the thread something to send, waiting for room if need be ('False' if it has stopped)
+
+        while self.Failure is None:
+            try:
+                self.Queue.put(Lines, True, SERVE_TICK);
+                return(True);
+            except Queue.Full:
+                pass;
+
+        return(False);
+
+    def write(self, Text):
+
+        self.Target.write(Text);
+
+        Text = self.Partial + Text;
+        Start = 0;
+
+        while True:
+            End = Text.find("\n", Start);
+            if End < 0:
+                break;
+            self.Lines.append(Text[Start:End + 1]);
+            Start = End + 1;
+
+        self.Partial = Text[Start:];
+
+        if len(self.Lines) >= SEND_BATCH_LINES:
+            if not self.Hand(self.Lines):                                       # No use bending on without a controller
+                Fail("Streaming to the controller failed: {0}".format(self.Failure), FileError);
+            self.Lines = [];
+
+    def writelines(self, Lines):
+
+        for Line in Lines:
+            self.write(Line);
+
+    def flush(self):
+
+        if len(self.Lines) > 0 and self.Hand(self.Lines):
+            self.Lines = [];
+
+        self.Target.flush();
+
+    def close(self):                                                            # Send the rest and wait for the controller to take it all; stdout is only flushed
+
+        if len(self.Partial) > 0:
+            self.Lines.append(self.Partial);
+            self.Partial = "";
+
+        if len(self.Lines) == 0 or self.Hand(self.Lines):                       # The rest, then the end of it (the thread tells why it stopped otherwise)
+            self.Hand(None);
+
+        self.Lines = [];
+
+        while self.Thread.is_alive():                                           # A join with a timeout, so an interrupt still gets through
+            self.Thread.join(SERVE_TICK);
+
+        os.close(self.Port);
+
+        if self.Target is sys.stdout:
+            self.Target.flush();
+        else:
+            self.Target.close();
+
+# ******************************************************************************
+# FindWatchedFiles() - new files in a watched directory that are ready to bend
+#
+# Note: Seen maps file names to their (size, modification time) as last seen.
+# A file is ready once it has stayed the same for a whole WATCH_INTERVAL (so
+# it's not being written anymore) and it hasn't been bent since it changed -
+# its output is missing or older - so a restart doesn't bend everything again.
+# Files that are gone are forgotten, so neither dict grows for ever.
+# ******************************************************************************
+
+def FindWatchedFiles(Directory, Seen, Submitted):
+
+    Ready = [];
+
+    try:
+        Names = sorted(os.listdir(Directory));
+    except OSError:
+        logging.error("Cannot read directory \"{0}\".".format(Directory));
+        return(Ready);
+
+    Present = set(os.path.join(Directory, Name) for Name in Names);
+
+    for Known in (Seen, Submitted):
+        for Path in [Path for Path in Known if Path not in Present]:
+            del Known[Path];
+
+    for Name in Names:
+        Path = os.path.join(Directory, Name);
+
+        if os.path.splitext(Path)[0].endswith("_BENT") or Name.startswith("."):  # Our own outputs, and hidden (temporary) files
+            continue;
+
+        try:
+            Status = os.stat(Path);
+        except OSError:                                                         # Gone already
+            continue;
+
+        if not os.path.isfile(Path):
+            continue;
+
+        Signature = (Status.st_size, Status.st_mtime);
+        Previous = Seen.get(Path);
+        Seen[Path] = Signature;
+
+        if Signature != Previous or Submitted.get(Path) == Signature:         # Still changing, or already taken care of
+            continue;
+
+        try:
+            if os.stat(BentFileName(Path)).st_mtime >= Status.st_mtime:
+                Submitted[Path] = Signature;
+                continue;
+        except OSError:                                                         # No output yet
+            pass;
+
+        Submitted[Path] = Signature;
+        Ready.append(Path);
+
+    return(Ready);
+
+# ******************************************************************************
+# StartServeWorker() - set up a server's worker process
+#
+# Note: an interrupt goes to the whole process group; the server stops its
+# workers itself, so they shouldn't stop (with a traceback each) on their own.
+# ******************************************************************************
+
+def StartServeWorker():
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN);
+
+    StartWorker();
+
+# ******************************************************************************
+# ServeWorker() - BatchWorker(), telling when the file was done too
+#
+# Note: the time is the wall clock's (time.time()), the only one that's the
+# same in every process.
+# ******************************************************************************
+
+def ServeWorker(Job):
+
+    return(BatchWorker(Job) + (time.time(),));
+
+# ******************************************************************************
+# StopServing() - turn a terminate signal into an interrupt, to stop the server
+# ******************************************************************************
+
+def StopServing(Number, Frame):
+
+    raise KeyboardInterrupt;
+
+# ******************************************************************************
+# ServeStatus() - the state of the server's queue and its latencies, as a dict
+#
+# Note: Latencies is a running tally (count, sum, largest and last), not a list
+# of them all, so it stays the same size however long the server runs.
+# ******************************************************************************
+
+def ServeStatus(Running, Latencies, Failures):
+
+    Status = {
+        'Queued': len(Running),                                                 # The pool takes them in order, so waiting and running jobs are all the same to us
+        'Done': Latencies['Count'],
+        'Failed': Failures,
+        'LatencyLast': None,
+        'LatencyMean': None,
+        'LatencyMax': None,
+    };
+
+    if Latencies['Count'] > 0:
+        Status['LatencyLast'] = Latencies['Last'];
+        Status['LatencyMean'] = Latencies['Sum'] / Latencies['Count'];
+        Status['LatencyMax'] = Latencies['Max'];
+
+    return(Status);
+
+# ******************************************************************************
+# Serve() - stay resident, bending files from a watched directory or a socket
+#
+# Note: the files are bent by BatchWorker() in a pool of worker processes that
+# are started (and import everything) once, up front, instead of for every file
+# as running the script for each would. Outputs are named by BentFileName(),
+# just like the script names them. The socket takes one file path per line and
+# answers each with "OK <output> <seconds>" or "FAILED <input>" once it's done;
+# "STATUS" gets a line of JSON about the queue and the latencies right away.
+# Every finished file also gets a line of stats, with its latency: the time
+# from being found (or asked for) to being bent. Files are answered as soon as
+# they're done, so a quick one never waits for a slow one handed out before it.
+# The cache is trimmed every TRIM_INTERVAL, not after every file.
+# ******************************************************************************
+
+def Serve(Options):
+
+    ApplySettings(Options);                                                     # For the stats (the workers apply them for every file anyway)
+
+    FileOptions = dict(Options, Jobs = 1);                                      # Every file is bent in a single worker, like in batch mode
+
+    Pool = multiprocessing.Pool(max(Options['Jobs'], 1), StartServeWorker);
+
+    signal.signal(signal.SIGTERM, StopServing);                                 # Only now, the workers have to keep the default
+
+    Server = None;
+    Clients = {};                                                               # Open connections and whatever they sent that isn't a whole line yet
+
+    if Options['Socket'] is not None:
+        if os.path.exists(Options['Socket']):                                   # Left over from a previous run
+            os.remove(Options['Socket']);
+
+        Server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM);
+        Server.bind(Options['Socket']);
+        Server.listen(16);
+
+    Seen = {};
+    Submitted = {};
+    Running = [];                                                               # Jobs in the order they were handed out: (input name, result, start time, client or 'None')
+    Latencies = {'Count': 0, 'Sum': 0.0, 'Max': 0.0, 'Last': None};
+    Failures = 0;
+    Totals = dict.fromkeys(COUNTER_NAMES, 0);
+    NextWatch = 0;
+    NextTrim = Clock() + TRIM_INTERVAL;
+    Trimmed = True;                                                             # Nothing bent since the cache was last trimmed
+
+    logging.warning("Line Bender {0} waiting for files ({1} workers), interrupt or terminate to stop.".format(VERSION, max(Options['Jobs'], 1)));
+
+    PrintFileStats(None, None);
+    sys.stdout.flush();
+
+    def Submit(InFileName, Client):
+        if Options['Check']:
+            OutFileName = os.devnull;
+        else:
+            OutFileName = BentFileName(InFileName);
+
+        Running.append((InFileName, Pool.apply_async(ServeWorker, ((InFileName, OutFileName, FileOptions),)), time.time(), Client));   # Wall clock time, see ServeWorker()
+
+    def Reply(Client, Text):
+        try:
+            Client.sendall(Text + "\n");
+        except socket.error:                                                    # They didn't wait for it, fine
+            pass;
+
+    try:
+        while True:
+            if Options['Watch'] is not None and Clock() >= NextWatch:           # Look for new files every now and then
+                for InFileName in FindWatchedFiles(Options['Watch'], Seen, Submitted):
+                    Submit(InFileName, None);
+                NextWatch = Clock() + WATCH_INTERVAL;
+
+            if Server is not None:
+                try:
+                    Readable = select.select([Server] + list(Clients), [], [], SERVE_TICK)[0];
+                except select.error as Error:
+                    if Error.args[0] != errno.EINTR:
+                        raise;
+                    Readable = [];
+            else:
+                time.sleep(SERVE_TICK);
+                Readable = [];
+
+            for Ready in Readable:
+                if Ready is Server:
+                    Client, Address = Server.accept();
+                    Clients[Client] = "";
+                    continue;
+
+                Data = Ready.recv(4096);
+
+                if len(Data) == 0:                                              # Hung up (answers to any of its files will just be dropped)
+                    del Clients[Ready];
+                    Ready.close();
+                    continue;
+
+                Lines = (Clients[Ready] + Data).split("\n");
+                Clients[Ready] = Lines.pop();
+
+                for Line in Lines:
+                    Line = Line.strip();
+
+                    if Line == "STATUS":
+                        Reply(Ready, json.dumps(ServeStatus(Running, Latencies, Failures), sort_keys = True));
+                    elif Line != "":
+                        Submit(Line, Ready);
+
+            Finished = [Job for Job in Running if Job[1].ready()];              # Collect finished jobs as they finish, whatever was handed out before them
+
+            for Job in Finished:
+                Running.remove(Job);
+
+                InFileName, Result, Started, Client = Job;
+                InFileName, Counters, Figures, Records, Done = Result.get();
+                Latency = Done - Started;
+
+                for Record in Records:                                          # Pass on whatever the worker had to say, naming the file
+                    Record.msg = "\"{0}\": ".format(InFileName) + Record.getMessage();
+                    Record.args = ();
+                    logging.getLogger().handle(Record);
+
+                PrintFileStats(InFileName, Counters);
+                print u"{0:>53}".format(u"latency {0:.3f} s".format(Latency));
+                sys.stdout.flush();
+
+                Latencies['Count'] += 1;
+                Latencies['Sum'] += Latency;
+                Latencies['Max'] = max(Latencies['Max'], Latency);
+                Latencies['Last'] = Latency;
+                Trimmed = False;
+
+                if Counters is None:
+                    Failures += 1;
+                    if Client is not None and Client in Clients:
+                        Reply(Client, "FAILED " + InFileName);
+                else:
+                    for Name in COUNTER_NAMES:
+                        Totals[Name] += Counters[Name];
+                    MergeStatistics(Figures);
+                    if Client is not None and Client in Clients:
+                        Reply(Client, "OK {0} {1:.3f}".format(BentFileName(InFileName), Latency));
+
+            if Options['CacheDirectory'] is not None and not Trimmed and Clock() >= NextTrim:   # Walking the whole cache takes a while, not after every file
+                TrimCache(Options['CacheDirectory'], Options['CacheSize'] << 20);
+                NextTrim = Clock() + TRIM_INTERVAL;
+                Trimmed = True;
+    except KeyboardInterrupt:                                                   # The way to stop
+        pass;
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN);                          # Another one mustn't interrupt the cleanup (the pool's workers are stopped with one)
+        signal.signal(signal.SIGINT, signal.SIG_IGN);
+
+        Pool.terminate();
+        Pool.join();
+
+        if Server is not None:
+            Server.close();
+            os.remove(Options['Socket']);
+
+        if Options['CacheDirectory'] is not None and not Trimmed:
+            TrimCache(Options['CacheDirectory'], Options['CacheSize'] << 20);
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL);
+        signal.signal(signal.SIGINT, signal.default_int_handler);
+
+    SetCounters(Totals);
+
+    print u"Total:";
+    PrintStats(sys.stdout);
+    print json.dumps(ServeStatus(Running, Latencies, Failures), sort_keys = True);
+
+# ******************************************************************************
+# Main() - fetch a file line by line and feed it to the parser / arc adjuster
+#
+# Note: modify the first line to change the amount of logged info if you wish.
+# Valid values are DEBUG, INFO, WARNING, ERROR, CRITICAL.
+# ******************************************************************************
+
+def main():
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.WARNING)
+
+    Options, FileNames = ScanForOptions(sys.argv[1:]);
+
+    if len(FileNames) < 1 and Options['Watch'] is None and Options['Socket'] is None:   # If there's nothing to do, display version and usage info then exit
+        print;
+        print u"Line Bender {0} (C) 2012 Asztalos Attila Oszkár".format(VERSION);
+        print u"Adjusts imprecise arcs in Line Grinder generated g-code";
+        print u"Usage: linebend [<options>] <input file> [<output file>]";
+        print u"       linebend --batch [<options>] <input file, directory or wildcard> ...";
+        print u"       linebend --watch <directory> | --socket <path> [<options>]";
+        print u"Use \"-\" for stdin / stdout (stdin alone means stdout too, stats go to stderr)";
+        PrintOptions();
+        sys.exit(1);
+
+    if Options['Vector'] and numpy is None:                                     # No NumPy, no vectors - the scalar math gives the same results, only slower
+        logging.warning("NumPy is not available, bending arcs one by one instead.");
+        Options['Vector'] = False;
+
+    if Options['Jobs'] == 0:                                                    # Zero jobs means as many as there are CPUs
+        Options['Jobs'] = multiprocessing.cpu_count();
+
+    if Options['Program'] and not Options['Batch'] and (Options['Jobs'] > 1 or Options['CacheDirectory'] is not None):
+        logging.warning("A program model is bent in a single process, without the cache.");
+
+    if Options['Lines'] is not None and (len(Options['Lines']) != 2 or (Options['Lines'][0] or 1) < 1 or (Options['Lines'][1] or sys.maxsize) < (Options['Lines'][0] or 1)):
+        logging.error("Invalid line range, exiting.");
+        sys.exit(1);
+
+    if (Options['Lines'] is not None or Options['FromN'] is not None) and (Options['Jobs'] > 1 or Options['Program'] or Options['Mapped'] or Options['CacheDirectory'] is not None):
+        logging.warning("A range of lines is bent in a single process, line by line, without the cache.");
+
+    if Options['Split'] is not None:                                            # Just list the ranges, for the parallel runs to bend
+        if FileNames[0] == STREAM_NAME:
+            logging.error("Cannot index stdin, it has to be a file, exiting.");
+            sys.exit(1);
+
+        for First, Last in SplitRanges(FetchIndex(FileNames[0]), Options['Split']):
+            print u"{0}-{1}".format(First, Last);
+        return;
+
+    if Options['Verify']:                                                       # Verify an earlier output, exit with 2 if it's no good
+        ApplySettings(Options);
+
+        if len(FileNames) < 2:
+            FileNames.append(BentFileName(FileNames[0]));
+
+        for FileName in FileNames[:2]:
+            if FileName == STREAM_NAME or not os.path.isfile(FileName):
+                logging.error("File \"{0}\" does not seem to exist, exiting.".format(FileName));
+                sys.exit(1);
+
+        if not PrintVerifyReport(VerifyFiles(FileNames[0], FileNames[1], ArcTolerance or NIST_TOLERANCE)):
+            sys.exit(2);
+        return;
+
+    if Options['Send'] is not None and (Options['Batch'] or Options['Check'] or Options['Watch'] is not None or Options['Socket'] is not None):
+        logging.warning("Only a single file being bent can be streamed to a controller, ignoring --send.");
+        Options['Send'] = None;
+
+    if Options['Send'] is not None and Options['Reorder']:                      # The reorderer needs all the islands before it lets out the first one
+        logging.warning("The islands are only reordered once the whole file is bent, nothing is sent to the controller before that.");
+
+    if Options['Annotate'] and not Options['Compact']:
+        logging.warning("Notes are only kept out of the g-code with --compact, ignoring --annotate.");
+
+    if Options['Watch'] is not None or Options['Socket'] is not None:           # Resident mode, until interrupted
+        Serve(Options);
+        return;
+
+    if Options['Profile']:                                                      # Run it all under the profiler, then tell where the time went (even if we're exiting)
+        Profiler = cProfile.Profile();
+        try:
+            Profiler.runcall(BendAll, Options, FileNames);
+        finally:
+            print >> sys.stderr;
+            pstats.Stats(Profiler, stream = sys.stderr).sort_stats('cumulative').print_stats(PROFILE_FUNCTIONS);
+    else:
+        BendAll(Options, FileNames);
+
+# ******************************************************************************
+# BendAll() - bend (or check) everything named on the command line, show stats
+# ******************************************************************************
+
+def BendAll(Options, FileNames):
+
+    Started = Clock();
+
+    ApplySettings(Options);                                                     # BendFile() does this too, but the stats need to know about the tolerance here as well
+
+    if Options['Batch']:                                                        # Batch mode: every name is an input, outputs are named automatically
+        Failures, Results = BendBatch(FileNames, Options);
+
+        if Options['CacheDirectory'] is not None:                               # Keep the cache within its limits
+            TrimCache(Options['CacheDirectory'], Options['CacheSize'] << 20);
+
+        print u"Total:";
+        PrintStats(sys.stdout);
+
+        if Options['Timing']:
+            PrintTiming(Clock() - Started, sys.stdout);
+
+        if Options['StatsJson'] is not None:
+            WriteStatsJson(Options['StatsJson'], Clock() - Started, Results);
+
+        if PathArcsUnedited > 0:
+            logging.warning("Full circle arcs were found and skipped ({0}).".format(PathArcsUnedited));
+
+        if Failures > 0:
+            logging.error("{0} file(s) could not be bent.".format(Failures));
+            sys.exit(1);
+
+        if CheckOnly and PathArcsFlawed > 0:                                    # Let whoever runs the check know it failed
+            sys.exit(2);
+
+        return;
+
+    InFileName = FileNames[0];                                                  # Otherwise, fetch the input file name / path
+        
+    if InFileName != STREAM_NAME and not os.path.isfile(InFileName):
+        logging.error("File \"{0}\" does not seem to exist, exiting.".format(InFileName));
+        sys.exit(1);
+        
+    if CheckOnly:                                                               # Checking writes nothing at all
+        OutFileName = os.devnull;
+    elif len(FileNames) < 2 and InFileName == STREAM_NAME:                      # Reading stdin without an output file name means writing stdout
+        OutFileName = STREAM_NAME;
+    elif len(FileNames) < 2:                                                    # If there is no second file name, construct an output file name / path
+        OutFileName = BentFileName(InFileName);
+    else:
+        OutFileName = FileNames[1];                                             # Otherwise, fetch the output file name / path
+
+    BendFile(InFileName, OutFileName, Options);
+
+    if Options['CacheDirectory'] is not None:                                   # Keep the cache within its limits
+        TrimCache(Options['CacheDirectory'], Options['CacheSize'] << 20);
+
+    if OutFileName == STREAM_NAME:                                              # Display some processing stats, keeping them out of the g-code if that's on stdout
+        StatsFile = sys.stderr;
+    else:
+        StatsFile = sys.stdout;
+
+    PrintStats(StatsFile);
+
+    if Options['Timing']:
+        PrintTiming(Clock() - Started, StatsFile);
+
+    if Options['StatsJson'] is not None:
+        WriteStatsJson(Options['StatsJson'], Clock() - Started, [(InFileName, GetCounters())]);
+    
+    if PathArcsUnedited > 0:
+        logging.warning("Full circle arcs were found and skipped ({0}).".format(PathArcsUnedited));
+
+    if CheckOnly and PathArcsFlawed > 0:                                        # Let whoever runs the check know it failed
+        sys.exit(2);
         
-main();
\ No newline at end of file
+if __name__ == "__main__":                                                      # Only run when started as a script, not when imported (worker processes, for one)
+    main();
\ No newline at end of file